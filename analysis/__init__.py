@@ -0,0 +1,3 @@
+"""
+Vibration analysis routines shared by the Streamlit pages, the notebook and the server.
+"""
@@ -0,0 +1,271 @@
+"""
+Batch analysis of a directory of recordings, for fleet reports.
+
+Every recording found under the directory (chunked recordings, .raw files and
+CSV files written by the ingestion server) is resampled onto its nominal
+rate grid like on the Vibration Analysis page, and gets the page's binned FFT
+amplitude, a Welch PSD and a set of per-axis features. The recordings are
+spread over a ProcessPoolExecutor in chunks of a few recordings per task.
+Each result is saved as <out>/<recording>.npz together with the fingerprint
+(modification time and size) of the recording and the analysis parameters,
+so a rerun with --resume only analyses new or changed recordings. The
+spectra go through the on-disk spectrum cache shared with the page (see
+analysis/cache.py). The summary table, one row per recording named by its
+path relative to the directory, is rebuilt from all results and written to
+<out>/summary.csv.
+
+    python -m analysis.batch server/recordings --out reports --resume
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analysis.cache import CACHE_DIR, SpectrumCache
+from analysis.resample import resample
+from analysis.spectral import binned_amplitude, welch
+from server.rawfile import TIMES_SUFFIX, RawRecording
+from server.storage import INDEX_FILE, Recording
+
+AXES = ("ax", "ay", "az")
+FS = 200  # Sample rate of CSV files without timestamps, like the page
+BIN_WIDTH = 1.0  # Hz, like the page's FFT
+NPERSEG = 256  # Segment length of the Welch PSD, like the page's spectrogram
+GAP_PERIODS = 2  # Missing time, in sample periods, counted as a gap
+SUMMARY_FILE = "summary.csv"
+FEATURES = ("mean_g", "rms_g", "peak_g", "p2p_g", "crest", "kurtosis", "peak_hz")
+
+_caches = {}  # SpectrumCache of each worker process, by directory
+
+
+def find_recordings(directory):
+    """
+    Lists the recordings under a directory.
+    Returns:
+        A sorted list of (path, kind) with kind "chunks", "raw" or "csv".
+    """
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.endswith(".summary"))
+        if INDEX_FILE in files:
+            found.append((root, "chunks"))
+            dirs[:] = []
+            continue
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.endswith(".raw"):
+                found.append((path, "raw"))
+            elif name.endswith(".csv") and not name.endswith(".features.csv") and name != SUMMARY_FILE:
+                found.append((path, "csv"))
+    return sorted(found)
+
+
+def fingerprint(path, kind):
+    """
+    Modification time and size of the files of a recording, which change
+    whenever data are appended.
+    """
+    if kind == "chunks":
+        files = [os.path.join(path, INDEX_FILE)]
+    else:
+        files = [path] + ([path + TIMES_SUFFIX] if os.path.exists(path + TIMES_SUFFIX) else [])
+    return [[os.stat(file).st_mtime_ns, os.stat(file).st_size] for file in files]
+
+
+def load(path, kind, fs=FS):
+    """
+    Loads a recording.
+    Returns:
+        A tuple (t, data, fs): sample times (s, None for CSV files without them),
+        the (n, 3) samples in g and the nominal sample rate.
+    """
+    if kind == "chunks":
+        recording = Recording(path)
+        t, data = recording.read()
+        return t, data, recording.fs or fs
+    if kind == "raw":
+        recording = RawRecording(path)
+        t, data = recording.read()
+        return t, data, recording.fs
+    df = pd.read_csv(path)
+    return (df["t"].to_numpy() if "t" in df else None), df[list(AXES)].to_numpy(), fs
+
+
+def features(x, f, psd):
+    """
+    Per-axis features of (n, 3) samples in g, and the frequency of the highest
+    PSD bin above 0 Hz.
+    Returns:
+        A dict of FEATURES, each an array with one value per axis.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    mean = x.mean(axis=0)
+    d = x - mean
+    variance = (d**2).mean(axis=0)
+    rms = np.sqrt(variance)
+    peak = np.abs(d).max(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crest = np.where(rms > 0, peak / rms, 0.0)
+        kurtosis = np.where(variance > 0, (d**4).mean(axis=0) / variance**2, 0.0)
+    return {
+        "mean_g": mean,
+        "rms_g": rms,
+        "peak_g": peak,
+        "p2p_g": x.max(axis=0) - x.min(axis=0),
+        "crest": crest,
+        "kurtosis": kurtosis,
+        "peak_hz": f[1 + np.argmax(psd[1:], axis=0)],
+    }
+
+
+def analyse(path, kind, fs=FS, bin_width=BIN_WIDTH, nperseg=NPERSEG, cache=None):
+    """
+    Analyses one recording.
+    Args:
+        cache: SpectrumCache for the spectra, or None.
+    Returns:
+        A tuple (row, arrays): the summary row (a dict) and the spectra.
+    """
+    t, x, fs = load(path, kind, fs)
+    gaps, gap_seconds = 0, 0.0
+    if t is not None and len(t) > 1:
+        missing = np.diff(t) - 1 / fs
+        missing = missing[missing > GAP_PERIODS / fs]
+        gaps, gap_seconds = len(missing), float(missing.sum())
+        t, x = resample(t, x, fs, mode="sinc", fill="linear")
+    row = {"samples": len(x), "duration_s": len(x) / fs, "fs": fs, "gaps": gaps, "gap_seconds": gap_seconds}
+    arrays = {}
+    if len(x) >= nperseg:
+        if cache is None:
+            edges, amplitude = binned_amplitude(x, fs, bin_width=bin_width)
+            f, psd = welch(x, fs, nperseg=nperseg)
+        else:
+            edges, amplitude = cache.compute(binned_amplitude, x, fs, bin_width=bin_width)
+            f, psd = cache.compute(welch, x, fs, nperseg=nperseg)
+        arrays = {"edges": edges, "amplitude": amplitude.astype(np.float32), "f": f, "psd": psd.astype(np.float32)}
+        for name, values in features(x, f, psd).items():
+            for axis, value in zip(AXES, values):
+                row[f"{axis[1]}_{name}"] = float(value)
+    return row, arrays
+
+
+def _result_path(out, name):
+    return os.path.join(out, name.replace(os.sep, "__") + ".npz")
+
+
+def _run(job):
+    """
+    Worker: analyses one recording and saves its result.
+    """
+    path, name, kind, result, params, stamp, cache_dir = job
+    if cache_dir is not None and cache_dir not in _caches:
+        _caches[cache_dir] = SpectrumCache(cache_dir)
+    try:
+        row, arrays = analyse(path, kind, **params, cache=_caches.get(cache_dir))
+    except Exception as error:  # A broken recording must not stop the batch
+        return path, f"{type(error).__name__}: {error}"
+    row = {"recording": name, "kind": kind, **row}  # Relative, so the directory can be given from anywhere
+    temp = f"{result}.{os.getpid()}.tmp"  # Not matched by the summary's *.npz, even if left by a killed worker
+    with open(temp, "wb") as file:  # A file name not ending in .npz would get one appended
+        np.savez(file, row=json.dumps(row), params=json.dumps(params), fingerprint=json.dumps(stamp), **arrays)
+    os.replace(temp, result)  # Readers never see a partial result
+    return path, None
+
+
+def _run_chunk(jobs):
+    return [_run(job) for job in jobs]
+
+
+def _cached_row(result, params, stamp):
+    """
+    Summary row of a saved result, or None if missing or stale.
+    """
+    try:
+        with np.load(result) as npz:
+            if json.loads(str(npz["params"])) != params or json.loads(str(npz["fingerprint"])) != stamp:
+                return None
+            return json.loads(str(npz["row"]))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def run(directory, out, workers=None, resume=False, chunk=4, fs=FS, bin_width=BIN_WIDTH, nperseg=NPERSEG,
+        cache_dir=CACHE_DIR):
+    """
+    Analyses every recording under directory into out and writes the summary.
+    Args:
+        workers: processes, os.cpu_count() by default.
+        resume: skip recordings whose saved result is up to date.
+        chunk: recordings per task sent to a worker.
+        cache_dir: spectrum cache directory, None to always compute.
+    Returns:
+        The summary DataFrame.
+    """
+    os.makedirs(out, exist_ok=True)
+    params = {"fs": fs, "bin_width": bin_width, "nperseg": nperseg}
+    jobs, skipped = [], 0
+    for path, kind in find_recordings(directory):
+        name = os.path.relpath(path, directory)
+        result = _result_path(out, name)
+        stamp = fingerprint(path, kind)
+        if resume and _cached_row(result, params, stamp) is not None:
+            skipped += 1
+            continue
+        jobs.append((path, name, kind, result, params, stamp, cache_dir))
+
+    start = time.perf_counter()
+    chunks = [jobs[i:i + chunk] for i in range(0, len(jobs), chunk)]
+    errors = 0
+    if chunks:
+        with ProcessPoolExecutor(workers) as executor:
+            for results in executor.map(_run_chunk, chunks):
+                for path, error in results:
+                    if error:
+                        errors += 1
+                        print(f"Error analysing {path}: {error}")
+    print(f"{len(jobs) - errors} recordings analysed in {time.perf_counter() - start:.1f} s, "
+          f"{skipped} unchanged, {errors} failed")
+
+    rows = []
+    for path in sorted(glob.glob(os.path.join(out, "*.npz"))):
+        with np.load(path) as npz:
+            row = json.loads(str(npz["row"]))
+        if os.path.exists(os.path.join(directory, row["recording"])):  # Results of deleted recordings are left out
+            rows.append(row)
+    summary = pd.DataFrame(rows)
+    temp = os.path.join(out, f"{SUMMARY_FILE}.tmp")
+    summary.to_csv(temp, index=False)
+    os.replace(temp, os.path.join(out, SUMMARY_FILE))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory", help="recordings, e.g. server/recordings")
+    parser.add_argument("--out", default="reports", help="results and summary table")
+    parser.add_argument("--workers", type=int, help="processes, all cores by default")
+    parser.add_argument("--chunk", type=int, default=4, help="recordings per task")
+    parser.add_argument("--resume", action="store_true", help="skip recordings analysed with the same parameters")
+    parser.add_argument("--fs", type=float, default=FS, help="sample rate of CSV files without timestamps")
+    parser.add_argument("--bin-width", type=float, default=BIN_WIDTH)
+    parser.add_argument("--nperseg", type=int, default=NPERSEG)
+    parser.add_argument("--cache", default=CACHE_DIR, help="spectrum cache directory")
+    parser.add_argument("--no-cache", action="store_true", help="compute every spectrum")
+    args = parser.parse_args()
+    summary = run(args.directory, args.out, args.workers, args.resume, args.chunk, args.fs, args.bin_width,
+                  args.nperseg, None if args.no_cache else args.cache)
+    columns = [c for c in ("recording", "duration_s", "gaps", "x_rms_g", "y_rms_g", "z_rms_g", "z_peak_hz")
+               if c in summary]
+    if len(summary):
+        print(summary[columns].to_string(index=False, float_format="%.4g"))
+    print(f"Summary of {len(summary)} recordings written to {os.path.join(args.out, SUMMARY_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
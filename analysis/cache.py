@@ -0,0 +1,182 @@
+"""
+Persistent on-disk cache of spectral results, shared by the Vibration
+Analysis page, the notebook and batch jobs.
+
+An entry is keyed by a hash of the sample block (its bytes, dtype and shape)
+and of the function name and parameters (window, nperseg, binning, ...), so
+the same spectrum of the same data is computed once whichever file or
+process it came from. Results are stored as float32 (complex64) arrays in an
+uncompressed .npz file per entry.
+
+Several processes may read and write the cache at once: an entry is written
+to a temporary file and renamed into place, so readers see it complete or
+not at all, and a file deleted while being read stays readable until it is
+closed. Reading an entry updates its modification time, and when the cache
+grows over its size budget the least recently used entries are deleted.
+
+    cache = SpectrumCache()
+    edges, binned = cache.compute(binned_amplitude, x, fs, bin_width=1)
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vibration_analysis", "spectra")
+MAX_BYTES = 512 * 1024**2  # Size budget of the cache
+EVICT_TO = 0.9  # Eviction deletes entries until the cache is this share of the budget
+STALE_TEMP = 3600  # Seconds after which a temporary file left by a crashed writer is deleted
+CACHE_VERSION = 1  # Part of every key: increment when a cached function changes its results
+
+
+def _compact(value):
+    value = np.asarray(value)
+    if np.issubdtype(value.dtype, np.complexfloating):
+        return value.astype(np.complex64)
+    if np.issubdtype(value.dtype, np.floating):
+        return value.astype(np.float32)
+    return value
+
+
+class SpectrumCache:
+    """
+    Args:
+        path: cache directory, created if needed.
+        max_bytes: size budget; None for no eviction.
+    """
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # Estimated size of the cache, from the last scan and the writes since
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, name, x, *args, **kwargs):
+        """
+        Hex digest identifying the result of name(x, *args, **kwargs).
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{CACHE_VERSION}:{name}".encode())
+        for label, value in [("x", x)] + list(enumerate(args)) + sorted(kwargs.items()):
+            if isinstance(value, np.ndarray) or label == "x":  # Arrays by content, e.g. a custom window
+                value = np.ascontiguousarray(value)
+                digest.update(f":{label}={value.dtype.str}{value.shape}".encode())
+                digest.update(memoryview(value).cast("B"))
+            elif isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                digest.update(f":{label}={float(value)!r}".encode())  # bin_width=1 is bin_width=1.0
+            else:
+                digest.update(f":{label}={value!r}".encode())
+        return digest.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], f"{key}.npz")
+
+    def get(self, key):
+        """
+        Returns the stored result (an array or a tuple of arrays), or None.
+        """
+        path = self._file(key)
+        try:
+            with np.load(path) as npz:
+                arrays = [npz[f"arr_{i}"] for i in range(len(npz.files) - 1)]
+                single = bool(npz["single"])
+        except (OSError, KeyError, ValueError):  # Missing, evicted or unreadable
+            return None
+        try:
+            os.utime(path)  # Most recently used
+        except OSError:
+            pass
+        return arrays[0] if single else tuple(arrays)
+
+    def put(self, key, result):
+        """
+        Stores an array or a tuple of arrays, as float32 where they are floating point.
+        """
+        single = not isinstance(result, tuple)
+        arrays = [_compact(value) for value in ([result] if single else result)]
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:  # Unique even between threads writing the same entry
+            np.savez(file, *arrays, single=single)
+        size = os.path.getsize(temp)
+        os.replace(temp, path)
+        if self.max_bytes is not None:
+            if self._size is None:
+                self._size = self._scan_size()
+            self._size += size
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def compute(self, function, x, *args, **kwargs):
+        """
+        Returns function(x, *args, **kwargs), from the cache when possible.
+        """
+        key = self.key(function.__name__, x, *args, **kwargs)
+        result = self.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = function(x, *args, **kwargs)
+        self.put(key, result)
+        return result
+
+    def _entries(self):
+        """
+        (modification time, size, path) of every entry; deletes stale temporary files.
+        """
+        entries = []
+        now = time.time()
+        for directory in os.scandir(self.path):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                try:
+                    stat = entry.stat()
+                except OSError:  # Deleted meanwhile
+                    continue
+                if entry.name.endswith(".tmp"):
+                    if now - stat.st_mtime > STALE_TEMP:
+                        self._remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:  # Already deleted by another process
+            pass
+
+    def evict(self):
+        """
+        Deletes the least recently used entries until the cache is within
+        EVICT_TO of its budget.
+        Returns the number of entries deleted.
+        """
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, entry_size, path in entries:
+            if size <= EVICT_TO * self.max_bytes:
+                break
+            self._remove(path)
+            size -= entry_size
+            removed += 1
+        self._size = size
+        return removed
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+        self._size = 0
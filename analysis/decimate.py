@@ -0,0 +1,109 @@
+"""
+Downsampling of long time series for plotting.
+
+MinMaxPyramid precomputes, for every column, the position of the minimum and
+maximum of fixed-size buckets at several resolutions. A query for any visible
+time range picks the finest level that fits the point budget, so the chart
+keeps every peak of the signal with a bounded number of points however long
+the recording. lttb is the Largest-Triangle-Three-Buckets algorithm, for one
+series without precomputation.
+"""
+
+import numpy as np
+
+MAX_POINTS = 2000  # Points per trace sent to the browser
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max index of an (N, k) series sampled at times t.
+    Args:
+        t: increasing (N,) sample times.
+        y: (N,) or (N, k) values; kept by reference, not copied.
+        leaf: bucket size of the finest level.
+        base: ratio between the bucket sizes of consecutive levels.
+    """
+
+    def __init__(self, t, y, leaf=4, base=4):
+        self.t = np.asarray(t)
+        self.y = np.asarray(y)
+        if self.y.ndim == 1:
+            self.y = self.y[:, None]
+        self.levels = []  # (bucket size, argmin indices, argmax indices), each (buckets, k)
+
+        n, k = self.y.shape
+        dtype = np.int32 if n < 2**31 else np.int64
+        bucket = leaf
+        lo = hi = self.y
+        ilo = ihi = np.broadcast_to(np.arange(n, dtype=dtype)[:, None], (n, k))
+        step = leaf
+        while bucket < n:
+            lo, ilo = _reduce(lo, ilo, step, np.argmin, np.inf)
+            hi, ihi = _reduce(hi, ihi, step, np.argmax, -np.inf)
+            self.levels.append((bucket, ilo, ihi))
+            bucket *= base
+            step = base
+
+    def query(self, start=None, end=None, max_points=MAX_POINTS):
+        """
+        Returns at most about max_points points per column between start and end.
+        Returns:
+            A tuple (t, y) of (m, k) arrays; each column has its own sample times.
+        """
+        first = 0 if start is None else np.searchsorted(self.t, start, side="left")
+        last = len(self.t) if end is None else np.searchsorted(self.t, end, side="right")
+        k = self.y.shape[1]
+        if last - first <= max_points or not self.levels:
+            idx = np.broadcast_to(np.arange(first, last)[:, None], (last - first, k))
+        else:
+            for bucket, ilo, ihi in self.levels:
+                if 2 * (last - first) / bucket <= max_points:
+                    break
+            b0, b1 = first // bucket, -(-last // bucket)
+            pairs = np.stack([ilo[b0:b1], ihi[b0:b1]], axis=1)  # (buckets, 2, k)
+            idx = np.sort(pairs, axis=1).reshape(-1, k)  # Time order within each bucket
+            idx = np.clip(idx, first, last - 1)
+        return self.t[idx], np.take_along_axis(self.y, idx, axis=0)
+
+
+def _reduce(values, indices, step, arg, fill):
+    """
+    Groups rows by step and keeps the extreme value of each group and its index.
+    """
+    n, k = values.shape
+    pad = -n % step
+    if pad:
+        values = np.concatenate([values, np.full((pad, k), fill, dtype=values.dtype)])
+        indices = np.concatenate([indices, np.repeat(indices[-1:], pad, axis=0)])
+    values = values.reshape(-1, step, k)
+    pick = arg(values, axis=1)[:, None, :]
+    return (
+        np.take_along_axis(values, pick, axis=1)[:, 0],
+        np.take_along_axis(indices.reshape(-1, step, k), pick, axis=1)[:, 0],
+    )
+
+
+def lttb(t, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling of one series.
+    Args:
+        t, y: (N,) times and values.
+        n_out: number of points to keep, at least 3.
+    Returns:
+        The indices of the kept points, first and last included.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)  # n_out - 2 buckets between the end points
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(hi, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        tc, yc = t[nxt].mean(), y[nxt].mean()  # Average of the next bucket
+        area = np.abs((t[a] - tc) * (y[lo:hi] - y[a]) - (t[a] - t[lo:hi]) * (yc - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
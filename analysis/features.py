@@ -0,0 +1,164 @@
+"""
+Vibration features of fixed-length windows of raw samples, the numpy
+version of raspberry_pi_pico/lib/features.py.
+
+In feature mode the Pico sends, per window and axis, the RMS, peak-to-peak,
+crest factor, kurtosis and dominant FFT bin instead of the samples. It
+computes them in integer arithmetic, and window_features repeats the same
+integer operations vectorised over all windows, so the server gets the same
+values bit for bit from a raw snapshot or a recording. to_physical converts
+them to g, Hz and plain ratios.
+"""
+
+import math
+
+import numpy as np
+
+FFT_SIZE = 256
+Q = 14  # Fixed-point fraction bits of the twiddle factors and the window
+FEATURES = ("rms", "p2p", "crest", "kurtosis", "peak_bin", "peak_amp")
+
+
+def _tables(n):
+    """
+    Sine, cosine (half a period) and Hann window of an n-point fixed-point FFT,
+    built from the same rounded quarter wave as on the Pico.
+    """
+    quarter = np.round(2**Q * np.sin(2 * np.pi * np.arange(n // 4 + 1) / n)).astype(np.int64)
+    k = np.arange(2 * n) % n
+    sine = np.select(
+        [k <= n // 4, k <= n // 2, k <= 3 * n // 4],
+        [quarter[np.minimum(k, n // 4)], quarter[np.clip(n // 2 - k, 0, n // 4)],
+         -quarter[np.clip(k - n // 2, 0, n // 4)]],
+        -quarter[np.clip(n - k, 0, n // 4)],
+    )
+    cosine = sine[n // 4:n // 4 + n]
+    return sine[:n // 2], cosine[:n // 2], (2**Q - cosine) >> 1
+
+
+def _bit_reverse(n):
+    bits = n.bit_length() - 1
+    i = np.arange(n)
+    return sum(((i >> b) & 1) << (bits - 1 - b) for b in range(bits))
+
+
+def fft_power(blocks, fft_size=FFT_SIZE):
+    """
+    Fixed-point power spectra of integer blocks, as on the Pico.
+    Args:
+        blocks: (..., fft_size, k) integer array.
+    Returns:
+        (..., fft_size // 2 + 1, k) int64 power of bins 0..fft_size / 2.
+    """
+    sine, cosine, hann = _tables(fft_size)
+    blocks = np.asarray(blocks, dtype=np.int64)
+    mean = np.floor_divide(blocks.sum(axis=-2, keepdims=True), fft_size)
+    re = ((blocks - mean) * hann[:, None]) >> Q
+    re = re[..., _bit_reverse(fft_size), :]
+    im = np.zeros_like(re)
+    shape = re.shape
+    size = 2
+    while size <= fft_size:
+        half = size // 2
+        w = np.arange(half) * (fft_size // size)
+        wr, wi = cosine[w][:, None], -sine[w][:, None]
+        re = re.reshape(shape[:-2] + (fft_size // size, size, shape[-1]))
+        im = im.reshape(re.shape)
+        ar, ai = re[..., :half, :], im[..., :half, :]
+        br, bi = re[..., half:, :], im[..., half:, :]
+        tr = (br * wr - bi * wi) >> Q
+        ti = (br * wi + bi * wr) >> Q
+        re = np.concatenate([(ar + tr) >> 1, (ar - tr) >> 1], axis=-2).reshape(shape)
+        im = np.concatenate([(ai + ti) >> 1, (ai - ti) >> 1], axis=-2).reshape(shape)
+        size *= 2
+    re, im = re[..., :fft_size // 2 + 1, :], im[..., :fft_size // 2 + 1, :]
+    return re * re + im * im
+
+
+def _sum_fourth(d2):
+    """
+    Exact sum over axis 1 of d2 ** 2 for 0 <= d2 < 2 ** 32, which overflows
+    int64 when squared: d2 is split into 16-bit halves.
+    Returns:
+        An object array of Python ints.
+    """
+    hi, lo = d2 >> 16, d2 & 0xFFFF
+    return (
+        (hi * hi).sum(axis=1).astype(object) * 2**32
+        + (hi * lo).sum(axis=1).astype(object) * 2**17
+        + (lo * lo).sum(axis=1).astype(object)
+    )
+
+
+def window_values(n, s1, s2, s3, s4, lo, hi, power, spectra):
+    """
+    FEATURES of one axis from the exact power sums s1..s4 of n samples, their
+    minimum and maximum (all relative to the same reference) and the summed
+    FFT power of spectra blocks; the same integer formulas as on the Pico.
+    """
+    c2 = n * s2 - s1 * s1  # n^2 times the variance
+    c4 = n * n * n * s4 - 4 * n * n * s1 * s3 + 6 * n * s1 * s1 * s2 - 3 * s1 * s1 * s1 * s1  # n^4 m4
+    peak = max(n * hi - s1, s1 - n * lo)  # n times the largest distance from the mean
+    rms = math.isqrt(256 * c2) // n if n else 0
+    crest = math.isqrt(peak * peak * 1000000 // c2) if c2 else 0
+    kurtosis = c4 * 1000 // (c2 * c2) if c2 else 0
+    peak_bin = peak_amp = 0
+    if spectra:
+        peak_bin = 1 + int(np.argmax(power[1:]))
+        peak_amp = math.isqrt(int(power[peak_bin]) // spectra)
+    return [rms, hi - lo, crest, kurtosis, peak_bin, peak_amp]
+
+
+def window_features(raw, window, fft_size=FFT_SIZE):
+    """
+    Features of consecutive windows of raw counts, as a Pico in feature mode
+    would send them for the same samples.
+    Args:
+        raw: (N, k) integer counts.
+        window: samples per window; an incomplete last window is left out.
+    Returns:
+        (N // window, k, len(FEATURES)) int64 array.
+    """
+    raw = np.asarray(raw, dtype=np.int64)
+    m, k = len(raw) // window, raw.shape[1]
+    x = raw[:m * window].reshape(m, window, k)
+    d = x - x[:, :1]  # Relative to the first sample of each window, like the Pico
+    d2 = d * d
+    s1, s2, s3 = d.sum(axis=1), d2.sum(axis=1), (d2 * d).sum(axis=1)
+    s4 = _sum_fourth(d2)
+    lo, hi = d.min(axis=1), d.max(axis=1)
+    spectra = window // fft_size
+    if spectra:
+        blocks = d[:, :spectra * fft_size].reshape(m, spectra, fft_size, k)
+        power = fft_power(blocks, fft_size).sum(axis=1)  # (m, bins, k)
+    out = np.zeros((m, k, len(FEATURES)), dtype=np.int64)
+    for i in range(m):
+        for j in range(k):
+            out[i, j] = window_values(
+                window, int(s1[i, j]), int(s2[i, j]), int(s3[i, j]), s4[i, j], int(lo[i, j]), int(hi[i, j]),
+                power[i, :, j] if spectra else None, spectra,
+            )
+    return out
+
+
+def to_physical(values, fs, lsb, fft_size=FFT_SIZE):
+    """
+    Converts integer features to physical units.
+    Args:
+        values: (..., len(FEATURES)) integer features.
+        fs: sample rate (Hz).
+        lsb: counts per g of the accelerometer range.
+    Returns:
+        A dict of arrays: rms_g, p2p_g, crest, kurtosis, peak_hz and peak_g, the
+        amplitude of a sine at the peak frequency (exact for one on a bin centre).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rms, p2p, crest, kurtosis, peak_bin, peak_amp = np.moveaxis(values, -1, 0)
+    return {
+        "rms_g": rms / 16 / lsb,
+        "p2p_g": p2p / lsb,
+        "crest": crest / 1000,
+        "kurtosis": kurtosis / 1000,
+        "peak_hz": peak_bin * fs / fft_size,
+        "peak_g": 4 * peak_amp / lsb,  # The FFT halves at each stage and the Hann window halves a tone
+    }
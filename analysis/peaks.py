@@ -0,0 +1,159 @@
+"""
+Peak detection and harmonic families in power spectra, for unattended
+monitoring of rotating machines.
+
+Spectra are (..., bins, k) power arrays on a uniform frequency grid, e.g. a
+Welch PSD (bins, k) or one PSD per window of a recording (m, bins, k), and
+every function works on all of them at once. A peak is a local maximum that
+stands out of the noise floor, a running median over frequency, by more
+than a threshold fitted to each spectrum: SNR_DB, or N_SIGMA times the robust
+spread of the spectrum around its floor if that is larger. Its frequency and
+power are refined by fitting a parabola to the logarithm of the three bins
+around it, which is accurate to a few hundredths of a bin with the Hann
+window. harmonic_families then picks, among the peaks of each spectrum, the
+fundamental that explains the most of them as its 1x, 2x, 3x ... orders.
+
+    f, psd = welch(x, fs, nperseg=1024)
+    families = harmonic_families(find_peaks(f, psd))
+"""
+
+import numpy as np
+
+from .spectral import welch
+
+NOISE_WIDTH = 15  # Bins of the running median that estimates the noise floor (odd)
+SNR_DB = 6.0  # Smallest height of a peak above the noise floor
+N_SIGMA = 4.0  # Threshold in robust standard deviations of the spectrum around its floor
+MAX_PEAKS = 16  # Strongest peaks kept per spectrum
+HARMONICS = 3  # Orders of a family: 1x, 2x, 3x
+TOLERANCE = 0.02  # Largest relative distance of a peak from an order of the fundamental
+
+
+def noise_floor(power, width=NOISE_WIDTH):
+    """
+    Running median of (..., bins, k) power over width bins, edges repeated.
+    """
+    power = np.asarray(power)
+    half = width // 2
+    pad = [(0, 0)] * power.ndim
+    pad[-2] = (half, half)
+    padded = np.pad(power, pad, mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, width, axis=-2)  # (..., bins, k, width)
+    return np.median(windows, axis=-1)
+
+
+def find_peaks(f, power, snr_db=SNR_DB, n_sigma=N_SIGMA, max_peaks=MAX_PEAKS, width=NOISE_WIDTH):
+    """
+    Strongest peaks of every spectrum.
+    Args:
+        f: (bins,) uniformly spaced frequencies (Hz).
+        power: (..., bins, k) power spectra.
+    Returns:
+        A dict of (..., max_peaks, k) arrays, strongest peak first and NaN where
+        a spectrum has fewer peaks: frequency (Hz, interpolated), power
+        (interpolated) and snr_db (height above the noise floor); and
+        threshold_db, the (..., k) threshold fitted to each spectrum.
+    """
+    f = np.asarray(f, dtype=np.float64)
+    power = np.asarray(power, dtype=np.float64)
+    tiny = np.finfo(np.float64).tiny
+    log_power = np.log(np.maximum(power, tiny))
+    ratio_db = 10 / np.log(10) * (log_power - np.log(np.maximum(noise_floor(power, width), tiny)))
+    center = np.median(ratio_db, axis=-2, keepdims=True)
+    sigma = 1.4826 * np.median(np.abs(ratio_db - center), axis=-2, keepdims=True)  # Robust standard deviation
+    threshold_db = np.maximum(snr_db, center + n_sigma * sigma)
+
+    middle = power[..., 1:-1, :]
+    is_peak = (middle > power[..., :-2, :]) & (middle >= power[..., 2:, :]) & (ratio_db[..., 1:-1, :] > threshold_db)
+    score = np.where(is_peak, middle, -np.inf)
+    count = min(max_peaks, score.shape[-2])
+    order = np.argsort(-score, axis=-2)[..., :count, :]
+    found = np.take_along_axis(score, order, axis=-2) > -np.inf
+    index = order + 1  # Bin of each peak in power
+
+    a, b, c = (np.take_along_axis(log_power, index + shift, axis=-2) for shift in (-1, 0, 1))
+    curvature = a - 2 * b + c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = np.where(curvature < 0, 0.5 * (a - c) / curvature, 0.0)
+    delta = np.clip(delta, -0.5, 0.5)
+    df = f[1] - f[0]
+    frequency = f[0] + (index + delta) * df
+    peak_log = b - 0.25 * (a - c) * delta
+    snr = np.take_along_axis(ratio_db, index, axis=-2)
+    shape = power.shape[:-2] + (max_peaks, power.shape[-1])
+    out = {name: np.full(shape, np.nan) for name in ("frequency", "power", "snr_db")}
+    for name, values in (("frequency", frequency), ("power", np.exp(peak_log)), ("snr_db", snr)):
+        out[name][..., :count, :] = np.where(found, values, np.nan)
+    out["threshold_db"] = threshold_db[..., 0, :]
+    return out
+
+
+def harmonic_families(peaks, harmonics=HARMONICS, tolerance=TOLERANCE):
+    """
+    Fundamental of every spectrum and the peaks at its orders.
+    Each peak is tried as the fundamental; a peak belongs to order n when its
+    frequency is within tolerance * n of n times the fundamental. The
+    fundamental with the most orders present wins, ties going to the one whose
+    orders hold the most power.
+    Args:
+        peaks: result of find_peaks.
+    Returns:
+        A dict of arrays: fundamental (..., k) in Hz, NaN without peaks; orders
+        (..., k), the number of orders present, 1 for a lone peak; frequency
+        and power (..., harmonics, k) of the strongest peak at each order, NaN
+        where absent.
+    """
+    frequency, power = peaks["frequency"], peaks["power"]
+    f0 = frequency[..., None, :, :]  # (..., 1, candidates, k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = frequency[..., :, None, :] / f0  # (..., peaks, candidates, k)
+        n = np.rint(ratio)
+        match = (n >= 1) & (n <= harmonics) & (np.abs(ratio - n) <= tolerance * n)
+    weight = np.where(match, np.nan_to_num(power)[..., :, None, :], 0.0)
+    per_order = np.stack([np.where(n == h, weight, 0.0).max(axis=-3) for h in range(1, harmonics + 1)], axis=-3)
+    present = (per_order > 0).sum(axis=-3)  # (..., candidates, k)
+    total = per_order.sum(axis=-3)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = np.nan_to_num(total / total.max(axis=-2, keepdims=True))
+    best = np.argmax(present + 0.999 * share, axis=-2)[..., None, :]  # (..., 1, k)
+
+    fundamental = np.take_along_axis(frequency, best, axis=-2)[..., 0, :]
+    orders = np.take_along_axis(present, best, axis=-2)[..., 0, :]
+    out_frequency, out_power = [], []
+    for h in range(1, harmonics + 1):
+        at_order = np.take_along_axis(np.where(n == h, weight, 0.0), best[..., None, :, :], axis=-2)[..., 0, :]
+        strongest = np.argmax(at_order, axis=-2)[..., None, :]  # (..., 1, k)
+        value = np.take_along_axis(at_order, strongest, axis=-2)[..., 0, :]
+        out_frequency.append(np.where(value > 0, np.take_along_axis(frequency, strongest, axis=-2)[..., 0, :], np.nan))
+        out_power.append(np.where(value > 0, value, np.nan))
+    return {
+        "fundamental": fundamental,
+        "orders": orders,
+        "frequency": np.stack(out_frequency, axis=-2),
+        "power": np.stack(out_power, axis=-2),
+    }
+
+
+def track(x, fs, window=10.0, nperseg=1024, **kwargs):
+    """
+    Peaks and harmonic family of every window of a recording, e.g. to follow
+    the running speed of a machine (the fundamental) over time.
+    Args:
+        x: (N, k) samples.
+        window: seconds per window; each gets a Welch PSD with nperseg segments,
+            all computed in one call.
+        kwargs: passed to find_peaks.
+    Returns:
+        A tuple (t, peaks, families): the start of every window (s) and the
+        results of find_peaks and harmonic_families with a leading window axis.
+    """
+    x = np.asarray(x)
+    length = int(window * fs)
+    m, k = len(x) // length, x.shape[1]
+    if m == 0 or length < nperseg:
+        raise ValueError(f"Need at least one window of {max(length, nperseg)} samples")
+    columns = x[:m * length].reshape(m, length, k).transpose(1, 0, 2).reshape(length, m * k)
+    f, psd = welch(columns, fs, nperseg=nperseg)
+    psd = psd.reshape(len(f), m, k).transpose(1, 0, 2)
+    peaks = find_peaks(f, psd, **kwargs)
+    return np.arange(m) * window, peaks, harmonic_families(peaks)
@@ -0,0 +1,188 @@
+"""
+Resampling of timestamped samples onto a uniform grid.
+
+The FFT-based routines assume samples exactly 1 / fs apart, while recorded
+sample times jitter, drift and have gaps. StreamingResampler interpolates
+timestamped blocks onto the grid t = k / fs (absolute, so consecutive blocks
+and devices share it), either linearly or with a Kaiser-windowed sinc kernel
+that also band-limits the signal to half the lower of the two rates. It
+consumes blocks in time order and keeps only the few input samples the
+kernel still needs, so it can run over the ingestion stream or a recording
+of any length.
+
+Gaps longer than max_gap are either filled (with a constant, NaN by default,
+or by linear interpolation across the gap) or split the output into separate
+contiguous segments.
+"""
+
+import numpy as np
+
+HALF_WIDTH = 8  # Input samples on each side of an output point for "sinc"
+KAISER_BETA = 8.6  # Sidelobes about -90 dB
+BATCH = 65536  # Output points computed per vectorised step
+
+
+class StreamingResampler:
+    """
+    Incremental resampling of every column of a timestamped stream.
+    Args:
+        fs: output sample rate (Hz).
+        mode: "linear" or "sinc". "sinc" is exact for band-limited signals on evenly
+            spaced stretches, like the per-packet sample times of the recordings;
+            "linear" does not overshoot where the spacing is irregular.
+        max_gap: longest time between input samples (s) interpolated over,
+            3 output periods by default.
+        gaps: "fill" to keep the grid continuous through gaps, "split" to end a
+            segment at each gap.
+        fill: value of the grid points inside a gap with gaps="fill", or
+            "linear" to interpolate between the samples on each side.
+        half_width: kernel half-width for "sinc", in input samples.
+    """
+
+    def __init__(self, fs, mode="linear", max_gap=None, gaps="fill", fill=np.nan, half_width=HALF_WIDTH):
+        if mode not in ("linear", "sinc"):
+            raise ValueError("mode must be 'linear' or 'sinc'")
+        if gaps not in ("fill", "split"):
+            raise ValueError("gaps must be 'fill' or 'split'")
+        self.fs = fs
+        self.mode = mode
+        self.max_gap = 3 / fs if max_gap is None else max_gap
+        self.gaps = gaps
+        self.fill = fill
+        self.half_width = half_width if mode == "sinc" else 0
+        self.period = None  # Kernel unit (s): the longer of the input and output periods
+        self._neighbours = self.half_width  # Input samples on each side covering the kernel
+        self._t = None  # Input samples not yet fully used
+        self._x = None
+        self._next = None  # Grid index of the next output point
+
+    def update(self, t, x):
+        """
+        Consumes samples x, (n,) or (n, k), taken at increasing times t (s).
+        Returns:
+            A list of (t0, y) segments of the output: y holds consecutive grid
+            points from t0. Usually one segment, none while the kernel waits for
+            more input, several after gaps with gaps="split".
+        """
+        return self._process(t, x, final=False)
+
+    def flush(self):
+        """
+        Resamples the remaining input, up to the last sample, and resets the stream.
+        """
+        if self._t is None:
+            return []
+        segments = self._process(self._t[:0], self._x[:0], final=True)
+        self._t = self._x = self._next = None
+        return segments
+
+    def _process(self, t, x, final):
+        t = np.asarray(t, dtype=np.float64)
+        x = np.asarray(x, dtype=np.float64)
+        if x.ndim == 1:
+            x = x[:, None]
+        if self._t is not None:
+            t, x = np.concatenate([self._t, t]), np.concatenate([self._x, x])
+        keep = np.r_[True, t[1:] > np.maximum.accumulate(t)[:-1]]  # Drop repeated or out-of-order times
+        t, x = t[keep], x[keep]
+        if not len(t):
+            return []
+        if self.period is None and len(t) > 1:
+            input_period = np.median(np.diff(t))
+            self.period = max(input_period, 1 / self.fs)
+            self._neighbours = int(np.ceil(self.half_width * self.period / input_period))
+        period = self.period or 1 / self.fs
+        if self._next is None:
+            self._next = int(np.ceil(t[0] * self.fs))
+
+        segments = []
+        runs = np.split(np.arange(len(t)), np.flatnonzero(np.diff(t) > self.max_gap) + 1)
+        for i, run in enumerate(runs):
+            a, b = run[0], run[-1]
+            if self._next < np.ceil(t[a] * self.fs):  # Starting after a gap in split mode
+                self._next = int(np.ceil(t[a] * self.fs))
+            last = i == len(runs) - 1
+            # The open run can only be resampled where the kernel has all its input
+            limit = t[b] if final or not last else t[b] - self.half_width * period
+            stop = int(np.floor(limit * self.fs)) + 1
+            if stop > self._next:
+                grid = np.arange(self._next, stop) / self.fs
+                self._emit(segments, grid, self._interpolate(grid, t[a:b + 1], x[a:b + 1], period))
+                self._next = stop
+            if last:
+                break
+            gap_end = int(np.ceil(t[b + 1] * self.fs))  # First grid point of the next run
+            if self.gaps == "fill" and gap_end > self._next:
+                grid = np.arange(self._next, gap_end) / self.fs
+                if self.fill == "linear":
+                    values = np.column_stack(
+                        [np.interp(grid, t[b:b + 2], x[b:b + 2, j]) for j in range(x.shape[1])]
+                    )
+                else:
+                    values = np.full((len(grid), x.shape[1]), self.fill)
+                self._emit(segments, grid, values)
+            elif self.gaps == "split":
+                segments.append(None)  # Marks the end of a segment
+            self._next = gap_end
+
+        # Keep the input the kernel needs for the next grid points
+        first = np.searchsorted(t, self._next / self.fs - (self.half_width + 1) * period) if not final else len(t)
+        first = min(first, len(t) - 1) if not final else first
+        self._t, self._x = t[first:], x[first:]
+        return [segment for segment in segments if segment is not None]
+
+    @staticmethod
+    def _emit(segments, grid, values):
+        if segments and segments[-1] is not None:
+            t0, previous = segments[-1]
+            segments[-1] = (t0, np.concatenate([previous, values]))
+        else:
+            segments.append((grid[0], values))
+
+    def _interpolate(self, grid, t, x, period):
+        if self.mode == "linear" or len(t) == 1:
+            return np.column_stack([np.interp(grid, t, x[:, j]) for j in range(x.shape[1])])
+        out = np.empty((len(grid), x.shape[1]))
+        offsets = np.arange(-self._neighbours, self._neighbours)
+        for i in range(0, len(grid), BATCH):
+            g = grid[i:i + BATCH]
+            index = np.searchsorted(t, g)[:, None] + offsets
+            valid = (index >= 0) & (index < len(t))
+            index = np.clip(index, 0, len(t) - 1)
+            d = (g[:, None] - t[index]) / period  # Distance in kernel units
+            inside = np.clip(1 - (d / self.half_width) ** 2, 0, None)
+            w = np.sinc(d) * np.i0(KAISER_BETA * np.sqrt(inside)) / np.i0(KAISER_BETA) * valid
+            w /= w.sum(axis=1, keepdims=True)  # Unit DC gain, also near the edges and with jitter
+            out[i:i + BATCH] = np.einsum("mk,mkc->mc", w, x[index])
+        return out
+
+
+def resample(t, x, fs, chunk=None, **kwargs):
+    """
+    Runs a StreamingResampler over the samples x taken at times t, chunk samples
+    at a time (all at once by default).
+    Returns:
+        With gaps="fill", a tuple (t, y) of the uniform grid and the resampled
+        values, with the trailing shape of x; with gaps="split", the list of
+        (t0, y) segments.
+    """
+    x = np.asarray(x)
+    chunk = chunk or max(len(t), 1)
+    resampler = StreamingResampler(fs, **kwargs)
+    segments = []
+    for i in range(0, len(t), chunk):
+        segments += resampler.update(t[i:i + chunk], x[i:i + chunk])
+    segments += resampler.flush()
+    if resampler.gaps == "split":
+        merged = []
+        for t0, values in segments:  # Segments that continue across chunks
+            if merged and round(t0 * fs) == round(merged[-1][0] * fs) + len(merged[-1][1]):
+                merged[-1] = (merged[-1][0], np.concatenate([merged[-1][1], values]))
+            else:
+                merged.append((t0, values))
+        return [(t0, values.reshape((len(values),) + x.shape[1:])) for t0, values in merged]
+    if not segments:
+        return np.empty(0), np.empty((0,) + x.shape[1:])
+    y = np.concatenate([values for _, values in segments])
+    grid = segments[0][0] + np.arange(len(y)) / fs
+    return grid, y.reshape((len(y),) + x.shape[1:])
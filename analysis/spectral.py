@@ -0,0 +1,156 @@
+"""
+Spectral analysis of (N, 3) acceleration arrays.
+
+All functions work on every column at once: one batched rfft over axis 0 and
+a single reduction to average the spectrum into frequency bins, or, for the
+Welch estimate, one rfft per batch of windowed segments. They are pure
+functions of their inputs and return plain numpy arrays, so their results can
+be cached by the caller.
+"""
+
+import numpy as np
+
+
+def rfft(x, fs):
+    """
+    One-sided FFT of every column of x.
+    Args:
+        x: (N,) or (N, k) array of samples.
+        fs: sample rate (Hz).
+    Returns:
+        A tuple (f, X): the N // 2 + 1 non-negative frequencies (Hz) and the
+        complex spectrum, with the same trailing shape as x.
+    """
+    x = np.asarray(x)
+    return np.fft.rfftfreq(len(x), 1 / fs), np.fft.rfft(x, axis=0)
+
+
+def amplitude(x, fs):
+    """
+    Magnitude of the one-sided FFT of every column of x, see rfft.
+    """
+    f, X = rfft(x, fs)
+    return f, np.abs(X)
+
+
+def bin_mean(f, values, edges):
+    """
+    Averages values over frequency bins, like dividing a weighted np.histogram
+    by an unweighted one, for all columns in a single pass. The DC component
+    (f == 0) is left out.
+    Args:
+        f: increasing frequencies (Hz), as returned by rfft.
+        values: (len(f),) or (len(f), k) array to average, e.g. amplitude or phase.
+        edges: increasing bin edges; bins are [edges[i], edges[i + 1]) and the last bin is closed.
+    Returns:
+        A (len(edges) - 1,) or (len(edges) - 1, k) array; empty bins are NaN.
+    """
+    values = np.asarray(values)
+    first = np.searchsorted(f, 0, side="right")  # Skip DC
+    f, values = f[first:], values[first:]
+
+    starts = np.searchsorted(f, edges[:-1], side="left")
+    stops = np.append(starts[1:], np.searchsorted(f, edges[-1], side="right"))
+    counts = stops - starts
+    f, values = f[:stops[-1]], values[:stops[-1]]  # Else reduceat sums the last bin up to the end
+    if not len(f):  # No frequency inside the edges
+        return np.full((len(edges) - 1,) + values.shape[1:], np.nan)
+
+    sums = np.add.reduceat(values, np.minimum(starts, len(f) - 1), axis=0)
+    sums[counts == 0] = 0  # reduceat returns the element at the start index for empty ranges
+    with np.errstate(invalid="ignore"):
+        return sums / counts.reshape((-1,) + (1,) * (values.ndim - 1))
+
+
+def bin_edges(fs, bin_width=1.0):
+    """
+    Bin edges from 0 Hz to the Nyquist frequency.
+    """
+    return np.arange(0, fs / 2 + bin_width, bin_width)
+
+
+def binned_amplitude(x, fs, edges=None, bin_width=1.0):
+    """
+    Amplitude spectrum of every column of x averaged into frequency bins.
+    Args:
+        x: (N,) or (N, k) array of samples.
+        fs: sample rate (Hz).
+        edges: bin edges (Hz); defaults to bin_width wide bins up to fs / 2.
+    Returns:
+        A tuple (edges, binned) with binned of shape (len(edges) - 1, k).
+    """
+    if edges is None:
+        edges = bin_edges(fs, bin_width)
+    f, mag = amplitude(x, fs)
+    return edges, bin_mean(f, mag, edges)
+
+
+def get_window(name, n):
+    """
+    Periodic (DFT-even) window of length n, the usual choice for spectral
+    estimation. name is "hann", "hamming", "flattop" or "boxcar".
+    """
+    k = 2 * np.pi * np.arange(n) / n
+    if name == "hann":
+        return 0.5 - 0.5 * np.cos(k)
+    if name == "hamming":
+        return 0.54 - 0.46 * np.cos(k)
+    if name == "flattop":  # Best amplitude accuracy for spectrum scaling
+        a = (0.21557895, 0.41663158, 0.277263158, 0.083578947, 0.006947368)
+        return sum((-1) ** i * a_i * np.cos(i * k) for i, a_i in enumerate(a))
+    if name == "boxcar":
+        return np.ones(n)
+    raise ValueError(f"Unknown window '{name}'")
+
+
+def welch(x, fs, nperseg=256, noverlap=None, window="hann", scaling="density", detrend=True,
+          batch=256):
+    """
+    Welch averaged periodogram of every column of x.
+    Segments are strided views of x, and each batch of segments is windowed
+    and transformed in one rfft. Working memory is bounded by
+    batch * nperseg samples per column, whatever the length of x, so x can
+    be a memory-mapped recording.
+    Args:
+        x: (N,) or (N, k) array of samples, N >= nperseg.
+        fs: sample rate (Hz).
+        nperseg: segment length; the frequency resolution is fs / nperseg.
+        noverlap: samples shared by consecutive segments, nperseg // 2 by default.
+        window: window name, see get_window, or an array of length nperseg.
+        scaling: "density" for a PSD in g^2/Hz, "spectrum" for a power spectrum in g^2.
+        detrend: subtract the mean of each segment.
+        batch: segments transformed per rfft call.
+    Returns:
+        A tuple (f, Pxx): the nperseg // 2 + 1 frequencies (Hz) and the one-sided
+        estimate, with the same trailing shape as x.
+    """
+    x = np.asarray(x)
+    if noverlap is None:
+        noverlap = nperseg // 2
+    if not 0 <= noverlap < nperseg:
+        raise ValueError("noverlap must be in [0, nperseg)")
+    if len(x) < nperseg:
+        raise ValueError(f"Signal of {len(x)} samples is shorter than nperseg={nperseg}")
+
+    w = get_window(window, nperseg) if isinstance(window, str) else np.asarray(window, dtype=float)
+    if scaling == "density":
+        scale = 1 / (fs * np.sum(w**2))
+    elif scaling == "spectrum":
+        scale = 1 / np.sum(w) ** 2
+    else:
+        raise ValueError("scaling must be 'density' or 'spectrum'")
+
+    step = nperseg - noverlap
+    segments = np.lib.stride_tricks.sliding_window_view(x, nperseg, axis=0)[::step]  # (nseg, ..., nperseg)
+    w = w.astype(np.result_type(x.dtype, np.float32), copy=False)
+
+    total = 0
+    for i in range(0, len(segments), batch):
+        block = segments[i:i + batch]
+        if detrend:
+            block = block - block.mean(axis=-1, keepdims=True)
+        total = total + np.sum(np.abs(np.fft.rfft(block * w, axis=-1)) ** 2, axis=0)
+
+    psd = np.moveaxis(total, -1, 0) * (scale / len(segments))
+    psd[1:nperseg // 2 + (nperseg % 2)] *= 2  # One-sided: fold negative frequencies, except DC and Nyquist
+    return np.fft.rfftfreq(nperseg, 1 / fs), psd
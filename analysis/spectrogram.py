@@ -0,0 +1,140 @@
+"""
+Streaming short-time Fourier transform for time-frequency displays.
+
+StreamingSpectrogram consumes samples chunk by chunk and keeps only a
+decimated float32 power array sized for display. Complex STFT frames exist
+only for the segments of the chunk being processed.
+"""
+
+import numpy as np
+
+from .spectral import get_window
+
+
+class StreamingSpectrogram:
+    """
+    Incremental power spectrogram of every column of a stream.
+    Args:
+        fs: sample rate (Hz).
+        nperseg: segment length; the frequency resolution is fs / nperseg.
+        noverlap: samples shared by consecutive segments, nperseg // 2 by default.
+        window: window name, see analysis.spectral.get_window.
+        max_frames: frames kept for display (even). When full, neighbouring frames
+            are averaged in pairs, so memory stays constant however long the stream.
+        batch: segments transformed per rfft call.
+    Attributes:
+        frequencies: the nperseg // 2 + 1 frequencies (Hz).
+        factor: number of STFT segments averaged into each stored frame.
+    """
+
+    def __init__(self, fs, nperseg=256, noverlap=None, window="hann", max_frames=600, batch=256):
+        if noverlap is None:
+            noverlap = nperseg // 2
+        if not 0 <= noverlap < nperseg:
+            raise ValueError("noverlap must be in [0, nperseg)")
+        if max_frames < 2 or max_frames % 2:
+            raise ValueError("max_frames must be an even number >= 2")
+        self.fs = fs
+        self.nperseg = nperseg
+        self.step = nperseg - noverlap
+        self.max_frames = max_frames
+        self.batch = batch
+        self.frequencies = np.fft.rfftfreq(nperseg, 1 / fs)
+        self.factor = 1
+        self._window = get_window(window, nperseg).astype(np.float32)
+        self._scale = 1 / (fs * np.sum(self._window.astype(np.float64) ** 2))  # PSD scaling, g^2/Hz
+        self._tail = None  # Samples not yet covered by a complete segment
+        self._frames = None  # (max_frames, bins, k), allocated on the first update
+        self._count = 0
+        self._acc = None  # Sum of the segments of the frame being filled
+        self._acc_n = 0
+
+    def update(self, block):
+        """
+        Consumes an (n,) or (n, k) block of samples.
+        Returns:
+            The number of frames stored so far.
+        """
+        block = np.asarray(block, dtype=np.float32)
+        if block.ndim == 1:
+            block = block[:, None]
+        data = block if self._tail is None else np.concatenate([self._tail, block])
+        segments = 0 if len(data) < self.nperseg else (len(data) - self.nperseg) // self.step + 1
+
+        if self._frames is None:
+            self._frames = np.zeros((self.max_frames, len(self.frequencies), data.shape[1]), np.float32)
+            self._acc = np.zeros(self._frames.shape[1:], np.float64)
+
+        views = np.lib.stride_tricks.sliding_window_view(data, self.nperseg, axis=0)[::self.step]
+        for i in range(0, segments, self.batch):
+            batch = views[i:min(i + self.batch, segments)]  # (m, k, nperseg)
+            batch = (batch - batch.mean(axis=-1, keepdims=True)) * self._window
+            power = np.abs(np.fft.rfft(batch, axis=-1)) ** 2 * self._scale
+            power[..., 1:(self.nperseg + 1) // 2] *= 2  # One-sided
+            self._push(np.swapaxes(power, 1, 2))  # (m, bins, k)
+
+        self._tail = data[segments * self.step:].copy()
+        return self._count
+
+    def _push(self, power):
+        while len(power):
+            if self._count == self.max_frames:
+                self._compact()
+            if self._acc_n:  # Complete the frame being filled first
+                take = min(self.factor - self._acc_n, len(power))
+                self._acc += power[:take].sum(axis=0)
+                self._acc_n += take
+                power = power[take:]
+                if self._acc_n == self.factor:
+                    self._frames[self._count] = self._acc / self.factor
+                    self._count += 1
+                    self._acc[:] = 0
+                    self._acc_n = 0
+                continue
+            m = min(len(power) // self.factor, self.max_frames - self._count)
+            if m:
+                full = power[:m * self.factor].reshape((m, self.factor) + power.shape[1:])
+                self._frames[self._count:self._count + m] = full.mean(axis=1)
+                self._count += m
+                power = power[m * self.factor:]
+            else:  # Fewer segments than one frame
+                self._acc += power.sum(axis=0)
+                self._acc_n = len(power)
+                power = power[:0]
+
+    def _compact(self):
+        half = self._count // 2
+        self._frames[:half] = (self._frames[0:self._count:2] + self._frames[1:self._count:2]) / 2
+        self._count = half
+        self.factor *= 2
+
+    @property
+    def power(self):
+        """
+        (frames, bins, k) float32 PSD in g^2/Hz, a view of the internal buffer.
+        """
+        if self._frames is None:
+            return np.zeros((0, len(self.frequencies), 0), np.float32)
+        return self._frames[:self._count]
+
+    @property
+    def times(self):
+        """
+        Centre time (s) of each stored frame, from the first sample of the stream.
+        """
+        first = np.arange(self._count) * self.factor  # First segment of each frame
+        centre = (first + (self.factor - 1) / 2) * self.step + self.nperseg / 2
+        return centre / self.fs
+
+
+def spectrogram(x, fs, chunk=None, **kwargs):
+    """
+    Runs a StreamingSpectrogram over x, chunk samples at a time (10 s by default).
+    Returns:
+        A tuple (times, frequencies, power), see StreamingSpectrogram.
+    """
+    chunk = chunk or int(10 * fs)
+    spec = StreamingSpectrogram(fs, **kwargs)
+    for i in range(0, len(x), chunk):
+        spec.update(x[i:i + chunk])
+    return spec.times, spec.frequencies, spec.power
@@ -0,0 +1,148 @@
+"""
+Band-limited vibration velocity and severity zones.
+
+Condition monitoring standards such as ISO 10816 rate machines by the RMS of
+vibration velocity (mm/s) between 10 and 1000 Hz, or 2 and 1000 Hz for slow
+machines. band_rms integrates acceleration in the frequency domain: the
+windowed spectrum of each column is divided by (2 pi f)^p, p = 1 for velocity
+and 2 for displacement, and the mean square is summed over the bins of each
+band (Parseval). A band extending past the Nyquist frequency is limited to
+it, i.e. 10 to 100 Hz at 200 Hz. Any leading axes are batched, so
+band_rms(frames(x, fs), fs) rates every second of an (N, 3) recording in
+one rfft. severity maps RMS velocities to the zones A (new machine) to
+D (damage likely) of a machine class.
+
+    rms = band_rms(frames(x, fs), fs)  # (seconds, bands, 3) in mm/s
+    zones = severity(rms, ZONE_LIMITS["II"])
+"""
+
+import numpy as np
+
+from .spectral import get_window
+
+G = 9.80665  # m/s^2 per g
+BANDS = ((10, 1000),)  # Hz, the ISO 10816 band for machines above 600 rpm
+# Velocity RMS (mm/s) at the A/B, B/C and C/D zone boundaries of the ISO 10816-1 machine classes:
+# I small machines up to 15 kW, II medium machines up to 75 kW (or 300 kW on special foundations),
+# III large machines on rigid foundations, IV large machines on soft foundations
+ZONE_LIMITS = {
+    "I": (0.71, 1.8, 4.5),
+    "II": (1.12, 2.8, 7.1),
+    "III": (1.8, 4.5, 11.2),
+    "IV": (2.8, 7.1, 18.0),
+}
+ZONES = np.array(["A", "B", "C", "D"])
+QUANTITIES = {  # Integrations and scale from g of each quantity
+    "acceleration": (0, 1.0),  # g
+    "velocity": (1, G * 1e3),  # mm/s
+    "displacement": (2, G * 1e6),  # um
+}
+
+
+def frames(x, length, step=None):
+    """
+    Consecutive windows of x, as a strided view (no copy).
+    Args:
+        x: (N, k) samples.
+        length: samples per window, rounded, so a sample rate gives windows of 1 s.
+        step: samples between window starts, length by default.
+    Returns:
+        A (m, length, k) array; samples after the last full window are left out.
+    """
+    x = np.asarray(x)
+    length = int(round(length))
+    step = length if step is None else int(round(step))
+    if len(x) < length:
+        return np.empty((0, length) + x.shape[1:], x.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(x, length, axis=0)[::step]  # (m, k, length)
+    return np.moveaxis(windows, -1, 1)
+
+
+def band_rms(x, fs, bands=BANDS, quantity="velocity", window="hann"):
+    """
+    RMS of acceleration, velocity or displacement in frequency bands.
+    The mean of each window is removed, and the window is applied with
+    energy-preserving scaling, so broadband RMS is unbiased.
+    Args:
+        x: (..., n, k) acceleration in g, e.g. (N, 3) or frames of it.
+        fs: sample rate (Hz).
+        bands: (low, high) frequency pairs (Hz), low > 0 for velocity and displacement.
+        quantity: "acceleration" (g), "velocity" (mm/s) or "displacement" (um).
+        window: window name, see spectral.get_window.
+    Returns:
+        A (..., len(bands), k) array.
+    """
+    if quantity not in QUANTITIES:
+        raise ValueError(f"quantity must be one of {', '.join(QUANTITIES)}")
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[-2]
+    w = get_window(window, n)[:, None]
+    spectrum = np.fft.rfft((x - x.mean(axis=-2, keepdims=True)) * w, axis=-2)
+    f = np.fft.rfftfreq(n, 1 / fs)
+    weight = np.full(len(f), 2.0)  # One-sided: fold negative frequencies, except DC and Nyquist
+    weight[0] = 1
+    if n % 2 == 0:
+        weight[-1] = 1
+    power, scale = QUANTITIES[quantity]
+    weight = np.where(f > 0, weight / (2 * np.pi * np.where(f > 0, f, 1)) ** (2 * power), 0.0)  # Integration
+    weight *= scale**2 / (n * np.sum(w**2))
+    bands = np.asarray(bands, dtype=np.float64).reshape(-1, 2)
+    mask = (f[:, None] >= bands[:, 0]) & (f[:, None] <= bands[:, 1])  # (bins, bands)
+    mean_square = np.einsum("...bk,b,bj->...jk", np.abs(spectrum) ** 2, weight, mask.astype(np.float64))
+    return np.sqrt(mean_square)
+
+
+def severity(rms, limits=ZONE_LIMITS["II"]):
+    """
+    Zone of velocity RMS values (mm/s), a value on a boundary belonging to the
+    lower zone.
+    Args:
+        rms: array of any shape.
+        limits: the A/B, B/C and C/D boundaries, see ZONE_LIMITS.
+    Returns:
+        An array of "A" to "D" of the same shape, "" where rms is NaN.
+    """
+    rms = np.asarray(rms, dtype=np.float64)
+    zones = ZONES[np.searchsorted(limits, np.nan_to_num(rms), side="left")]
+    return np.where(np.isnan(rms), "", zones)
+
+
+class StreamingBandRMS:
+    """
+    band_rms of consecutive windows of a stream, with 50 % overlap. Only the
+    samples of the window in progress are kept.
+    Args:
+        fs: sample rate (Hz).
+        seconds: window length.
+        other arguments: see band_rms.
+    """
+
+    def __init__(self, fs, seconds=1.0, bands=BANDS, quantity="velocity", window="hann", k=3):
+        self.fs = fs
+        self.length = max(2, int(round(seconds * fs)))
+        self.step = self.length // 2
+        self.bands = bands
+        self.quantity = quantity
+        self.window = window
+        self.latest = None  # (bands, k) values of the last window
+        self._tail = np.zeros((0, k))
+
+    def update(self, samples):
+        """
+        Consumes (n, k) samples in g.
+        Returns:
+            A (m, bands, k) array of the windows completed, often m = 0.
+        """
+        data = np.concatenate([self._tail, samples])
+        windows = frames(data, self.length, self.step)
+        self._tail = data[len(windows) * self.step:]
+        rms = band_rms(windows, self.fs, self.bands, self.quantity, self.window)
+        if len(rms):
+            self.latest = rms[-1]
+        return rms
+
+    def reset(self):
+        """
+        Drops the window in progress, e.g. at a gap in the data.
+        """
+        self._tail = self._tail[:0]
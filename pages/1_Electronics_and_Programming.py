@@ -66,9 +66,8 @@ def get_acceleration(mpu):
     Returns:
         A tuple containing the calibrated acceleration values (ax, ay, az) in g's.
     '''
-    ax = mpu.accel.x
-    ay = mpu.accel.y
-    az = mpu.accel.z - 0.02084873 * mpu.accel.z - 0.3439426
+    ax, ay, az = mpu.accel.xyz  # One 6-byte read: all axes from the same sample
+    az = az - 0.02084873 * az - 0.3439426
     return ax, ay, az
 """,
     language="python"
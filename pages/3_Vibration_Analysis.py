@@ -1,11 +1,156 @@
+import os
+
 import streamlit as st
 import numpy as np
 import pandas as pd
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 
+from analysis.cache import SpectrumCache
+from analysis.decimate import MinMaxPyramid
+from analysis.peaks import find_peaks, harmonic_families
+from analysis.resample import resample
+from analysis.spectral import binned_amplitude, welch
+from analysis.spectrogram import spectrogram
+from analysis.velocity import ZONE_LIMITS, band_rms, frames, severity
+
+DATA_FILE = "server/acceleration_data.csv"
+FS = 200  # Sample rate (Hz)
+CACHE_ENTRIES = 8  # Results kept per cached function; older file versions and parameters are evicted
+SPECTRUM_CACHE = SpectrumCache()  # On-disk spectra, shared with batch jobs and kept across restarts
+
 st.set_page_config(page_title="Vibration Analysis", page_icon="📈")
 
+
+def fingerprint(path):
+    """
+    Cache key of a data file: its path, modification time and size, so cached
+    results are reused until the file changes.
+    """
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner="Loading data...")
+def load_data(key, fs):
+    path = key[0]
+    df = pd.read_csv(path)
+    if 't' in df:  # Sample times written by the server: resample onto an exact fs grid for the FFT
+        t, values = resample(df['t'].to_numpy(), df[['ax', 'ay', 'az']].to_numpy(), fs, mode='sinc', fill='linear')
+        df = pd.DataFrame(values, columns=['ax', 'ay', 'az'])
+        df['t'] = t - t[0]
+    else:  # Files without timestamps: contiguous samples at fs
+        df['t'] = np.arange(len(df)) / fs
+    return df
+
+
+@st.cache_resource(max_entries=CACHE_ENTRIES)
+def load_pyramid(key, fs):
+    """
+    Min/max pyramid of the three axes, shared read-only between sessions.
+    """
+    df = load_data(key, fs)
+    return MinMaxPyramid(df['t'].to_numpy(), df[['ax', 'ay', 'az']].to_numpy())
+
+
+def time_figure(pyramid, start, end):
+    t, y = pyramid.query(start, end)  # About 2000 points per trace, whatever the window
+    fig = make_subplots(rows=3, cols=1, subplot_titles=('Acceleration X (g)', 'Acceleration Y (g)', 'Acceleration Z (g)'))
+
+    fig.add_trace(go.Scatter(x=t[:, 0], y=y[:, 0], name='X', line=dict(color='#8BE9FD')), row=1, col=1)
+    fig.add_trace(go.Scatter(x=t[:, 1], y=y[:, 1], name='Y', line=dict(color='#50FA7B')), row=2, col=1)
+    fig.add_trace(go.Scatter(x=t[:, 2], y=y[:, 2], name='Z', line=dict(color='#FFB86C')), row=3, col=1)
+
+    fig.update_layout(height=1800, showlegend=True)
+    fig.update_xaxes(title_text="Time (s)")
+    fig.update_yaxes(title_text="Acceleration (g)")
+    return fig
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner="Computing FFT...")
+def fft_figure(key, fs, bin_width):
+    df = load_data(key, fs)
+    edges, fft_binned = SPECTRUM_CACHE.compute(binned_amplitude, df[['ax', 'ay', 'az']].to_numpy(), fs,
+                                               bin_width=bin_width)
+    bins = edges[:-1]
+
+    fig_fft = make_subplots(rows=3, cols=1, subplot_titles=('FFT X', 'FFT Y', 'FFT Z'))
+
+    fig_fft.add_trace(go.Scatter(x=bins, y=fft_binned[:, 0], name='X', line=dict(color='#8BE9FD')), row=1, col=1)
+    fig_fft.add_trace(go.Scatter(x=bins, y=fft_binned[:, 1], name='Y', line=dict(color='#50FA7B')), row=2, col=1)
+    fig_fft.add_trace(go.Scatter(x=bins, y=fft_binned[:, 2], name='Z', line=dict(color='#FFB86C')), row=3, col=1)
+
+    fig_fft.update_layout(height=1800, showlegend=True)
+    fig_fft.update_xaxes(title_text="Frequency (Hz)")
+    fig_fft.update_yaxes(title_text="Amplitude")
+    return fig_fft
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner="Detecting peaks...")
+def peak_table(key, fs, nperseg):
+    df = load_data(key, fs)
+    f, psd = SPECTRUM_CACHE.compute(welch, df[['ax', 'ay', 'az']].to_numpy(), fs, nperseg=nperseg)
+    peaks = find_peaks(f, psd)
+    families = harmonic_families(peaks)
+    rows = []
+    for i, axis in enumerate('XYZ'):
+        fundamental = families['fundamental'][i] if families['orders'][i] >= 2 else np.nan
+        for frequency, snr in zip(peaks['frequency'][:, i], peaks['snr_db'][:, i]):
+            if np.isnan(frequency):
+                continue
+            order = np.rint(frequency / fundamental)
+            in_family = 1 <= order <= 3 and abs(frequency / fundamental - order) <= 0.02 * order
+            rows.append({
+                'Axis': axis,
+                'Frequency (Hz)': round(float(frequency), 2),
+                'Above noise floor (dB)': round(float(snr), 1),
+                'Order': f'{order:.0f}x' if in_family else '',
+            })
+    return pd.DataFrame(rows)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner="Computing spectrogram...")
+def spectrogram_figure(key, fs, nperseg):
+    df = load_data(key, fs)
+    times, frequencies, power = SPECTRUM_CACHE.compute(spectrogram, df[['ax', 'ay', 'az']].to_numpy(), fs,
+                                                       nperseg=nperseg)
+    power_db = 10 * np.log10(power + 1e-12)  # PSD in dB re 1 g²/Hz
+
+    fig_spec = make_subplots(rows=3, cols=1, subplot_titles=('Spectrogram X', 'Spectrogram Y', 'Spectrogram Z'))
+
+    for i in range(3):
+        fig_spec.add_trace(
+            go.Heatmap(x=times, y=frequencies, z=power_db[:, :, i].T, colorscale='Viridis', showscale=(i == 0),
+                       colorbar=dict(title='dB')),
+            row=i + 1, col=1,
+        )
+
+    fig_spec.update_layout(height=1200)
+    fig_spec.update_xaxes(title_text="Time (s)")
+    fig_spec.update_yaxes(title_text="Frequency (Hz)")
+    return fig_spec
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner="Computing vibration velocity...")
+def velocity_figure(key, fs, seconds, machine_class):
+    df = load_data(key, fs)
+    rms = band_rms(frames(df[['ax', 'ay', 'az']].to_numpy(), int(seconds * fs)), fs)[:, 0, :]  # mm/s
+    times = np.arange(len(rms)) * seconds
+    limits = ZONE_LIMITS[machine_class]
+
+    fig_velocity = go.Figure()
+    for i, (axis, color) in enumerate(zip('XYZ', ('#8BE9FD', '#50FA7B', '#FFB86C'))):
+        fig_velocity.add_trace(go.Scatter(x=times, y=rms[:, i], name=axis, line=dict(color=color)))
+    for limit, zones in zip(limits, ('A/B', 'B/C', 'C/D')):
+        fig_velocity.add_hline(y=limit, line_dash='dash', line_color='gray', annotation_text=zones)
+
+    fig_velocity.update_layout(height=500, showlegend=True)
+    fig_velocity.update_xaxes(title_text="Time (s)")
+    fig_velocity.update_yaxes(title_text="Velocity RMS (mm/s)")
+    worst = float(np.max(rms)) if len(rms) else np.nan
+    return fig_velocity, worst, str(severity(worst, limits))
+
+
 st.markdown("# Vibration Analysis")
 st.sidebar.header("Acquisition and analysis of vibration data")
 
@@ -28,30 +173,23 @@ st.markdown(
     """
 )
 
-# Read and process data
-df = pd.read_csv("server/acceleration_data.csv")
-N = len(df)
-fs = 200
-T = 1 / fs
-df['t'] = np.arange(0, N/fs, T)
+# Read and process data, cached until the file changes
+data_key = fingerprint(DATA_FILE)
 
 st.subheader("Acceleration in the Time Domain")
 
 st.markdown(
     """
     Acceleration was measured on three axes: X, Y and Z. The plots below show acceleration for each axis over time.
+
+    Long recordings are reduced to the minimum and maximum of short intervals before plotting, which keeps every peak visible. Narrow the time window to see the signal in full detail.
     """
 )
 
-fig = make_subplots(rows=3, cols=1, subplot_titles=('Acceleration X (g)', 'Acceleration Y (g)', 'Acceleration Z (g)'))
-
-fig.add_trace(go.Scatter(x=df['t'], y=df['ax'], name='X', line=dict(color='#8BE9FD')), row=1, col=1)
-fig.add_trace(go.Scatter(x=df['t'], y=df['ay'], name='Y', line=dict(color='#50FA7B')), row=2, col=1)
-fig.add_trace(go.Scatter(x=df['t'], y=df['az'], name='Z', line=dict(color='#FFB86C')), row=3, col=1)
-
-fig.update_layout(height=1800, showlegend=True)
-fig.update_xaxes(title_text="Time (s)")
-fig.update_yaxes(title_text="Acceleration (g)")
+pyramid = load_pyramid(data_key, FS)
+duration = float(pyramid.t[-1])
+start, end = st.slider("Time window (s)", 0.0, duration, (0.0, duration), step=0.5)
+fig = time_figure(pyramid, start, end)
 
 st.plotly_chart(fig, use_container_width=True)
 
@@ -63,31 +201,42 @@ st.markdown(
     """
 )
 
-f = np.fft.fftfreq(N, T)
-fft_x = np.abs(np.fft.fft(df['ax']))
-fft_y = np.abs(np.fft.fft(df['ay']))
-fft_z = np.abs(np.fft.fft(df['az']))
+fig_fft = fft_figure(data_key, FS, bin_width=1)
 
-bins = np.arange(0, int(fs / 2) + 1)
+st.plotly_chart(fig_fft, use_container_width=True)
 
-fft_x_binned = np.histogram(f[f > 0], bins=bins, weights=fft_x[f > 0])[0] / np.histogram(f[f > 0], bins=bins)[0]
-fft_y_binned = np.histogram(f[f > 0], bins=bins, weights=fft_y[f > 0])[0] / np.histogram(f[f > 0], bins=bins)[0]
-fft_z_binned = np.histogram(f[f > 0], bins=bins, weights=fft_z[f > 0])[0] / np.histogram(f[f > 0], bins=bins)[0]
+st.markdown(
+    """
+    Peaks in the FFT indicate dominant frequency components, which may be related to system resonances or environmental sources such as the mains frequency (~60 Hz).
 
-fig_fft = make_subplots(rows=3, cols=1, subplot_titles=('FFT X', 'FFT Y', 'FFT Z'))
+    The table lists the peaks found automatically in the power spectral density of each axis: the local maxima that stand out of the noise floor, at frequencies interpolated between FFT bins. Peaks at 1x, 2x and 3x the same fundamental, typical of a rotating machine such as the grinder, are marked with their order.
+    """
+)
 
-fig_fft.add_trace(go.Scatter(x=bins, y=fft_x_binned, name='X', line=dict(color='#8BE9FD')), row=1, col=1)
-fig_fft.add_trace(go.Scatter(x=bins, y=fft_y_binned, name='Y', line=dict(color='#50FA7B')), row=2, col=1)
-fig_fft.add_trace(go.Scatter(x=bins, y=fft_z_binned, name='Z', line=dict(color='#FFB86C')), row=3, col=1)
+st.dataframe(peak_table(data_key, FS, nperseg=1024), hide_index=True, use_container_width=True)
 
-fig_fft.update_layout(height=1800, showlegend=True)
-fig_fft.update_xaxes(title_text="Frequency (Hz)")
-fig_fft.update_yaxes(title_text="Amplitude")
+st.subheader("Time-Frequency Analysis (Spectrogram)")
 
-st.plotly_chart(fig_fft, use_container_width=True)
+st.markdown(
+    """
+    A single FFT over the whole recording mixes the periods with the grinder off and on. The spectrogram below computes short-time Fourier transforms over consecutive windows of 1.28 seconds, so it shows when each frequency component appears and disappears as the grinder is switched on and off.
+    """
+)
+
+fig_spec = spectrogram_figure(data_key, FS, nperseg=256)
+
+st.plotly_chart(fig_spec, use_container_width=True)
+
+st.subheader("Vibration Severity (Velocity RMS)")
 
 st.markdown(
     """
-    Peaks in the FFT indicate dominant frequency components, which may be related to system resonances or environmental sources such as the mains frequency (~60 Hz).
+    Condition monitoring standards such as ISO 10816 rate the vibration of a machine by the RMS of its velocity between 10 and 1000 Hz, in mm/s. The acceleration is integrated to velocity in the frequency domain over consecutive windows of 1 second; at 200 Hz the band ends at 100 Hz. The dashed lines are the boundaries of the zones of a class II machine (medium machines up to 75 kW): A for new machines, B for unrestricted long-term operation, C for restricted operation and D for vibration that may cause damage.
     """
 )
+
+fig_velocity, worst_velocity, worst_zone = velocity_figure(data_key, FS, seconds=1.0, machine_class='II')
+
+st.plotly_chart(fig_velocity, use_container_width=True)
+
+st.markdown(f"Highest velocity RMS: {worst_velocity:.2f} mm/s, zone {worst_zone}.")
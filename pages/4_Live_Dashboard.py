@@ -0,0 +1,68 @@
+import math
+import time
+
+import streamlit as st
+from plotly.subplots import make_subplots
+import plotly.graph_objects as go
+
+from server.live import LIVE_SOCKET, LiveClient
+
+REFRESH = 0.2  # Seconds between updates
+
+st.set_page_config(page_title="Live Dashboard", page_icon="📡")
+
+st.markdown("# Live Dashboard")
+st.sidebar.header("Real-time data from the ingestion server")
+
+st.markdown(
+    """
+    This page shows the most recent seconds of acceleration and their spectrum for each device connected to the UDP server (`python -m server.server`). The data come straight from the server's memory over a local socket, so nothing is read from the recording files.
+    """
+)
+
+try:
+    with LiveClient() as client:
+        devices = client.devices()
+except OSError:
+    st.info(f"The ingestion server is not running (no live socket at `{LIVE_SOCKET}`).")
+    st.stop()
+
+if not devices:
+    st.info("The server is running but no device has sent data yet.")
+    st.stop()
+
+device = st.selectbox("Device", devices)
+
+
+@st.fragment(run_every=REFRESH)
+def live_charts():
+    try:
+        with LiveClient() as client:
+            snapshot = client.snapshot(device)
+    except OSError:
+        st.warning("Lost connection to the ingestion server.")
+        return
+    if snapshot is None:
+        st.warning(f"Device {device} is no longer known to the server.")
+        return
+
+    updated = float(snapshot["updated"])  # NaN until the first packet
+    last = "no packet yet" if math.isnan(updated) else f"last packet {time.time() - updated:.1f} s ago"
+    st.caption(f"Sample rate {float(snapshot['fs']):.0f} Hz, {last}")
+
+    fig = make_subplots(rows=2, cols=1, subplot_titles=('Acceleration (g)', 'Power Spectral Density (g²/Hz)'))
+    for i, (name, color) in enumerate(zip('XYZ', ('#8BE9FD', '#50FA7B', '#FFB86C'))):
+        fig.add_trace(go.Scatter(x=snapshot['t'], y=snapshot['samples'][:, i], name=name, line=dict(color=color)),
+                      row=1, col=1)
+        fig.add_trace(go.Scatter(x=snapshot['frequencies'], y=snapshot['psd'][:, i], name=name,
+                                 line=dict(color=color), showlegend=False), row=2, col=1)
+
+    fig.update_layout(height=900, showlegend=True, uirevision=device)
+    fig.update_xaxes(title_text="Time (s)", row=1, col=1)
+    fig.update_xaxes(title_text="Frequency (Hz)", row=2, col=1)
+    fig.update_yaxes(type="log", row=2, col=1)
+
+    st.plotly_chart(fig, use_container_width=True)
+
+
+live_charts()
@@ -0,0 +1,359 @@
+"""
+Host-side emulation of the Pico peripherals, for running the code in lib/
+under CPython without hardware. Not copied to the Pico.
+
+FakeI2C stands in for machine.I2C and routes reads and writes to emulated
+devices while counting the bus traffic. FakeMPU6050 emulates the MPU6050
+register map with its sample clock, data registers and FIFO, FakeSSD1306 the
+display memory of the OLED. When they are missing, minimal framebuf and
+micropython modules are installed so that lib/ssd1306.py imports; their text()
+draws a stand-in glyph per character, not the real font. VirtualClock
+replaces the MicroPython tick functions; sleeping advances it and runs the
+callbacks of its Timers when they are due, so runs are deterministic and
+faster than real time.
+
+    from emulator import FakeI2C, FakeMPU6050, VirtualClock
+    clock = VirtualClock()
+    i2c = FakeI2C({0x68: FakeMPU6050(clock.time)})
+    mpu = MPU6050(i2c)
+"""
+
+import math
+import os
+import sys
+import types
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "lib"))  # Pico module path, after
+# the standard library: lib/secrets.py would hide the secrets module
+
+TICKS_PERIOD = 1 << 30  # ticks_us wraps like on the RP2040 port
+FIFO_SIZE = 1024
+
+
+class VirtualClock:
+    """
+    time module stand-in with ticks_us, ticks_diff, ticks_add, sleep_ms and sleep_us.
+    """
+
+    def __init__(self):
+        self.us = 0
+        self.timers = []
+
+    def time(self):
+        return self.us / 1e6
+
+    def ticks_us(self):
+        return self.us % TICKS_PERIOD
+
+    def ticks_ms(self):
+        return self.us // 1000 % TICKS_PERIOD
+
+    @staticmethod
+    def ticks_diff(a, b):
+        return (a - b + TICKS_PERIOD // 2) % TICKS_PERIOD - TICKS_PERIOD // 2
+
+    @staticmethod
+    def ticks_add(a, b):
+        return (a + b) % TICKS_PERIOD
+
+    def sleep_us(self, us):
+        end = self.us + max(0, int(us))
+        while True:
+            due = [timer for timer in self.timers if timer.deadline <= end]
+            if not due:
+                break
+            timer = min(due, key=lambda timer: timer.deadline)
+            self.us = max(self.us, timer.deadline)
+            timer.fire()
+        self.us = end
+
+    def sleep_ms(self, ms):
+        self.sleep_us(ms * 1000)
+
+    def advance(self, seconds):
+        self.sleep_us(round(seconds * 1e6))
+
+
+class Timer:
+    """
+    machine.Timer stand-in driven by a VirtualClock. latency_us delays every
+    callback, like an interrupt held off by other work.
+    """
+
+    PERIODIC = 1
+    ONE_SHOT = 0
+
+    def __init__(self, clock, latency_us=0):
+        self.clock = clock
+        self.latency_us = latency_us
+        self.deadline = None
+        self.calls = 0
+
+    def init(self, mode=PERIODIC, freq=None, period=None, callback=None):
+        self.mode = mode
+        self.period_us = 1e6 / freq if freq else period * 1000
+        self.callback = callback
+        self._start = self.clock.us
+        self.calls = 0
+        self.deadline = round(self._start + self.period_us) + self.latency_us
+        if self not in self.clock.timers:
+            self.clock.timers.append(self)
+
+    def deinit(self):
+        if self in self.clock.timers:
+            self.clock.timers.remove(self)
+
+    def fire(self):
+        self.calls += 1
+        if self.mode == self.PERIODIC:
+            self.deadline = round(self._start + (self.calls + 1) * self.period_us) + self.latency_us
+        else:
+            self.deinit()
+        self.callback(self)
+
+
+def vibration(t):
+    """
+    Default signal: 1 g on z plus a 60 Hz vibration on every axis, in g.
+    """
+    v = 0.05 * math.sin(2 * math.pi * 60 * t)
+    return v, v, 1.0 + v
+
+
+class FakeMPU6050:
+    """
+    MPU6050 register map. Samples are taken at the rate set by the divider and
+    the low pass filter, on the chip's own clock, whenever the device is
+    accessed and the clock has moved on.
+    Args:
+        clock: function returning the current time (s).
+        signal: function of the time (s) returning the x, y, z acceleration in g.
+        rate_error: relative error of the chip's sample clock.
+    """
+
+    def __init__(self, clock, signal=vibration, rate_error=0.0):
+        self.clock = clock
+        self.signal = signal
+        self.rate_error = rate_error
+        self.regs = bytearray(128)
+        self.regs[0x75] = 0x68  # WHO_AM_I
+        self.regs[0x6B] = 0x40  # asleep after reset
+        self.fifo = bytearray()
+        self.samples = 0  # samples taken
+        self._next = None  # time of the next sample
+
+    @property
+    def rate(self):
+        internal = 8000 if self.regs[0x1A] & 7 in (0, 7) else 1000
+        return internal / (1 + self.regs[0x19]) * (1 + self.rate_error)
+
+    def _update(self):
+        now = self.clock()
+        if self._next is None:
+            self._next = now
+        while self._next <= now:
+            self._sample(self._next)
+            self._next += 1 / self.rate
+
+    def _sample(self, t):
+        lsb = 16384 >> (self.regs[0x1C] >> 3 & 3)
+        data = bytearray()
+        for g in self.signal(t):
+            data += max(-32768, min(32767, round(g * lsb))).to_bytes(2, "big", signed=True)
+        self.regs[0x3B:0x41] = data
+        self.samples += 1
+        if self.regs[0x6A] & 0x40 and self.regs[0x23] & 0x08:
+            self.fifo += data
+            if len(self.fifo) > FIFO_SIZE:  # oldest bytes overwritten
+                del self.fifo[:len(self.fifo) - FIFO_SIZE]
+                self.regs[0x3A] |= 0x10  # FIFO_OFLOW_INT
+
+    def read(self, memaddr, nbytes):
+        self._update()
+        if memaddr == 0x74:  # FIFO_R_W: a burst read keeps draining the FIFO
+            out = bytes(self.fifo[:nbytes]).ljust(nbytes, b"\0")
+            del self.fifo[:nbytes]
+            return out
+        regs = bytearray(self.regs)
+        regs[0x72:0x74] = len(self.fifo).to_bytes(2, "big")
+        if memaddr <= 0x3A < memaddr + nbytes:
+            self.regs[0x3A] = 0  # cleared by reading INT_STATUS
+        return bytes(regs[memaddr:memaddr + nbytes])
+
+    def write(self, memaddr, data):
+        self._update()
+        for i, value in enumerate(data):
+            reg = memaddr + i
+            if reg == 0x6A:
+                if value & 0x04:  # FIFO_RESET
+                    self.fifo = bytearray()
+                value &= ~0x07  # reset bits clear themselves
+            self.regs[reg] = value
+
+
+class FakeI2C:
+    """
+    machine.I2C stand-in.
+    Args:
+        devices: dict of emulated devices by address, each with read(memaddr, nbytes)
+            and write(memaddr, data).
+    """
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.transactions = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def _device(self, addr):
+        if addr not in self.devices:
+            raise OSError(19)  # ENODEV, like a missing ACK
+        self.transactions += 1
+        return self.devices[addr]
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        view = memoryview(buf).cast("B")  # machine.I2C fills any buffer byte by byte
+        view[:] = self._device(addr).read(memaddr, len(view))
+        self.bytes_read += len(view)
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        buf = bytearray(nbytes)
+        self.readfrom_mem_into(addr, memaddr, buf)
+        return bytes(buf)
+
+    def writeto_mem(self, addr, memaddr, buf):
+        data = bytes(buf)
+        self._device(addr).write(memaddr, data)
+        self.bytes_written += len(data)
+
+    def readfrom(self, addr, nbytes):
+        return self.readfrom_mem(addr, 0, nbytes)
+
+    def writeto(self, addr, buf):
+        """
+        The first byte selects the register (or is the control byte of a display).
+        """
+        self._device(addr).write(buf[0], bytes(buf[1:]))
+        self.bytes_written += len(buf)
+
+    def writevto(self, addr, vector):
+        self.writeto(addr, b"".join(bytes(buf) for buf in vector))
+
+
+class FrameBuffer:
+    """
+    framebuf.FrameBuffer stand-in, MONO_VLSB only: each byte is a column of
+    8 pixels of one page, least significant bit on top.
+    """
+
+    def __init__(self, buffer, width, height, format=0):
+        self._buffer = buffer
+        self._width = width
+        self._height = height
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            return None
+        i, bit = (y >> 3) * self._width + x, 1 << (y & 7)
+        if c is None:
+            return int(bool(self._buffer[i] & bit))
+        if c:
+            self._buffer[i] |= bit
+        else:
+            self._buffer[i] &= ~bit & 0xFF
+
+    def fill(self, c):
+        self._buffer[:] = bytes([0xFF if c else 0]) * len(self._buffer)
+
+    def fill_rect(self, x, y, w, h, c):
+        for i in range(x, x + w):
+            for j in range(y, y + h):
+                self.pixel(i, j, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c):
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def text(self, s, x, y, c=1):
+        for k, char in enumerate(s):
+            code = ord(char)
+            for i in range(8):  # stand-in glyph: a column pattern unique to the character
+                column = 0 if char == " " else (code * (i + 3) * 37) & 0xFF
+                for j in range(8):
+                    if column >> j & 1:
+                        self.pixel(x + 8 * k + i, y + j, c)
+
+
+if "framebuf" not in sys.modules:
+    try:
+        import framebuf  # noqa: F401
+    except ImportError:
+        sys.modules["framebuf"] = types.ModuleType("framebuf")
+        sys.modules["framebuf"].FrameBuffer = FrameBuffer
+        sys.modules["framebuf"].MONO_VLSB = 0
+if "micropython" not in sys.modules:
+    try:
+        import micropython  # noqa: F401
+    except ImportError:
+        sys.modules["micropython"] = types.ModuleType("micropython")
+        sys.modules["micropython"].const = lambda value: value
+
+
+class FakeSSD1306:
+    """
+    Display memory of an SSD1306 in horizontal addressing mode. Follows the
+    column and page address commands, so ram ends up as what the panel shows.
+    """
+
+    ARGUMENTS = {0x20: 1, 0x21: 2, 0x22: 2, 0x81: 1, 0x8D: 1, 0xA8: 1, 0xD3: 1, 0xD5: 1, 0xD9: 1, 0xDA: 1, 0xDB: 1}
+
+    def __init__(self, width=128, height=64):
+        self.width = width
+        self.pages = height // 8
+        self.ram = bytearray(self.width * self.pages)
+        self.data_bytes = 0  # display data received
+        self._command = []  # command waiting for its arguments
+        self._columns = (0, width - 1)
+        self._page_range = (0, self.pages - 1)
+        self._column = self._page = 0
+
+    def write(self, control, data):
+        if control & 0x40:  # D/C# = 1: display data
+            for value in data:
+                self._store(value)
+        else:
+            for value in data:
+                self._add_command(value)
+
+    def _add_command(self, value):
+        self._command.append(value)
+        opcode = self._command[0]
+        if len(self._command) <= self.ARGUMENTS.get(opcode, 0):
+            return
+        if opcode == 0x21:
+            self._columns = tuple(self._command[1:])
+            self._column = self._columns[0]
+        elif opcode == 0x22:
+            self._page_range = tuple(self._command[1:])
+            self._page = self._page_range[0]
+        self._command = []
+
+    def _store(self, value):
+        self.ram[self._page * self.width + self._column % self.width] = value
+        self.data_bytes += 1
+        if self._column < self._columns[1]:
+            self._column += 1
+            return
+        self._column = self._columns[0]
+        self._page = self._page + 1 if self._page < self._page_range[1] else self._page_range[0]
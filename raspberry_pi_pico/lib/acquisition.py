@@ -0,0 +1,208 @@
+# Acquisition of MPU6050 samples into packets, used by main.py
+
+import time
+
+FRAME = 6  # bytes per sample: big-endian x, y, z, as stored by the MPU6050
+
+
+class _Sampler:
+    """
+    Packets of samples timestamped on the device clock. acquire() waits for
+    a full packet and returns it with header bytes free at the start; the
+    caller sends it and hands it back with release().
+    """
+
+    def __init__(self, rate, samples, header, clock):
+        self.rate = rate
+        self.samples = samples
+        self.header = header
+        self.clock = clock
+        self.dropped = 0  # samples not acquired since start
+        self.now_us = 1000000  # device clock (us): does not wrap like ticks_us, starts at 1 s
+        # so the times of the samples stored before the first drain stay positive
+        self._ticks = clock.ticks_us()
+
+    def _elapsed(self, ticks):
+        """
+        Device time (us) at ticks, at most a few minutes after the previous call.
+        """
+        self.now_us += self.clock.ticks_diff(ticks, self._ticks)
+        self._ticks = ticks
+        return self.now_us
+
+    def release(self, packet):
+        pass
+
+
+class FifoSampler(_Sampler):
+    """
+    Fills a packet with accelerometer samples drained from the MPU6050 FIFO.
+
+    The chip paces the samples, so their spacing is its own sample clock and
+    not the timing of this loop. At every drain the newest sample in the FIFO
+    was stored less than one period before the FIFO count was read, which
+    pins one sample index to the device clock; the sample period is the device
+    time elapsed over the samples counted since the stream started. Both are
+    kept in integer microseconds, which stay exact where floats would not.
+    Sending must not take longer than the FIFO lasts (170 ms at 1 kHz).
+
+    Args:
+        mpu: MPU6050 with set_rate() already called. The FIFO is started here.
+        rate: sample rate set on the chip (Hz).
+        samples: samples per packet.
+        header: bytes reserved at the start of the packet.
+        clock: module with ticks_us, ticks_diff and sleep_ms (time on the Pico).
+    """
+
+    def __init__(self, mpu, rate, samples, header=0, clock=time):
+        super().__init__(rate, samples, header, clock)
+        self.mpu = mpu
+        self.packet = bytearray(header + FRAME * samples)
+        self.received = 0  # samples drained since start
+        self.restarts = 0  # packets dropped after the FIFO overflowed
+        self._payload = memoryview(self.packet)[header:]
+        self._origin = None  # (device us, sample index) of the first drain of the stream
+        self._latest = None  # same at the last drain
+        self._wait_ms = max(1, (512 // FRAME) * 1000 // rate // 2)  # drain well before the FIFO fills
+        mpu.fifo_enable()
+
+    def acquire(self):
+        """
+        Returns:
+            The packet, the device time (us) of its first sample and the time (us)
+            from the first to the last.
+        """
+        t0_us, span_us = self.fill(self._payload, self.samples)
+        return self.packet, t0_us, span_us
+
+    def fill(self, buf, n):
+        """
+        Fills buf (a memoryview) with n samples of FRAME bytes.
+        Returns:
+            Device time (us) of the first sample and time (us) from the first to the last.
+        """
+        filled = 0
+        first = self.received
+        while filled < n:
+            now = self._elapsed(self.clock.ticks_us())
+            overflows = self.mpu.fifo_overflows
+            got = self.mpu.read_fifo_into(buf[filled * FRAME:n * FRAME])
+            if self.mpu.fifo_overflows != overflows:  # samples lost: start the packet again
+                self.restarts += 1
+                if self._latest is not None:  # everything since the last drain
+                    self.dropped += filled + (now - self._latest[0]) * self.rate // 1000000
+                self._origin = None
+                filled = 0
+                first = self.received
+                continue
+            if got:
+                newest = self.received + got + self.mpu.fifo_left - 1
+                if self._origin is None:
+                    self._origin = (now, newest)
+                self._latest = (now, newest)
+                self.received += got
+                filled += got
+            if filled < n and not self.mpu.fifo_left:
+                self.clock.sleep_ms(min(self._wait_ms, max(1, (n - filled) * 1000 // self.rate)))
+        return self._times(first, n)
+
+    def _times(self, first, n):
+        origin_us, origin_index = self._origin
+        latest_us, latest_index = self._latest
+        elapsed, samples = latest_us - origin_us, latest_index - origin_index
+        if samples < self.rate:  # under a second of baseline: nominal period
+            elapsed, samples = 1000000, self.rate
+        t0_us = latest_us - (latest_index - first) * elapsed // samples
+        return t0_us, (n - 1) * elapsed // samples
+
+
+class TimerSampler(_Sampler):
+    """
+    Reads the data registers from a timer interrupt into two packets in turn:
+    while the main loop sends one, the interrupt fills the other, so sending
+    and the display never pause the sampling. A sample is dropped, and
+    counted, when both packets wait to be sent or when the interrupt ran too
+    late to take it.
+
+    The interrupt handler allocates nothing: it copies the 6 bytes read by
+    get_accel_irq into the packet and notes the tick of the first and last
+    sample of each packet in preallocated lists.
+
+    Args:
+        mpu: MPU6050.
+        rate: sample rate (Hz), at most about 1 kHz with a 400 kHz bus.
+        samples: samples per packet.
+        header: bytes reserved at the start of each packet.
+        clock: module with ticks_us, ticks_diff and sleep_ms (time on the Pico).
+    """
+
+    def __init__(self, mpu, rate, samples, header=0, clock=time):
+        super().__init__(rate, samples, header, clock)
+        self.mpu = mpu
+        self.packets = (bytearray(header + FRAME * samples), bytearray(header + FRAME * samples))
+        self._end = header + FRAME * samples
+        self._offset = [header, header]  # next byte to fill in each packet
+        self._first = [0, 0]  # ticks of the first and last sample of each packet
+        self._last = [0, 0]
+        self._full = [False, False]
+        self._active = 0  # packet being filled, -1 while both wait to be sent
+        self._send = 0  # next packet to send
+        self._period = 1000000 // rate
+        self._previous = None  # ticks of the previous interrupt
+        self._timer = None
+
+    def start(self, timer):
+        """
+        Starts sampling with a machine.Timer.
+        """
+        self._timer = timer
+        timer.init(freq=self.rate, callback=self._sample)
+
+    def stop(self):
+        self._timer.deinit()
+
+    def _sample(self, timer):
+        ticks = self.clock.ticks_us()
+        if self._previous is not None:
+            late = self.clock.ticks_diff(ticks, self._previous) - self._period
+            if late > self._period // 2:  # missed timer periods
+                self.dropped += (late + self._period // 2) // self._period
+        self._previous = ticks
+        i = self._active
+        if i < 0:
+            self.dropped += 1
+            return
+        self.mpu.get_accel_irq()
+        packet, buf, offset = self.packets[i], self.mpu.buf6, self._offset[i]
+        for k in range(FRAME):
+            packet[offset + k] = buf[k]
+        if offset == self.header:
+            self._first[i] = ticks
+        offset += FRAME
+        if offset < self._end:
+            self._offset[i] = offset
+            return
+        self._last[i] = ticks
+        self._offset[i] = self.header
+        self._full[i] = True
+        self._active = -1 if self._full[1 - i] else 1 - i
+
+    def acquire(self):
+        """
+        Waits for the next full packet.
+        Returns:
+            The packet, the device time (us) of its first sample and the time (us)
+            from the first to the last.
+        """
+        i = self._send
+        while not self._full[i]:
+            self.clock.sleep_ms(1)
+        self._send = 1 - i
+        first = self._first[i]
+        return self.packets[i], self._elapsed(first), self.clock.ticks_diff(self._last[i], first)
+
+    def release(self, packet):
+        i = 0 if packet is self.packets[0] else 1
+        self._full[i] = False
+        if self._active < 0:  # the interrupt was waiting for a free packet
+            self._active = i
@@ -0,0 +1,202 @@
+# Vibration features of windows of raw samples, used by main.py in feature mode.
+# Integer arithmetic only, so the Pico, CPython and the numpy version in
+# analysis/features.py give identical results.
+
+FFT_SIZE = 256
+Q = 14  # fixed point fraction bits of the twiddle factors and the window
+# round(16384 * sin(2 * pi * k / FFT_SIZE)) for k = 0..64, a quarter wave
+QUARTER_SINE = (
+    0, 402, 804, 1205, 1606, 2006, 2404, 2801, 3196, 3590, 3981, 4370, 4756, 5139, 5520, 5897,
+    6270, 6639, 7005, 7366, 7723, 8076, 8423, 8765, 9102, 9434, 9760, 10080, 10394, 10702, 11003, 11297,
+    11585, 11866, 12140, 12406, 12665, 12916, 13160, 13395, 13623, 13842, 14053, 14256, 14449, 14635, 14811, 14978,
+    15137, 15286, 15426, 15557, 15679, 15791, 15893, 15986, 16069, 16143, 16207, 16261, 16305, 16340, 16364, 16379,
+    16384,
+)
+# Values per axis in result(), in this order
+FEATURES = ('rms', 'p2p', 'crest', 'kurtosis', 'peak_bin', 'peak_amp')
+
+
+def _sine(k):
+    k %= FFT_SIZE
+    quarter = FFT_SIZE // 4
+    if k <= quarter:
+        return QUARTER_SINE[k]
+    if k <= 2 * quarter:
+        return QUARTER_SINE[2 * quarter - k]
+    if k <= 3 * quarter:
+        return -QUARTER_SINE[k - 2 * quarter]
+    return -QUARTER_SINE[FFT_SIZE - k]
+
+
+SINE = tuple(_sine(k) for k in range(FFT_SIZE // 2))
+COSINE = tuple(_sine(k + FFT_SIZE // 4) for k in range(FFT_SIZE // 2))
+HANN = tuple((16384 - _sine(k + FFT_SIZE // 4)) >> 1 for k in range(FFT_SIZE))
+
+
+def _bit_reverse(n):
+    bits = 0
+    while 1 << bits < n:
+        bits += 1
+    order = []
+    for i in range(n):
+        r = 0
+        for b in range(bits):
+            r |= (i >> b & 1) << (bits - 1 - b)
+        order.append(r)
+    return tuple(order)
+
+
+BIT_REVERSE = _bit_reverse(FFT_SIZE)
+
+
+def isqrt(n):
+    """
+    Largest integer whose square is at most n.
+    """
+    if n < 2:
+        return n
+    x = 1
+    while x * x <= n:  # a power of two above the root (MicroPython ints have no bit_length)
+        x <<= 1
+    while True:
+        y = (x + n // x) // 2
+        if y >= x:
+            return x
+        x = y
+
+
+def fft_power(block):
+    """
+    Power of bins 0..FFT_SIZE / 2 of a block of FFT_SIZE integers: the block
+    mean is removed, a Hann window applied and a radix-2 fixed point FFT run,
+    halving the values at every stage so they cannot grow.
+    """
+    n = FFT_SIZE
+    mean = sum(block) // n
+    re = [(block[i] - mean) * HANN[i] >> Q for i in BIT_REVERSE]
+    im = [0] * n
+    size = 2
+    while size <= n:
+        half = size >> 1
+        step = n // size
+        for start in range(0, n, size):
+            for j in range(half):
+                wr, wi = COSINE[j * step], -SINE[j * step]
+                a = start + j
+                b = a + half
+                tr = (re[b] * wr - im[b] * wi) >> Q
+                ti = (re[b] * wi + im[b] * wr) >> Q
+                re[b], im[b] = (re[a] - tr) >> 1, (im[a] - ti) >> 1
+                re[a], im[a] = (re[a] + tr) >> 1, (im[a] + ti) >> 1
+        size <<= 1
+    return [re[k] * re[k] + im[k] * im[k] for k in range(n // 2 + 1)]
+
+
+class FeatureWindow:
+    """
+    Accumulates n samples of raw big-endian x, y, z triplets (6 bytes each)
+    and computes per axis, in fixed point:
+        rms: standard deviation in 1/16 counts (the mean, gravity, removed)
+        p2p: maximum minus minimum, in counts
+        crest: largest distance from the mean over the standard deviation, x 1000
+        kurtosis: fourth central moment over the squared variance, x 1000 (3000 for noise)
+        peak_bin, peak_amp: strongest FFT bin above 0 of the Hann-windowed blocks of
+            FFT_SIZE samples, power averaged over the blocks, and its amplitude
+    Moments are accumulated as exact integer power sums of the samples minus
+    the first one of the window.
+    """
+
+    def __init__(self, n, axes=3):
+        self.n = n
+        self.axes = axes
+        self._blocks = [[0] * FFT_SIZE for _ in range(axes)]
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._ref = [0] * self.axes
+        self._sums = [[0, 0, 0, 0] for _ in range(self.axes)]
+        self._lo = [0] * self.axes
+        self._hi = [0] * self.axes
+        self._fill = 0  # samples in the current FFT block
+        self._spectra = 0  # FFT blocks accumulated
+        self._power = [[0] * (FFT_SIZE // 2 + 1) for _ in range(self.axes)]
+
+    @property
+    def full(self):
+        return self.count >= self.n
+
+    def add(self, raw, offset, count):
+        """
+        Adds up to count samples from raw[offset:], as many as the window still takes.
+        Returns the number of samples added.
+        """
+        count = min(count, self.n - self.count)
+        axes = self.axes
+        if count and not self.count:  # the first sample is the reference of the window
+            for axis in range(axes):
+                v = raw[offset + 2 * axis] << 8 | raw[offset + 2 * axis + 1]
+                self._ref[axis] = self._lo[axis] = self._hi[axis] = v - 0x10000 if v & 0x8000 else v
+        ref = self._ref
+        for i in range(count):
+            o = offset + 2 * axes * i
+            for axis in range(axes):
+                v = raw[o] << 8 | raw[o + 1]
+                if v & 0x8000:
+                    v -= 0x10000
+                o += 2
+                d = v - ref[axis]
+                s = self._sums[axis]
+                d2 = d * d
+                s[0] += d
+                s[1] += d2
+                s[2] += d2 * d
+                s[3] += d2 * d2
+                if v < self._lo[axis]:
+                    self._lo[axis] = v
+                elif v > self._hi[axis]:
+                    self._hi[axis] = v
+                self._blocks[axis][self._fill] = d
+            self._fill += 1
+            if self._fill == FFT_SIZE:
+                for axis in range(axes):
+                    power = self._power[axis]
+                    for k, p in enumerate(fft_power(self._blocks[axis])):
+                        power[k] += p
+                self._spectra += 1
+                self._fill = 0
+        self.count += count
+        return count
+
+    def result(self):
+        """
+        Returns the FEATURES of every axis, one flat tuple of integers.
+        """
+        values = []
+        n = self.count
+        for axis in range(self.axes):
+            s1, s2, s3, s4 = self._sums[axis]
+            lo, hi = self._lo[axis] - self._ref[axis], self._hi[axis] - self._ref[axis]
+            values += window_values(n, s1, s2, s3, s4, lo, hi, self._power[axis], self._spectra)
+        return tuple(values)
+
+
+def window_values(n, s1, s2, s3, s4, lo, hi, power, spectra):
+    """
+    FEATURES of one axis from the power sums s1..s4 of n samples, their
+    minimum and maximum (all relative to the same reference) and the summed
+    FFT power of spectra blocks.
+    """
+    c2 = n * s2 - s1 * s1  # n^2 times the variance
+    c4 = n * n * n * s4 - 4 * n * n * s1 * s3 + 6 * n * s1 * s1 * s2 - 3 * s1 * s1 * s1 * s1  # n^4 m4
+    peak = max(n * hi - s1, s1 - n * lo)  # n times the largest distance from the mean
+    rms = isqrt(256 * c2) // n if n else 0
+    crest = isqrt(peak * peak * 1000000 // c2) if c2 else 0
+    kurtosis = c4 * 1000 // (c2 * c2) if c2 else 0
+    peak_bin = peak_amp = 0
+    if spectra:
+        for k in range(1, len(power)):
+            if power[k] > power[peak_bin] or not peak_bin:
+                peak_bin = k
+        peak_amp = isqrt(power[peak_bin] // spectra)
+    return [rms, hi - lo, crest, kurtosis, peak_bin, peak_amp]
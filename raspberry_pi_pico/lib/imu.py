@@ -37,10 +37,21 @@ THE SOFTWARE.
 # At runtime try to continue returning last good data value. We don't want aircraft
 # crashing. However if the I2C has crashed we're probably stuffed.
 
-from utime import sleep_ms
-from machine import I2C
+try:
+    from utime import sleep_ms
+    from machine import I2C
+except ImportError:  # CPython host, with an emulated bus (see raspberry_pi_pico/emulator.py)
+    from time import sleep
+
+    def sleep_ms(ms):
+        sleep(ms / 1000)
+
+    I2C = None
 from vector3d import Vector3d
 
+FIFO_SIZE = 1024  # bytes
+FIFO_FRAME = 6  # bytes per accelerometer sample in the FIFO: big-endian x, y, z
+
 
 class MPUException(OSError):
     """
@@ -58,7 +69,17 @@ def bytes_toint(msb, lsb):
     """
     if not msb & 0x80:
         return msb << 8 | lsb  # +ve
-    return -(((msb ^ 255) << 8) | (lsb ^ 255) + 1)
+    return -(((msb ^ 255) << 8 | lsb ^ 255) + 1)
+
+
+def swap_into(samples, n):
+    """
+    Converts the first n elements of an array('h') from big-endian, as read
+    from the MPU6050, to native (little-endian) values in place.
+    """
+    for i in range(n):
+        v = samples[i]
+        samples[i] = ((v & 0xFF) << 8 | (v >> 8) & 0xFF) - ((v & 0x80) << 9)
 
 
 class MPU6050(object):
@@ -79,6 +100,10 @@ class MPU6050(object):
         self.buf2 = bytearray(2)  # be done in interrupt handlers
         self.buf3 = bytearray(3)
         self.buf6 = bytearray(6)
+        self.accel_lsb = 16384  # LSB per g and per degree/second of the ranges set, so that
+        self.gyro_lsb = 131  # conversions do not read the range registers every time
+        self.fifo_left = 0  # whole samples left in the FIFO after the last read_fifo_into
+        self.fifo_overflows = 0  # FIFO resets after it filled up
 
         sleep_ms(200)  # Ensure PSU and device have settled
         if isinstance(side_str, str):  # Non-pyb targets may use other than X or Y
@@ -205,7 +230,8 @@ class MPU6050(object):
             val = 2 if mode else 0
             try:
                 self._write(val, 0x37, self.mpu_addr)  # I think this is right.
-                self._write(0x00, 0x6A, self.mpu_addr)
+                self._read(self.buf1, 0x6A, self.mpu_addr)
+                self._write(self.buf1[0] & ~0x20, 0x6A, self.mpu_addr)  # I2C master off, FIFO untouched
             except OSError:
                 raise MPUException(self._I2Cerror)
         else:
@@ -237,6 +263,18 @@ class MPU6050(object):
         except OSError:
             raise MPUException(self._I2Cerror)
 
+    def set_rate(self, rate, filt=1):
+        """
+        Sets the low pass filter (see filter_range) and the divider for a sample
+        rate of rate Hz, which paces the data registers and the FIFO. Returns
+        the rate actually set: the internal rate divided by an integer.
+        """
+        self.filter_range = filt
+        internal = 8000 if filt == 0 else 1000
+        divider = max(0, min(255, round(internal / rate) - 1))
+        self.sample_rate = divider
+        return internal / (1 + divider)
+
     # Low pass filters. Using the filter_range property of the MPU9250 is
     # harmless but gyro_filter_range is preferred and offers an extra setting.
     @property
@@ -299,6 +337,7 @@ class MPU6050(object):
                 self._write(ar_bytes[accel_range], 0x1C, self.mpu_addr)
             except OSError:
                 raise MPUException(self._I2Cerror)
+            self.accel_lsb = (16384, 8192, 4096, 2048)[accel_range]
         else:
             raise ValueError("accel_range can only be 0, 1, 2 or 3")
 
@@ -333,6 +372,7 @@ class MPU6050(object):
                 )  # Sets fchoice = b11 which enables filter
             except OSError:
                 raise MPUException(self._I2Cerror)
+            self.gyro_lsb = (131, 65.5, 32.8, 16.4)[gyro_range]
         else:
             raise ValueError("gyro_range can only be 0, 1, 2 or 3")
 
@@ -355,10 +395,9 @@ class MPU6050(object):
         self._accel._ivector[0] = bytes_toint(self.buf6[0], self.buf6[1])
         self._accel._ivector[1] = bytes_toint(self.buf6[2], self.buf6[3])
         self._accel._ivector[2] = bytes_toint(self.buf6[4], self.buf6[5])
-        scale = (16384, 8192, 4096, 2048)
-        self._accel._vector[0] = self._accel._ivector[0] / scale[self.accel_range]
-        self._accel._vector[1] = self._accel._ivector[1] / scale[self.accel_range]
-        self._accel._vector[2] = self._accel._ivector[2] / scale[self.accel_range]
+        self._accel._vector[0] = self._accel._ivector[0] / self.accel_lsb
+        self._accel._vector[1] = self._accel._ivector[1] / self.accel_lsb
+        self._accel._vector[2] = self._accel._ivector[2] / self.accel_lsb
 
     def get_accel_irq(self):
         """
@@ -370,6 +409,104 @@ class MPU6050(object):
         self._accel._ivector[1] = bytes_toint(self.buf6[2], self.buf6[3])
         self._accel._ivector[2] = bytes_toint(self.buf6[4], self.buf6[5])
 
+    def accel_into(self, samples, index=0):
+        """
+        For use in interrupt handlers. Reads x, y and z of the same sample in one
+        6-byte transaction into samples[3 * index:3 * index + 3], an array('h') or
+        list. Allocates nothing; error trapping disallowed.
+        """
+        self._read(self.buf6, 0x3B, self.mpu_addr)
+        buf, i = self.buf6, 3 * index
+        samples[i] = bytes_toint(buf[0], buf[1])
+        samples[i + 1] = bytes_toint(buf[2], buf[3])
+        samples[i + 2] = bytes_toint(buf[4], buf[5])
+
+    # FIFO: the chip stores each sample at the configured rate, so the host only
+    # has to drain it before its 1024 bytes (170 accelerometer samples) fill up
+    def fifo_enable(self):
+        """
+        Empties the FIFO and starts storing accelerometer samples in it.
+        """
+        try:
+            self._write(0x00, 0x23, self.mpu_addr)  # stop writing to the FIFO
+            self._read(self.buf1, 0x6A, self.mpu_addr)
+            ctrl = self.buf1[0] & ~0x44
+            self._write(ctrl | 0x04, 0x6A, self.mpu_addr)  # FIFO_RESET, with FIFO_EN off
+            self._write(ctrl | 0x40, 0x6A, self.mpu_addr)  # FIFO_EN
+            self._write(0x08, 0x23, self.mpu_addr)  # ACCEL_FIFO_EN
+        except OSError:
+            raise MPUException(self._I2Cerror)
+        self.fifo_left = 0
+
+    def fifo_disable(self):
+        """
+        Stops storing samples in the FIFO.
+        """
+        try:
+            self._write(0x00, 0x23, self.mpu_addr)
+            self._read(self.buf1, 0x6A, self.mpu_addr)
+            self._write(self.buf1[0] & ~0x40, 0x6A, self.mpu_addr)
+        except OSError:
+            raise MPUException(self._I2Cerror)
+
+    @property
+    def fifo_count(self):
+        """
+        Returns the number of bytes in the FIFO
+        """
+        try:
+            self._read(self.buf2, 0x72, self.mpu_addr)
+        except OSError:
+            raise MPUException(self._I2Cerror)
+        return self.buf2[0] << 8 | self.buf2[1]
+
+    def _fifo_samples(self, capacity):
+        """
+        Returns how many whole samples to drain, at most capacity.
+        """
+        count = self.fifo_count
+        if count >= FIFO_SIZE:
+            self.fifo_overflows += 1
+            self.fifo_enable()
+            return 0
+        available = count // FIFO_FRAME
+        n = min(available, capacity)
+        self.fifo_left = available - n
+        return n
+
+    def read_fifo_into(self, buf):
+        """
+        Drains as many whole accelerometer samples as the FIFO holds and buf
+        (a bytearray or memoryview) has room for, in one burst read, as 6 raw
+        big-endian bytes each. Returns the number of samples read; fifo_left is
+        set to the number still in the FIFO. A full FIFO has overwritten its
+        oldest bytes and lost the sample alignment, so it is reset instead,
+        fifo_overflows is incremented and 0 is returned.
+        """
+        n = self._fifo_samples(len(buf) // FIFO_FRAME)
+        if n:
+            try:
+                self._read(memoryview(buf)[:n * FIFO_FRAME], 0x74, self.mpu_addr)
+            except OSError:
+                raise MPUException(self._I2Cerror)
+        return n
+
+    def read_accel_into(self, samples, n=None):
+        """
+        Drains up to n samples (all that fit in samples by default) from the FIFO
+        into samples, an array('h') of x, y, z triplets. The raw bytes are read
+        in one burst into the memory of samples and byte-swapped in place, so
+        nothing is allocated. Returns the number of triplets read.
+        """
+        n = self._fifo_samples(len(samples) // 3 if n is None else min(n, len(samples) // 3))
+        if n:
+            try:
+                self._read(memoryview(samples)[:3 * n], 0x74, self.mpu_addr)
+            except OSError:
+                raise MPUException(self._I2Cerror)
+            swap_into(samples, 3 * n)
+        return n
+
     # Gyro
     @property
     def gyro(self):
@@ -389,10 +526,9 @@ class MPU6050(object):
         self._gyro._ivector[0] = bytes_toint(self.buf6[0], self.buf6[1])
         self._gyro._ivector[1] = bytes_toint(self.buf6[2], self.buf6[3])
         self._gyro._ivector[2] = bytes_toint(self.buf6[4], self.buf6[5])
-        scale = (131, 65.5, 32.8, 16.4)
-        self._gyro._vector[0] = self._gyro._ivector[0] / scale[self.gyro_range]
-        self._gyro._vector[1] = self._gyro._ivector[1] / scale[self.gyro_range]
-        self._gyro._vector[2] = self._gyro._ivector[2] / scale[self.gyro_range]
+        self._gyro._vector[0] = self._gyro._ivector[0] / self.gyro_lsb
+        self._gyro._vector[1] = self._gyro._ivector[1] / self.gyro_lsb
+        self._gyro._vector[2] = self._gyro._ivector[2] / self.gyro_lsb
 
     def get_gyro_irq(self):
         """
@@ -0,0 +1,35 @@
+# Ring of the last packets sent, resent when the server reports them missing, used by main.py
+
+
+class RetransmitRing:
+    """
+    Keeps a copy of the last size packets, by sequence number. The copies are
+    preallocated, so storing a packet allocates nothing.
+
+    Args:
+        size: packets kept.
+        packet_size: bytes per packet.
+    """
+
+    def __init__(self, size, packet_size):
+        self.size = size
+        self.packets = [bytearray(packet_size) for _ in range(size)]
+        self.seqs = [-1] * size  # sequence number of each copy, -1 when empty
+        self.resent = 0  # packets resent
+        self.missed = 0  # requested packets no longer kept
+
+    def store(self, seq, packet):
+        i = seq % self.size
+        self.packets[i][:] = packet
+        self.seqs[i] = seq
+
+    def get(self, seq):
+        """
+        Returns the packet with sequence number seq, or None if it is no longer kept.
+        """
+        i = seq % self.size
+        if self.seqs[i] != seq:
+            self.missed += 1
+            return None
+        self.resent += 1
+        return self.packets[i]
@@ -32,6 +32,7 @@ class SSD1306(framebuf.FrameBuffer):
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        self._shown = None  # copy of the buffer as last sent, for show() to skip unchanged pages
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
@@ -85,20 +86,43 @@ class SSD1306(framebuf.FrameBuffer):
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
-    def show(self):
+    def show(self, full=False):
+        # Only pages (8-pixel rows) that changed since the last show are sent,
+        # each run of consecutive changed pages in one write. Returns the number sent.
+        if self._shown is None:
+            self._shown = bytearray(len(self.buffer))
+            full = True
         x0 = 0
         x1 = self.width - 1
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
             x0 += 32
             x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        w = self.width
+        sent = 0
+        page = 0
+        while page < self.pages:
+            if not (full or self._changed(page)):
+                page += 1
+                continue
+            first = page
+            page += 1
+            while page < self.pages and (full or self._changed(page)):
+                page += 1
+            self.write_cmd(SET_COL_ADDR)
+            self.write_cmd(x0)
+            self.write_cmd(x1)
+            self.write_cmd(SET_PAGE_ADDR)
+            self.write_cmd(first)
+            self.write_cmd(page - 1)
+            self.write_data(memoryview(self.buffer)[first * w:page * w])
+            self._shown[first * w:page * w] = self.buffer[first * w:page * w]
+            sent += page - first
+        return sent
+
+    def _changed(self, page):
+        w = self.width
+        return self.buffer[page * w:(page + 1) * w] != self._shown[page * w:(page + 1) * w]
 
 
 class SSD1306_I2C(SSD1306):
@@ -0,0 +1,44 @@
+# Rate-limited status screen on the OLED, used by main.py
+
+import time
+
+
+class StatusView:
+    """
+    Shows the latest reading and the dropped samples on the OLED. update() can
+    be called for every packet: the screen is redrawn at most every interval_ms,
+    and show() then only sends the pages whose text changed.
+    Args:
+        oled: SSD1306 display.
+        interval_ms: shortest time between redraws, 500 for 2 Hz.
+        clock: module with ticks_ms and ticks_diff (time on the Pico).
+    """
+
+    def __init__(self, oled, interval_ms=500, clock=time):
+        self.oled = oled
+        self.interval_ms = interval_ms
+        self.clock = clock
+        self.redraws = 0
+        self.pages_sent = 0
+        self._drawn = None  # ticks_ms of the last redraw
+
+    def update(self, ax, ay, az, dropped=0):
+        """
+        Redraws the screen with these values if the last redraw is old enough.
+        Returns True if it did.
+        """
+        now = self.clock.ticks_ms()
+        if self._drawn is not None and self.clock.ticks_diff(now, self._drawn) < self.interval_ms:
+            return False
+        self._drawn = now
+        oled = self.oled
+        oled.fill(0)
+        oled.text("Acceleration:", 0, 0)
+        oled.text("ax: {:.2f} G".format(ax), 0, 20)
+        oled.text("ay: {:.2f} G".format(ay), 0, 30)
+        oled.text("az: {:.2f} G".format(az), 0, 40)
+        if dropped:
+            oled.text("lost: {}".format(dropped), 0, 54)
+        self.pages_sent += oled.show()
+        self.redraws += 1
+        return True
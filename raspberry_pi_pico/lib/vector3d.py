@@ -24,7 +24,13 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 '''
 
-from utime import sleep_ms
+try:
+    from utime import sleep_ms
+except ImportError:  # CPython host
+    from time import sleep
+
+    def sleep_ms(ms):
+        sleep(ms / 1000)
 from math import sqrt, degrees, acos, atan2
 
 
@@ -79,29 +85,47 @@ class Vector3d(object):
         '''
         Vector adjusted for calibration offsets
         '''
-        return list(map(lambda val, offset: val - offset, self._vector, self.cal))
+        return [self._vector[i] - self.cal[i] for i in range(3)]
+
+    def _corrected(self, axis):
+        a = self._transpose[axis]
+        return (self._vector[a] - self.cal[a]) * self._scale[axis]
 
     @property
     def x(self):                                # Corrected, vehicle relative floating point values
         self.update()
-        return self._calvector[self._transpose[0]] * self._scale[0]
+        return self._corrected(0)
 
     @property
     def y(self):
         self.update()
-        return self._calvector[self._transpose[1]] * self._scale[1]
+        return self._corrected(1)
 
     @property
     def z(self):
         self.update()
-        return self._calvector[self._transpose[2]] * self._scale[2]
+        return self._corrected(2)
 
     @property
-    def xyz(self):
+    def xyz(self):                              # One update: all three from the same sample
         self.update()
-        return (self._calvector[self._transpose[0]] * self._scale[0],
-                self._calvector[self._transpose[1]] * self._scale[1],
-                self._calvector[self._transpose[2]] * self._scale[2])
+        return (self._corrected(0), self._corrected(1), self._corrected(2))
+
+    def calibrate_into(self, samples, out, n, lsb=1):
+        '''
+        Corrects n raw sensor relative triplets, e.g. from MPU6050.read_accel_into,
+        into out (3 values per triplet, e.g. an array('f')) in a single pass:
+        each triplet gets the same calibration offsets, transposition and scaling
+        as xyz. lsb is the raw value per unit (MPU6050.accel_lsb). No per-sample
+        lists are built.
+        '''
+        t0, t1, t2 = self._transpose
+        o0, o1, o2 = self.cal[t0] * lsb, self.cal[t1] * lsb, self.cal[t2] * lsb
+        k0, k1, k2 = self._scale[0] / lsb, self._scale[1] / lsb, self._scale[2] / lsb
+        for i in range(0, 3 * n, 3):
+            out[i] = (samples[i + t0] - o0) * k0
+            out[i + 1] = (samples[i + t1] - o1) * k1
+            out[i + 2] = (samples[i + t2] - o2) * k2
 
     @property
     def magnitude(self):
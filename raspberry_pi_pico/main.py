@@ -1,10 +1,15 @@
 import socket
+import struct
 import network  # type: ignore
 import time
 import lib.secrets as secrets
 from imu import MPU6050  # type: ignore
+from acquisition import FifoSampler, TimerSampler  # type: ignore
+from features import FFT_SIZE, FeatureWindow  # type: ignore
+from retransmit import RetransmitRing  # type: ignore
 from ssd1306 import SSD1306_I2C  # type: ignore
-from machine import I2C, Pin  # type: ignore
+from status import StatusView  # type: ignore
+from machine import I2C, Pin, Timer, unique_id  # type: ignore
 
 # Wi-Fi Connection
 wifi = network.WLAN(network.STA_IF)  # Initialize the Wi-Fi interface
@@ -26,58 +31,129 @@ mpu = MPU6050(i2c_mpu)  # Create MPU6050 object
 # OLED setup
 i2c_oled = I2C(1, scl=Pin(3), sda=Pin(2), freq=400000)  # Initialize I2C for OLED display
 oled = SSD1306_I2C(128, 64, i2c_oled)  # Create OLED object with specified dimensions
+status = StatusView(oled, interval_ms=500)  # Redraw at 2 Hz at most, whatever the packet rate
 
 
-def get_acceleration(mpu):
-    """
-    Reads the acceleration values from the MPU6050 sensor and applies a calibration to the z-axis.
-    The calibration adjusts the z-axis reading to account for sensor bias and gravitational force.
-    Args:
-        mpu: An object representing the MPU6050 sensor. It is expected to have an 'accel' attribute
-                with x, y, and z attributes representing acceleration in each axis.
-    Returns:
-        A tuple containing the calibrated acceleration values (ax, ay, az) in g's.
-        ax: Acceleration in the x-axis.
-        ay: Acceleration in the y-axis.
-        az: Calibrated acceleration in the z-axis.
-    """
-    ax = mpu.accel.x
-    ay = mpu.accel.y
-    az = mpu.accel.z - 0.02084873 * mpu.accel.z - 0.3439426
-    return ax, ay, az
-
-
-# Pre-allocate the readings list and the message buffer
-NUM_READINGS = 200
-readings = [None] * NUM_READINGS  # Pre-allocate list
-message_buffer = bytearray(25 * NUM_READINGS)  # Pre-allocate byte array for the message
+# Binary frame layout, see server/protocol.py
+FRAME_MAGIC = b'VA'
+FRAME_VERSION = 3
+FRAME_FLAG_BIG_ENDIAN = 0x01  # Payload is copied verbatim from the MPU6050 registers
+FRAME_HEADER = '<2sBBHIHBBQHII'
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER)
+FEATURE_MAGIC = b'VF'
+FEATURE_VERSION = 1
+FEATURE_HEADER = '<2sBBHIHBBQHIIH'
+FEATURE_AXIS = '<IHIIHI'  # rms, p2p, crest, kurtosis, peak bin, peak amplitude of one axis
+FEATURE_HEADER_SIZE = struct.calcsize(FEATURE_HEADER)
+FEATURE_AXIS_SIZE = struct.calcsize(FEATURE_AXIS)
+
+DEVICE_ID = int.from_bytes(unique_id()[-2:], 'little')  # Identifies this Pico on the server
+SAMPLE_RATE = 1000  # Nominal sample rate (Hz), paced by the MPU6050 itself
+LOW_PASS = 1  # MPU6050 low pass filter: 184 Hz, below the 500 Hz Nyquist frequency
+ACCEL_RANGE = mpu.accel_range  # Read once: every register read costs an I2C transaction
+ACCEL_SCALE = (16384, 8192, 4096, 2048)[ACCEL_RANGE]  # LSB per g
+
+# Acquisition: 'fifo' lets the MPU6050 pace the samples and buffer up to 170 ms of them,
+# 'timer' samples from a timer interrupt into two packets, one filled while the other is sent
+ACQUISITION = 'fifo'
+NUM_READINGS = 200  # Readings per packet, 6 raw bytes each after the header
+sequence = 0  # Of the packets sent, so the server can reorder them and detect the missing ones
+RETRANSMIT = 8  # Last packets kept for resending when the server reports them missing (NACK), 0 disables
+ring = RetransmitRing(RETRANSMIT, FRAME_HEADER_SIZE + 6 * NUM_READINGS) if RETRANSMIT else None
+
+# Data sent: 'raw' sends every packet, 'features' one feature frame per FEATURE_WINDOW samples
+# and raw packets only when the server asks for a snapshot. The features are computed between
+# packets: keep the FIFO from overflowing (the dropped count shows it) with a lower SAMPLE_RATE
+# or the 'timer' acquisition.
+MODE = 'raw'
+FEATURE_WINDOW = 1024  # Samples per feature frame, a multiple of the FFT_SIZE samples per spectrum
+window = FeatureWindow(FEATURE_WINDOW)
+feature_frame = bytearray(FEATURE_HEADER_SIZE + 3 * FEATURE_AXIS_SIZE)
+feature_sequence = 0
+window_t0_us = 0
+snapshot = 0  # Raw packets still to send for the last snapshot request
+UDP_SERVER.setblocking(False)  # Requests from the server are polled between packets
+
+# Samples are timestamped on the device clock, which the server maps to its own clock
+mpu.set_rate(SAMPLE_RATE, LOW_PASS)
+if ACQUISITION == 'timer':
+    sampler = TimerSampler(mpu, SAMPLE_RATE, NUM_READINGS, FRAME_HEADER_SIZE)
+    sampler.start(Timer())
+else:
+    sampler = FifoSampler(mpu, SAMPLE_RATE, NUM_READINGS, FRAME_HEADER_SIZE)
+
+
+def send_features(t0_us, span_us):
+    # Feature frame of the full window, see server/protocol.py
+    global feature_sequence
+    struct.pack_into(FEATURE_HEADER, feature_frame, 0, FEATURE_MAGIC, FEATURE_VERSION, 0, DEVICE_ID,
+                     feature_sequence, SAMPLE_RATE, ACCEL_RANGE, 3, t0_us, window.count, span_us,
+                     sampler.dropped, FFT_SIZE)
+    values = window.result()
+    for axis in range(3):
+        struct.pack_into(FEATURE_AXIS, feature_frame, FEATURE_HEADER_SIZE + axis * FEATURE_AXIS_SIZE,
+                         *values[6 * axis:6 * axis + 6])
+    feature_sequence = (feature_sequence + 1) & 0xFFFFFFFF
+    UDP_SERVER.sendto(feature_frame, (UDP_IP, UDP_PORT))
+    window.reset()
+
+
+def add_features(packet, t0_us, span_us):
+    # Feeds the readings of a packet to the window, sending a feature frame whenever it is full
+    global window_t0_us
+    index = 0
+    while index < NUM_READINGS:
+        if not window.count:
+            window_t0_us = t0_us + index * span_us // (NUM_READINGS - 1)
+        index += window.add(packet, FRAME_HEADER_SIZE + 6 * index, NUM_READINGS - index)
+        if window.full:
+            last_us = t0_us + (index - 1) * span_us // (NUM_READINGS - 1)
+            send_features(window_t0_us, last_us - window_t0_us)
+
+
+def poll_commands():
+    # Handles the requests received from the server: "SNAPSHOT n" for n raw packets in feature
+    # mode, "NACK seq ..." to resend missing packets from the ring
+    global snapshot
+    while True:
+        try:
+            command = UDP_SERVER.recv(256)
+        except OSError:  # Nothing (more) received
+            return
+        words = command.split()
+        try:
+            if len(words) == 2 and words[0] == b'SNAPSHOT':
+                snapshot = max(snapshot, int(words[1]))
+            elif words and words[0] == b'NACK' and ring:
+                for word in words[1:]:
+                    missing = ring.get(int(word))
+                    if missing:
+                        UDP_SERVER.sendto(missing, (UDP_IP, UDP_PORT))
+        except ValueError:  # Malformed command, ignored
+            pass
+
 
 while True:
-    # Collect readings from the MPU6050 sensor
-    for i in range(NUM_READINGS):
-        ax, ay, az = get_acceleration(mpu)  # Get calibrated acceleration values
-        readings[i] = "{:.4f}, {:.4f}, {:.4f}".format(ax, ay, az)  # Format and store the reading
-        time.sleep(0.005)  # Delay for 5ms
-
-    # Construct the message directly into the buffer
-    message_len = 0
-    for reading in readings:
-        encoded_reading = reading.encode()
-        message_buffer[message_len:message_len + len(encoded_reading)] = encoded_reading
-        message_len += len(encoded_reading)
-        message_buffer[message_len] = 10  # Add newline character
-        message_len += 1
-
-    # Send the message to the UDP server, using a memoryview to avoid copying
-    UDP_SERVER.sendto(memoryview(message_buffer)[:message_len], (UDP_IP, UDP_PORT))
-
-    # Clear the OLED display
-    oled.fill(0)
-    oled.show()
-
-    # Display acceleration values on the OLED
-    oled.text("Acceleration:", 0, 0)
-    oled.text("ax: {:.2f} G".format(ax), 0, 20)
-    oled.text("ay: {:.2f} G".format(ay), 0, 30)
-    oled.text("az: {:.2f} G".format(az), 0, 40)
-    oled.show()  # Update the OLED display
+    # Wait for a packet of raw readings (big-endian x, y, z)
+    packet, t0_us, span_us = sampler.acquire()
+    poll_commands()
+
+    # Send the packet to the UDP server, in feature mode only while a snapshot is requested
+    if MODE == 'features':
+        add_features(packet, t0_us, span_us)
+    if MODE != 'features' or snapshot:
+        struct.pack_into(FRAME_HEADER, packet, 0, FRAME_MAGIC, FRAME_VERSION, FRAME_FLAG_BIG_ENDIAN,
+                         DEVICE_ID, sequence, SAMPLE_RATE, ACCEL_RANGE, 0, t0_us, NUM_READINGS, span_us,
+                         sampler.dropped)
+        UDP_SERVER.sendto(packet, (UDP_IP, UDP_PORT))
+        if ring:
+            ring.store(sequence, packet)
+        sequence = (sequence + 1) & 0xFFFFFFFF
+        snapshot = max(0, snapshot - 1)
+
+    # Last reading in g, z-axis calibration is applied on the server
+    ax, ay, az = (v / ACCEL_SCALE for v in struct.unpack_from('>hhh', packet, len(packet) - 6))
+    sampler.release(packet)
+
+    # Display acceleration values on the OLED, sending only the changed pages
+    status.update(ax, ay, az, sampler.dropped)
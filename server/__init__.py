@@ -0,0 +1,3 @@
+"""
+UDP ingestion server for acceleration data sent by the Raspberry Pi Pico W.
+"""
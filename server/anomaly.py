@@ -0,0 +1,263 @@
+"""
+Streaming anomaly detection on the band energies of every device.
+
+The ingestion server hands each packet, in sequence order and on the server
+clock, to AnomalyDetector. The samples of a device are cut into windows of
+WINDOW samples, and every window becomes a fingerprint: the energy (mean
+square, dB re 1 g^2) of each axis in each band of BAND_EDGES. Each device
+learns the mean and covariance of its own fingerprints, and a window is
+anomalous when its squared Mahalanobis distance to them exceeds THRESHOLD,
+so an alarm is raised on the first window after a change.
+
+The baseline is updated in O(1) per window with exponential weights:
+weight 1 / n for the first windows, which is the exact running mean and
+covariance, then ALPHA, so it follows slow drift (temperature, load) over
+about 1 / ALPHA windows. Anomalous windows are not learned, so a fault does
+not become the new normal; reset() starts learning again, e.g. after
+maintenance. Scores are reported after WARMUP windows.
+
+All state lives in arrays with one row per device, so each device costs a
+constant few kB, and process() handles the windows completed by all devices
+with one rfft and one batched linear solve.
+
+    detector = AnomalyDetector()
+    detector.update(key, packet)  # For every packet
+    for alarm in detector.process():  # Periodically
+        print(alarm)
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from analysis.spectral import get_window
+
+from .protocol import sample_period_us
+
+WINDOW = 256  # Samples per window, 1.28 s at 200 Hz
+BAND_EDGES = (1, 5, 10, 20, 40, 60, 80, 100)  # Hz; bands above the Nyquist frequency of a device stay empty
+WARMUP = 300  # Windows learned before a device is scored, 6.4 min at 200 Hz
+ALPHA = 1e-3  # Weight of a new window in the baseline once warmed up
+THRESHOLD = 60.0  # Squared Mahalanobis distance of an anomalous window, about p < 1e-5 for 21 features
+CLEAR = 5  # Consecutive normal windows that clear an alarm
+VARIANCE_FLOOR = 0.25  # dB^2 added to the variance of every feature, so steady bands do not alarm on noise
+ENERGY_FLOOR = 1e-6  # g^2 added to every band energy, about the accelerometer noise in a band
+GAP_SAMPLES = 2  # Missing time, in sample periods, that discards the window in progress
+
+Alarm = namedtuple("Alarm", ["key", "t_us", "raised", "score", "axis", "band", "deviation_db"])
+Alarm.__doc__ = """
+Change of the alarm state of a device.
+    t_us: time of the first sample of the window (server clock).
+    raised: True when the alarm is raised, False when it clears.
+    score: squared Mahalanobis distance of the window.
+    axis, band: index of the axis and (low, high) Hz of the band that deviates
+        most from its baseline, by deviation_db.
+"""
+
+
+class AnomalyDetector:
+    """
+    Per-device baselines of band energies and the alarms of all devices.
+    Args:
+        window: samples per window.
+        band_edges: increasing band edges (Hz).
+        k: axes per sample.
+    """
+
+    def __init__(self, window=WINDOW, band_edges=BAND_EDGES, warmup=WARMUP, alpha=ALPHA, threshold=THRESHOLD,
+                 clear=CLEAR, k=3):
+        self.window = window
+        self.band_edges = np.asarray(band_edges, dtype=np.float64)
+        self.warmup = warmup
+        self.alpha = alpha
+        self.threshold = threshold
+        self.clear = clear
+        self.k = k
+        self.d = (len(self.band_edges) - 1) * k  # Features per window
+        self.slots = {}  # Device key -> row of the state arrays
+        self._taper = get_window("hann", window)
+        self._scale = 2 / (window * np.sum(self._taper**2))  # |X|^2 to one-sided mean square
+        self._masks = {}  # Sample rate -> (bins, bands) band membership
+        self._ready = []  # Completed windows: (slot, t_us, samples)
+        self._allocate(0)
+
+    def _allocate(self, capacity):
+        """
+        Grows the state arrays to capacity rows, keeping the existing ones.
+        """
+        old = getattr(self, "_capacity", 0)
+        arrays = {
+            "_buffer": np.zeros((capacity, self.window, self.k), np.float32),  # Window in progress
+            "_fill": np.zeros(capacity, np.int64),  # Samples in it
+            "_start_us": np.zeros(capacity, np.float64),  # Time of its first sample
+            "_next_us": np.full(capacity, np.nan),  # Expected time of the next sample
+            "_fs": np.zeros(capacity, np.float64),
+            "_n": np.zeros(capacity, np.int64),  # Windows learned
+            "_mean": np.zeros((capacity, self.d)),
+            "_cov": np.zeros((capacity, self.d, self.d)),
+            "_alarm": np.zeros(capacity, bool),
+            "_normal": np.zeros(capacity, np.int64),  # Consecutive normal windows during an alarm
+            "_windows": np.zeros(capacity, np.int64),
+            "_alarms": np.zeros(capacity, np.int64),
+            "_score": np.full(capacity, np.nan),
+        }
+        for name, array in arrays.items():
+            if old:
+                array[:old] = getattr(self, name)
+            setattr(self, name, array)
+        self._capacity = capacity
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = len(self.slots)
+            if slot == self._capacity:
+                self._allocate(max(8, 2 * self._capacity))
+        return slot
+
+    def update(self, key, packet):
+        """
+        Adds the samples of a timestamped packet (see DeviceTiming.apply) to the
+        window in progress of its device; completed windows wait for process().
+        """
+        slot = self._slot(key)
+        if packet.fs != self._fs[slot]:  # New device or new rate: the bands fall on other bins
+            self._fs[slot] = packet.fs
+            self.reset(key)
+        samples = packet.samples
+        period = sample_period_us(packet)
+        if self._fill[slot] and abs(packet.t0_us - self._next_us[slot]) > GAP_SAMPLES * period:
+            self._fill[slot] = 0  # The window would splice data across a gap
+        self._next_us[slot] = packet.t0_us + len(samples) * period
+        i = 0
+        while i < len(samples):
+            fill = self._fill[slot]
+            if fill == 0:
+                self._start_us[slot] = packet.t0_us + i * period
+            count = min(self.window - fill, len(samples) - i)
+            self._buffer[slot, fill:fill + count] = samples[i:i + count]
+            self._fill[slot] = fill + count
+            i += count
+            if self._fill[slot] == self.window:
+                self._ready.append((slot, self._start_us[slot], self._buffer[slot].copy()))
+                self._fill[slot] = 0
+
+    def reset(self, key):
+        """
+        Forgets the baseline and alarm of a device, which learns it again.
+        """
+        slot = self._slot(key)
+        for name in ("_fill", "_n", "_normal"):
+            getattr(self, name)[slot] = 0
+        self._mean[slot] = 0
+        self._cov[slot] = 0
+        self._alarm[slot] = False
+        self._score[slot] = np.nan
+
+    def _mask(self, fs):
+        mask = self._masks.get(fs)
+        if mask is None:
+            f = np.fft.rfftfreq(self.window, 1 / fs)
+            low, high = self.band_edges[:-1], self.band_edges[1:]
+            mask = (f[:, None] >= low) & ((f[:, None] < high) | ((high == high[-1]) & (f[:, None] == high)))
+            mask = self._masks[fs] = mask.astype(np.float64)
+        return mask
+
+    def fingerprints(self, windows, fs):
+        """
+        Band energies of (m, window, k) samples at sample rate fs.
+        Returns:
+            A (m, bands * k) array in dB re 1 g^2, band-major.
+        """
+        windows = np.asarray(windows, dtype=np.float64)
+        windows = (windows - windows.mean(axis=1, keepdims=True)) * self._taper[:, None]
+        power = np.abs(np.fft.rfft(windows, axis=1)) ** 2 * self._scale  # (m, bins, k)
+        energy = np.einsum("mbk,bj->mjk", power, self._mask(fs))
+        return 10 * np.log10(energy + ENERGY_FLOOR).reshape(len(windows), -1)
+
+    def process(self):
+        """
+        Scores and learns all completed windows.
+        Returns:
+            The list of Alarm raised or cleared, in window order per device.
+        """
+        if not self._ready:
+            return []
+        ready, self._ready = self._ready, []
+        slots = np.array([slot for slot, _, _ in ready])
+        t_us = np.array([t for _, t, _ in ready])
+        windows = np.stack([samples for _, _, samples in ready])
+        x = np.empty((len(ready), self.d))
+        fs = self._fs[slots]
+        for rate in np.unique(fs):
+            x[fs == rate] = self.fingerprints(windows[fs == rate], rate)
+
+        events = []
+        todo = np.arange(len(ready))
+        while len(todo):  # One window per device at a time, as each updates the baseline of the next
+            _, first = np.unique(slots[todo], return_index=True)
+            batch = todo[np.sort(first)]
+            events += self._step(slots[batch], t_us[batch], x[batch])
+            todo = np.setdiff1d(todo, batch)
+        return events
+
+    def _step(self, slots, t_us, x):
+        """
+        Scores windows x of distinct devices, updates their alarms and baselines.
+        """
+        delta = x - self._mean[slots]  # (m, d)
+        cov = self._cov[slots] + VARIANCE_FLOOR * np.eye(self.d)
+        score = np.einsum("md,md->m", delta, np.linalg.solve(cov, delta[..., None])[..., 0])
+        scored = self._n[slots] >= self.warmup
+        anomalous = scored & (score > self.threshold)
+        self._score[slots] = np.where(scored, score, np.nan)
+        self._windows[slots] += 1
+
+        events = []
+        keys = list(self.slots)  # Slots are numbered in insertion order
+        z = delta / np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+        for i in np.flatnonzero(anomalous != self._alarm[slots]):
+            slot = slots[i]
+            if anomalous[i]:
+                self._alarm[slot] = True
+                self._alarms[slot] += 1
+                self._normal[slot] = 0
+            else:
+                self._normal[slot] += 1
+                if self._normal[slot] < self.clear:
+                    continue
+                self._alarm[slot] = False
+            j = int(np.argmax(np.abs(z[i])))
+            band, axis = divmod(j, self.k)
+            events.append(Alarm(
+                keys[slot], int(t_us[i]), bool(anomalous[i]), float(score[i]), axis,
+                (float(self.band_edges[band]), float(self.band_edges[band + 1])), float(delta[i, j]),
+            ))
+        self._normal[slots[anomalous]] = 0
+
+        learn = slots[~anomalous]  # Exponentially weighted mean and covariance, exact while n < 1 / alpha
+        delta = delta[~anomalous]
+        self._n[learn] += 1
+        a = np.maximum(1 / self._n[learn], self.alpha)[:, None]
+        self._mean[learn] += a * delta
+        outer = delta[:, :, None] * delta[:, None, :]
+        self._cov[learn] = (1 - a[..., None]) * (self._cov[learn] + a[..., None] * outer)
+        return events
+
+    def status(self, key):
+        """
+        Statistics of a device, or None if unknown.
+        Returns:
+            A dict: windows checked, windows learned, alarms raised, whether an
+            alarm is active and the score of the last window (NaN while learning).
+        """
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        return {
+            "windows": int(self._windows[slot]),
+            "learned": int(self._n[slot]),
+            "alarms": int(self._alarms[slot]),
+            "alarm": bool(self._alarm[slot]),
+            "score": float(self._score[slot]),
+        }
@@ -0,0 +1,62 @@
+"""
+Compares CSV persistence throughput: the original per-packet open/writerow
+loop against the buffered CsvWriter.
+
+    python -m server.benchmark_writer --packets 2000
+"""
+
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .writer import CsvWriter
+
+SAMPLES_PER_PACKET = 200
+
+
+def per_packet(path, packets):
+    """
+    Original server.py behaviour: reopen the file and write row by row for every packet.
+    """
+    for block in packets:
+        with open(path, mode="a", newline="") as file:
+            writer = csv.writer(file)
+            for ax, ay, az in block.tolist():
+                writer.writerow([ax, ay, az])
+
+
+def buffered(path, packets, fsync_interval=None):
+    with CsvWriter(path, fsync_interval=fsync_interval) as writer:
+        for block in packets:
+            writer.write(block)
+
+
+def measure(name, function, packets, *args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "acceleration_data.csv")
+        start = time.perf_counter()
+        function(path, packets, *args)
+        elapsed = time.perf_counter() - start
+    rows = sum(len(block) for block in packets)
+    print(f"{name:<28}{rows / elapsed:>14,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    packets = [rng.normal(0, 0.1, (SAMPLES_PER_PACKET, 3)).round(4) for _ in range(args.packets)]
+
+    measure("per packet (before)", per_packet, packets)
+    measure("buffered (after)", buffered, packets)
+    measure("buffered, fsync per flush", buffered, packets, 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Mapping of device timestamps to the server clock.
+
+Each Pico timestamps its samples with a free-running microsecond counter
+that has its own offset and drifts by tens of ppm. Every packet is sent right
+after its last sample, so arrival time minus device time is the clock offset
+plus the network delay. The delay is never negative and is close to its
+minimum for many packets, so ClockModel tracks the lower envelope of these
+differences: the smallest one per SYNC_BUCKET seconds of device time, and a
+least-squares line through the last SYNC_POINTS of them gives offset and
+drift. No request/response exchange with the device is needed.
+
+DeviceTiming applies the model to each packet of one device, so the writers
+receive first-sample times and sample periods on the server clock, and
+counts the gaps between consecutive packets and the samples the device
+reports it dropped.
+"""
+
+from collections import deque
+
+import numpy as np
+
+from .protocol import sample_count, sample_period_us
+
+SYNC_BUCKET = 10.0  # Seconds of device time per envelope point
+SYNC_POINTS = 30  # Envelope points in the fit, 5 minutes with SYNC_BUCKET = 10
+GAP_SAMPLES = 2  # Missing time, in sample periods, reported as a gap
+RESET_US = 1_000_000  # Device clock going back further than this means the device restarted
+
+
+class ClockModel:
+    """
+    Offset and drift of one device clock relative to the server clock.
+    """
+
+    def __init__(self, bucket=SYNC_BUCKET, points=SYNC_POINTS):
+        self.bucket_us = int(bucket * 1e6)
+        self.points = deque(maxlen=points)  # [device time, smallest arrival - device time] per bucket
+        self.offset = None  # Server minus device time at device time ref (us)
+        self.drift = 0.0  # Server clock rate relative to the device clock, minus one
+        self.ref = 0
+        self.resets = 0  # Device restarts seen
+
+    def update(self, device_us, arrival_us):
+        """
+        Adds a packet sent at device time device_us and received at arrival_us.
+        """
+        if self.points and device_us < self.points[-1][0] - RESET_US:
+            self.points.clear()
+            self.resets += 1
+        difference = arrival_us - device_us
+        if self.points and device_us // self.bucket_us == self.points[-1][0] // self.bucket_us:
+            if difference < self.points[-1][1]:
+                self.points[-1] = [device_us, difference]
+        else:
+            self.points.append([device_us, difference])
+        self._fit()
+
+    def _fit(self):
+        device, difference = np.array(self.points, dtype=np.float64).T
+        self.ref = int(device[-1])
+        if len(device) < 3:  # Not enough baseline for the drift yet
+            self.drift = 0.0
+            self.offset = difference.min()
+            return
+        x = device - self.ref
+        self.drift, self.offset = np.polyfit(x, difference, 1)
+        # Shift the line below every point, so it follows the envelope and not its noise
+        self.offset += min(0.0, (difference - (self.drift * x + self.offset)).min())
+
+    def to_server(self, device_us):
+        return device_us + self.offset + self.drift * (device_us - self.ref)
+
+
+class DeviceTiming:
+    """
+    Server-clock timing of the packets of one device, and gap statistics.
+    Args:
+        legacy_fs: nominal rate of legacy text packets, which carry no timestamps.
+    """
+
+    def __init__(self, legacy_fs=200):
+        self.legacy_fs = legacy_fs
+        self.clock = ClockModel()
+        self.gaps = 0  # Gaps longer than GAP_SAMPLES periods between consecutive packets
+        self.gap_seconds = 0.0
+        self.device_dropped = 0  # Samples the device dropped, summed over its restarts
+        self._dropped = None  # Running count of the last packet
+        self._next_us = None  # Expected time of the next sample
+        self._last_arrival_us = None
+
+    def apply(self, packet, arrival_us):
+        """
+        Returns the packet (or feature frame) with fs set and t0_us and span_us on
+        the server clock.
+        """
+        n = sample_count(packet)
+        if packet.dropped is not None:
+            # The count restarts from zero with the device
+            restarted = self._dropped is None or packet.dropped < self._dropped
+            self.device_dropped += packet.dropped - (0 if restarted else self._dropped)
+            self._dropped = packet.dropped
+        if packet.t0_us is None:
+            packet = self._legacy(packet, arrival_us)
+        else:
+            period = sample_period_us(packet)
+            self.clock.update(packet.t0_us + (n - 1) * period, arrival_us)
+            t0_us = self.clock.to_server(packet.t0_us)
+            packet = packet._replace(
+                t0_us=int(round(t0_us)), span_us=int(round((n - 1) * period * (1 + self.clock.drift)))
+            )
+        period = sample_period_us(packet)
+        if self._next_us is not None and packet.t0_us - self._next_us > GAP_SAMPLES * period:
+            self.gaps += 1
+            self.gap_seconds += (packet.t0_us - self._next_us) / 1e6
+        self._next_us = packet.t0_us + n * period
+        return packet
+
+    def _legacy(self, packet, arrival_us):
+        """
+        Text packets are sent right after their last sample. Consecutive ones are
+        assumed contiguous, so their real sample period is the time between
+        arrivals divided by the number of samples.
+        """
+        n = len(packet.samples)
+        nominal = n * 1e6 / self.legacy_fs
+        elapsed = None if self._last_arrival_us is None else arrival_us - self._last_arrival_us
+        self._last_arrival_us = arrival_us
+        if elapsed is not None and n and elapsed < 2 * nominal:
+            t0_us, period = self._next_us, elapsed / n
+        else:  # First packet or after an outage
+            t0_us, period = arrival_us - nominal, 1e6 / self.legacy_fs
+        return packet._replace(
+            fs=self.legacy_fs, t0_us=int(round(t0_us)), span_us=int(round(max(n - 1, 0) * period))
+        )
@@ -0,0 +1,218 @@
+"""
+Live view of the most recent data of each device.
+
+The ingestion server resamples the packets of each device onto its nominal
+rate using their measured sample times, keeps a ring buffer of the last
+LIVE_SECONDS of samples and updates a sliding-window spectrum: every
+segment is transformed once, when it completes, and the spectrum is the mean
+of the segments inside the window. Snapshots are served over a local Unix
+socket, so the live dashboard never touches the recording files.
+
+Socket protocol: the client sends one command line, "devices" or
+"snapshot <device>", and receives an 8-byte little-endian length followed by
+a JSON list of device keys or an .npz snapshot (empty for an unknown device).
+"""
+
+import io
+import json
+import os
+import socket
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+from analysis.resample import StreamingResampler
+from analysis.spectral import get_window
+
+from .protocol import sample_period_us
+
+LIVE_SOCKET = os.path.join(tempfile.gettempdir(), "vibration_live.sock")
+LIVE_SECONDS = 10  # Seconds of samples kept per device
+LIVE_NPERSEG = 256  # Segment length of the sliding-window spectrum
+LENGTH = struct.Struct("<Q")
+
+
+class RingBuffer:
+    """
+    Fixed-size circular buffer of (capacity, k) float32 rows.
+    """
+
+    def __init__(self, capacity, k=3):
+        self._data = np.zeros((capacity, k), np.float32)
+        self._end = 0  # Total rows ever written
+        self.capacity = capacity
+
+    def __len__(self):
+        return min(self._end, self.capacity)
+
+    def append(self, block):
+        block = block[-self.capacity:]
+        start = self._end % self.capacity
+        first = min(len(block), self.capacity - start)
+        self._data[start:start + first] = block[:first]
+        self._data[:len(block) - first] = block[first:]
+        self._end += len(block)
+
+    def latest(self, n=None):
+        """
+        Returns a copy of the last n rows (all by default), oldest first.
+        """
+        n = len(self) if n is None else min(n, len(self))
+        idx = np.arange(self._end - n, self._end) % self.capacity
+        return self._data[idx]
+
+
+class LiveSpectrum:
+    """
+    Ring buffer and sliding-window PSD (Hann, 50 % overlap) of one device.
+    """
+
+    def __init__(self, fs, seconds=LIVE_SECONDS, nperseg=LIVE_NPERSEG, k=3):
+        self.fs = fs
+        self.k = k
+        self.nperseg = nperseg
+        self.step = nperseg // 2
+        self.samples = RingBuffer(int(seconds * fs), k)
+        self.frequencies = np.fft.rfftfreq(nperseg, 1 / fs)
+        self.updated = np.nan  # Wall-clock time of the last packet, NaN before the first
+        self._window = get_window("hann", nperseg).astype(np.float32)
+        self._scale = 1 / (fs * np.sum(self._window.astype(np.float64) ** 2))
+        segments = max(1, (self.samples.capacity - nperseg) // self.step + 1)
+        self._segments = RingBuffer(segments, len(self.frequencies) * k)
+        self._tail = np.zeros((0, k), np.float32)
+
+    def update(self, samples, contiguous=True):
+        """
+        Adds samples at fs. contiguous=False when they do not follow the previous
+        ones, e.g. after a gap: segments then do not span the gap.
+        """
+        if not contiguous:
+            self._tail = self._tail[:0]
+        data = np.concatenate([self._tail, samples])
+        count = 0 if len(data) < self.nperseg else (len(data) - self.nperseg) // self.step + 1
+        if count:
+            views = np.lib.stride_tricks.sliding_window_view(data, self.nperseg, axis=0)[::self.step][:count]
+            views = (views - views.mean(axis=-1, keepdims=True)) * self._window
+            power = np.abs(np.fft.rfft(views, axis=-1)) ** 2 * self._scale
+            power[..., 1:(self.nperseg + 1) // 2] *= 2
+            self._segments.append(np.swapaxes(power, 1, 2).reshape(count, -1))
+        self._tail = data[count * self.step:]
+        self.samples.append(samples)
+        self.updated = time.time()
+
+    @property
+    def psd(self):
+        """
+        (bins, k) PSD in g^2/Hz averaged over the segments in the window.
+        """
+        if not len(self._segments):
+            return np.zeros((len(self.frequencies), self.k), np.float32)
+        return self._segments.latest().mean(axis=0).reshape(len(self.frequencies), self.k)
+
+    def snapshot(self):
+        """
+        Serialises the current window, spectrum and metadata as .npz bytes.
+        """
+        samples = self.samples.latest()
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            t=(np.arange(len(samples)) - (len(samples) - 1)) / self.fs,  # Seconds before the last sample
+            samples=samples,
+            frequencies=self.frequencies,
+            psd=self.psd,
+            fs=self.fs,
+            updated=self.updated,
+        )
+        return buffer.getvalue()
+
+
+class LiveRegistry:
+    """
+    LiveSpectrum per device, updated by the ingestion server and served on a Unix socket.
+    """
+
+    def __init__(self, seconds=LIVE_SECONDS, nperseg=LIVE_NPERSEG):
+        self.seconds = seconds
+        self.nperseg = nperseg
+        self.devices = {}
+        self._resamplers = {}
+        self._next = {}  # Grid index (time * fs) of the next sample of each device
+
+    def update(self, key, packet):
+        """
+        Resamples a packet onto the device's nominal rate grid and adds it to its spectrum.
+        """
+        live = self.devices.get(key)
+        if live is None or live.fs != packet.fs:
+            live = self.devices[key] = LiveSpectrum(packet.fs, self.seconds, self.nperseg)
+            self._resamplers[key] = StreamingResampler(packet.fs, mode="sinc", gaps="split")
+            self._next[key] = None
+        t = (packet.t0_us + np.arange(len(packet.samples)) * sample_period_us(packet)) / 1e6
+        for t0, values in self._resamplers[key].update(t, packet.samples):
+            start = round(t0 * packet.fs)
+            live.update(values.astype(np.float32), contiguous=start == self._next[key])
+            self._next[key] = start + len(values)
+
+    async def handle(self, reader, writer):
+        """
+        asyncio.start_unix_server callback: answers commands until the client disconnects.
+        """
+        try:
+            while line := await reader.readline():
+                command, _, key = line.decode().strip().partition(" ")
+                if command == "devices":
+                    body = json.dumps(sorted(self.devices)).encode()
+                elif command == "snapshot" and key in self.devices:
+                    body = self.devices[key].snapshot()
+                else:
+                    body = b""
+                writer.write(LENGTH.pack(len(body)) + body)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class LiveClient:
+    """
+    Blocking client for the live socket, used by the dashboard page.
+    """
+
+    def __init__(self, path=LIVE_SOCKET, timeout=1.0):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(path)
+        self._file = self._sock.makefile("rb")
+
+    def _request(self, line):
+        self._sock.sendall(line.encode() + b"\n")
+        (length,) = LENGTH.unpack(self._file.read(LENGTH.size))
+        return self._file.read(length)
+
+    def devices(self):
+        return json.loads(self._request("devices"))
+
+    def snapshot(self, key):
+        """
+        Returns a dict with t, samples, frequencies, psd, fs and updated, or None
+        if the server does not know the device.
+        """
+        body = self._request(f"snapshot {key}")
+        if not body:
+            return None
+        with np.load(io.BytesIO(body)) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,235 @@
+"""
+Wire format shared by the Raspberry Pi Pico sender and the UDP server.
+
+Binary frame (version 3), header fields are little-endian:
+
+    offset  size  field
+    0       2     magic, b"VA"
+    2       1     version
+    3       1     flags (bit 0: payload is big-endian, i.e. MPU6050 register order)
+    4       2     device id
+    6       4     sequence number
+    10      2     nominal sample rate (Hz)
+    12      1     accelerometer range index (0..3 for +/-2, 4, 8, 16 g)
+    13      1     reserved
+    14      8     first-sample timestamp (microseconds, device clock)
+    22      2     number of samples
+    24      4     time from the first to the last sample (microseconds, device clock)
+    28      4     samples dropped by the device since it started
+    32      6*n   raw int16 (x, y, z) triplets
+
+Version 2 frames have the same layout without the dropped field (28-byte
+header), version 1 frames also without the span field (24 bytes); both are
+still accepted. The device clock is free-running; the server
+maps it to its own clock, see server/clock.py.
+
+Feature frame (version 1), sent instead of the samples by a Pico in feature
+mode, one per window, see analysis/features.py:
+
+    offset  size  field
+    0       2     magic, b"VF"
+    2       1     version
+    3       1     reserved
+    4       2     device id
+    6       4     sequence number
+    10      2     nominal sample rate (Hz)
+    12      1     accelerometer range index
+    13      1     number of axes k
+    14      8     first-sample timestamp of the window (microseconds, device clock)
+    22      2     samples in the window
+    24      4     time from the first to the last sample (microseconds, device clock)
+    28      4     samples dropped by the device since it started
+    32      2     FFT size
+    34      20*k  per axis: rms (u32), p2p (u16), crest (u32), kurtosis (u32),
+                  peak bin (u16), peak amplitude (u32), as integers, see FEATURES
+
+The server can ask a device in feature mode for raw frames by sending it
+SNAPSHOT_COMMAND followed by the number of frames.
+
+Any datagram that does not start with the magic bytes is treated as the legacy
+text format: one "ax, ay, az" line per sample, values already in g.
+"""
+
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+MAGIC = b"VA"
+VERSION = 3
+HEADER = struct.Struct("<2sBBHIHBBQHII")
+HEADER_SIZE = HEADER.size  # 32 bytes
+HEADER_V2 = struct.Struct("<2sBBHIHBBQHI")  # 28 bytes, no dropped count
+HEADER_V1 = struct.Struct("<2sBBHIHBBQH")  # 24 bytes, no span
+FLAG_BIG_ENDIAN = 0x01
+FEATURE_MAGIC = b"VF"
+FEATURE_VERSION = 1
+FEATURE_HEADER = struct.Struct("<2sBBHIHBBQHIIH")  # 34 bytes
+FEATURE_AXIS = struct.Struct("<IHIIHI")  # 20 bytes
+FEATURE_COUNT = 6  # Values per axis, analysis.features.FEATURES
+SNAPSHOT_COMMAND = b"SNAPSHOT"
+
+ACCEL_SCALE = (16384, 8192, 4096, 2048)  # LSB per g for accel_range 0..3
+
+Packet = namedtuple(
+    "Packet",
+    ["version", "device_id", "seq", "fs", "accel_range", "t0_us", "span_us", "dropped", "raw", "samples"],
+)
+Packet.__doc__ = """
+Decoded datagram.
+    t0_us, span_us: time of the first sample and from the first to the last sample.
+        Device clock as decoded; the server replaces them with its own clock.
+    dropped: samples the device failed to acquire since it started (a running count).
+    raw: (n, 3) int16 array of register counts, or None for legacy text packets.
+    samples: (n, 3) float32 array of acceleration in g.
+Header fields are None for legacy text packets, dropped also for version 2
+frames and span_us for version 1 frames.
+"""
+
+
+FeatureFrame = namedtuple(
+    "FeatureFrame",
+    ["version", "device_id", "seq", "fs", "accel_range", "t0_us", "span_us", "dropped", "n", "fft_size", "values"],
+)
+FeatureFrame.__doc__ = """
+Decoded feature frame of one window of n samples.
+    values: (k, 6) int64 array of the integer features of each axis, see
+        analysis.features.FEATURES and to_physical.
+"""
+
+
+class ProtocolError(ValueError):
+    """
+    Raised when a datagram cannot be decoded
+    """
+
+    pass
+
+
+def encode(raw, device_id=0, seq=0, fs=200, accel_range=1, t0_us=0, span_us=None, dropped=0, big_endian=False):
+    """
+    Builds a binary frame from an (n, 3) int16 array. Used by tools and
+    simulators on the host; the Pico packs its frames in place.
+    span_us defaults to the nominal duration, (n - 1) / fs.
+    """
+    raw = np.asarray(raw, dtype=">i2" if big_endian else "<i2").reshape(-1, 3)
+    flags = FLAG_BIG_ENDIAN if big_endian else 0
+    if span_us is None:
+        span_us = round(max(len(raw) - 1, 0) * 1e6 / fs)
+    header = HEADER.pack(
+        MAGIC, VERSION, flags, device_id, seq, fs, accel_range, 0, t0_us, len(raw), span_us, dropped
+    )
+    return header + raw.tobytes()
+
+
+def decode(data):
+    """
+    Decodes one datagram, binary or legacy text.
+    Args:
+        data: bytes-like datagram as received from the socket.
+    Returns:
+        A Packet, or a FeatureFrame.
+    Raises:
+        ProtocolError if the datagram is truncated or of an unknown version.
+    """
+    if data[:2] == MAGIC:
+        return _decode_binary(data)
+    if data[:2] == FEATURE_MAGIC:
+        return _decode_features(data)
+    return _decode_text(data)
+
+
+def _decode_binary(data):
+    if len(data) < HEADER_V1.size:
+        raise ProtocolError(f"Truncated header: {len(data)} bytes")
+    version = data[2]
+    if version == VERSION:
+        if len(data) < HEADER_SIZE:
+            raise ProtocolError(f"Truncated header: {len(data)} bytes")
+        _, _, flags, device_id, seq, fs, accel_range, _, t0_us, n, span_us, dropped = HEADER.unpack_from(data)
+        offset = HEADER_SIZE
+    elif version == 2:
+        if len(data) < HEADER_V2.size:
+            raise ProtocolError(f"Truncated header: {len(data)} bytes")
+        _, _, flags, device_id, seq, fs, accel_range, _, t0_us, n, span_us = HEADER_V2.unpack_from(data)
+        dropped = None
+        offset = HEADER_V2.size
+    elif version == 1:
+        _, _, flags, device_id, seq, fs, accel_range, _, t0_us, n = HEADER_V1.unpack_from(data)
+        span_us = dropped = None
+        offset = HEADER_V1.size
+    else:
+        raise ProtocolError(f"Unsupported frame version {version}")
+    if accel_range >= len(ACCEL_SCALE):
+        raise ProtocolError(f"Invalid accelerometer range {accel_range}")
+    if len(data) < offset + 6 * n:
+        raise ProtocolError(f"Truncated payload: expected {n} samples")
+
+    dtype = ">i2" if flags & FLAG_BIG_ENDIAN else "<i2"
+    raw = np.frombuffer(data, dtype=dtype, count=3 * n, offset=offset).reshape(n, 3)
+    samples = raw.astype(np.float32) / ACCEL_SCALE[accel_range]
+    return Packet(version, device_id, seq, fs, accel_range, t0_us, span_us, dropped, raw, samples)
+
+
+def _decode_features(data):
+    if len(data) < FEATURE_HEADER.size:
+        raise ProtocolError(f"Truncated header: {len(data)} bytes")
+    _, version, _, device_id, seq, fs, accel_range, axes, t0_us, n, span_us, dropped, fft_size = (
+        FEATURE_HEADER.unpack_from(data)
+    )
+    if version != FEATURE_VERSION:
+        raise ProtocolError(f"Unsupported feature frame version {version}")
+    if accel_range >= len(ACCEL_SCALE):
+        raise ProtocolError(f"Invalid accelerometer range {accel_range}")
+    if len(data) < FEATURE_HEADER.size + FEATURE_AXIS.size * axes:
+        raise ProtocolError(f"Truncated features: expected {axes} axes")
+    values = np.array(
+        [FEATURE_AXIS.unpack_from(data, FEATURE_HEADER.size + FEATURE_AXIS.size * i) for i in range(axes)],
+        dtype=np.int64,
+    ).reshape(axes, FEATURE_COUNT)
+    return FeatureFrame(version, device_id, seq, fs, accel_range, t0_us, span_us, dropped, n, fft_size, values)
+
+
+def encode_features(values, device_id=0, seq=0, fs=200, accel_range=1, t0_us=0, n=1024, span_us=None,
+                    dropped=0, fft_size=256):
+    """
+    Builds a feature frame from a (k, 6) integer array, like encode.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if span_us is None:
+        span_us = round(max(n - 1, 0) * 1e6 / fs)
+    header = FEATURE_HEADER.pack(
+        FEATURE_MAGIC, FEATURE_VERSION, 0, device_id, seq, fs, accel_range, len(values), t0_us, n, span_us,
+        dropped, fft_size,
+    )
+    return header + b"".join(FEATURE_AXIS.pack(*map(int, row)) for row in values)
+
+
+def _decode_text(data):
+    rows = []
+    for line in bytes(data).decode().strip().split("\n"):
+        measurement = line.split(",")
+        try:
+            rows.append((float(measurement[0]), float(measurement[1]), float(measurement[2])))
+        except (IndexError, ValueError) as e:
+            print(f"Error processing line '{line}': {e}")
+    samples = np.array(rows, dtype=np.float32).reshape(-1, 3)
+    return Packet(0, None, None, None, None, None, None, None, None, samples)
+
+
+def sample_count(packet):
+    """
+    Number of samples of a Packet, or of the window of a FeatureFrame.
+    """
+    return packet.n if isinstance(packet, FeatureFrame) else len(packet.samples)
+
+
+def sample_period_us(packet):
+    """
+    Time between consecutive samples of a packet (microseconds): measured from
+    its span when available, nominal otherwise.
+    """
+    n = sample_count(packet)
+    if packet.span_us is not None and n > 1:
+        return packet.span_us / (n - 1)
+    return 1e6 / packet.fs
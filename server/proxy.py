@@ -0,0 +1,148 @@
+"""
+Lossy UDP proxy for testing sequence tracking and retransmission on localhost.
+Forwards the datagrams of every sender to the server, dropping, duplicating
+and delaying (hence reordering) a random share of them, and forwards the
+server's replies (NACKs, snapshot requests) back to the sender.
+
+    python -m server.server
+    python -m server.proxy --port 1995 --loss 0.05 --reorder 0.1
+    python -m server.simulator --port 1995 --devices 5 --retransmit 8
+"""
+
+import argparse
+import asyncio
+import random
+import socket
+
+STATS_INTERVAL = 10  # Seconds between statistics reports
+
+
+class LossyProxy(asyncio.DatagramProtocol):
+    """
+    Forwards datagrams to target from one socket per sender, so that replies
+    can be routed back.
+    Args:
+        target: (host, port) of the server.
+        loss: probability of dropping a datagram to the server.
+        duplicate: probability of sending it twice.
+        reorder: probability of delaying it by delay seconds.
+        reply_loss: probability of dropping a reply.
+        seed: random seed, for repeatable runs.
+    """
+
+    def __init__(self, target, loss=0.0, duplicate=0.0, reorder=0.0, delay=0.25, reply_loss=0.0, seed=None):
+        self.target = target
+        self.loss = loss
+        self.duplicate = duplicate
+        self.reorder = reorder
+        self.delay = delay
+        self.reply_loss = reply_loss
+        self.forwarded = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self.delayed = 0
+        self.replies = 0
+        self._random = random.Random(seed)
+        self._upstream = {}  # Sender address -> socket connected to the server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        sock = self._upstream.get(address)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.connect(self.target)
+            asyncio.get_running_loop().add_reader(sock, self._reply, sock, address)
+            self._upstream[address] = sock
+        if self._random.random() < self.loss:
+            self.dropped += 1
+            return
+        copies = 1
+        if self._random.random() < self.duplicate:
+            self.duplicated += 1
+            copies = 2
+        for _ in range(copies):
+            if self._random.random() < self.reorder:
+                self.delayed += 1
+                asyncio.get_running_loop().call_later(self.delay, self._send, sock, data)
+            else:
+                self._send(sock, data)
+
+    def _send(self, sock, data):
+        try:
+            sock.send(data)
+            self.forwarded += 1
+        except OSError as error:  # e.g. connection refused: the server is not running
+            print(f"Error forwarding packet: {error}")
+
+    def _reply(self, sock, address):
+        try:
+            data = sock.recv(65536)
+        except OSError:
+            return
+        if self._random.random() < self.reply_loss:
+            return
+        self.replies += 1
+        self.transport.sendto(data, address)
+
+    def report(self):
+        print(
+            f"{len(self._upstream)} senders: {self.forwarded} forwarded, {self.dropped} dropped, "
+            f"{self.duplicated} duplicated, {self.delayed} delayed, {self.replies} replies"
+        )
+
+    def close(self):
+        loop = asyncio.get_running_loop()
+        for sock in self._upstream.values():
+            loop.remove_reader(sock)
+            sock.close()
+
+
+async def serve(host, port, target, **kwargs):
+    """
+    Runs the proxy until cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    transport, proxy = await loop.create_datagram_endpoint(
+        lambda: LossyProxy(target, **kwargs), local_addr=(host, port)
+    )
+    print(f"Proxy on {host} port {port} to {target[0]} port {target[1]}")
+    try:
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            proxy.report()
+    finally:
+        proxy.close()
+        transport.close()
+        proxy.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1995)
+    parser.add_argument("--target-host", default="127.0.0.1")
+    parser.add_argument("--target-port", type=int, default=1994)
+    parser.add_argument("--loss", type=float, default=0.05, help="share of datagrams dropped")
+    parser.add_argument("--duplicate", type=float, default=0.01, help="share of datagrams sent twice")
+    parser.add_argument("--reorder", type=float, default=0.05, help="share of datagrams delayed")
+    parser.add_argument("--delay", type=float, default=0.25, help="delay of those datagrams (s), reorders them "
+                        "when longer than the time between packets")
+    parser.add_argument("--reply-loss", type=float, default=0.0, help="share of replies dropped")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(
+            args.host, args.port, (args.target_host, args.target_port), loss=args.loss,
+            duplicate=args.duplicate, reorder=args.reorder, delay=args.delay, reply_loss=args.reply_loss,
+            seed=args.seed,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
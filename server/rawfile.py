@@ -0,0 +1,272 @@
+"""
+Memory-mapped raw recording format for long acquisitions.
+
+A .raw file is a 64-byte header followed by little-endian int16 (x, y, z)
+triplets, sampled contiguously at fs:
+
+    offset  size  field
+    0       6     magic, b"VARAW1"
+    6       1     accelerometer range index of the counts (0..3)
+    7       1     reserved
+    8       8     sample rate (Hz, float64)
+    16      8     first-sample timestamp (microseconds)
+    24      8     capacity (samples allocated)
+    32      8     count (samples written)
+    40      12    gain per axis (float32, g per count, calibration included)
+    52      12    offset per axis (float32, g)
+
+Values in g are raw * gain + offset. The file is preallocated in steps of
+GROW_SAMPLES and written through a memory map; count is updated after the
+samples so a concurrent reader never sees unwritten data. Readers map the file
+with np.memmap and slice any window without parsing or copying.
+
+Measured sample times are kept in a <path>.times file of little-endian int64
+(sample index, microseconds) pairs, for the first and last sample of every
+packet; times in between are interpolated. Without it samples are assumed to
+be contiguous at fs from the start timestamp.
+
+    python -m server.rawfile convert server/acceleration_data.csv recording.raw --fs 200
+"""
+
+import argparse
+import mmap
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from .protocol import sample_period_us
+
+MAGIC = b"VARAW1"
+HEADER = struct.Struct("<6sBxdqQQ3f3f")
+HEADER_SIZE = HEADER.size  # 64 bytes
+CAPACITY_OFFSET = 24
+COUNT_OFFSET = 32
+GROW_SAMPLES = 200 * 3600  # One hour at 200 Hz per allocation step, 4.3 MB
+
+AXES = ("ax", "ay", "az")
+TIMES_SUFFIX = ".times"
+
+
+def read_header(file):
+    file.seek(0)
+    magic, accel_range, fs, start_us, capacity, count, *calibration = HEADER.unpack(
+        file.read(HEADER.size)
+    )
+    if magic != MAGIC:
+        raise ValueError(f"Not a raw recording: {file.name}")
+    return accel_range, fs, start_us, capacity, count, tuple(calibration[:3]), tuple(calibration[3:])
+
+
+class RawWriter:
+    """
+    Appends int16 samples from one device to a memory-mapped .raw file.
+    An existing file is appended to if its sample rate matches; its range and
+    calibration take precedence over the arguments.
+    Args:
+        path: .raw file.
+        fs: sample rate (Hz).
+        start_us: timestamp of the first sample, used for a new file.
+        accel_range: range of the raw counts that will be written (0..3).
+        gain, offset: per-axis calibration applied after scaling counts to g.
+        grow_samples: preallocation step, see GROW_SAMPLES.
+    """
+
+    def __init__(self, path, fs, start_us=0, accel_range=1, gain=(1, 1, 1), offset=(0, 0, 0),
+                 grow_samples=GROW_SAMPLES):
+        self.path = path
+        self.grow_samples = grow_samples
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE:
+            self._file = open(path, mode="r+b")
+            (self.accel_range, self.fs, self.start_us, self.capacity, self.count,
+             self.gain, self.offset) = read_header(self._file)
+            if self.fs != fs:
+                raise ValueError(f"{path} was recorded at {self.fs} Hz, not {fs} Hz")
+        else:
+            self._file = open(path, mode="w+b")
+            self.accel_range, self.fs, self.start_us = accel_range, float(fs), int(start_us)
+            self.capacity, self.count = 0, 0
+            # Stored as float32 in the header, so keep the rounded values to quantise consistently
+            lsb = (16384, 8192, 4096, 2048)[accel_range]
+            self.gain = tuple(np.float32(g / lsb).item() for g in gain)
+            self.offset = tuple(np.float32(o).item() for o in offset)
+            header = HEADER.pack(
+                MAGIC, accel_range, self.fs, self.start_us, 0, 0, *self.gain, *self.offset
+            )
+            self._file.write(header)
+            self._file.flush()
+        self._times = open(path + TIMES_SUFFIX, mode="ab")
+        self._map()
+
+    def _map(self):
+        self._file.truncate(HEADER_SIZE + 6 * self.capacity)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._data = np.ndarray((self.capacity, 3), dtype="<i2", buffer=self._mmap, offset=HEADER_SIZE)
+
+    def _grow(self, needed):
+        self._data = None
+        self._mmap.close()
+        while self.capacity < needed:
+            self.capacity += self.grow_samples
+        self._map()
+        struct.pack_into("<Q", self._mmap, CAPACITY_OFFSET, self.capacity)
+
+    def write_packet(self, packet):
+        """
+        Appends a decoded Packet. Raw counts are copied as they are when the
+        range matches the file, otherwise the calibrated samples are quantised.
+        """
+        first, n = self.count, len(packet.samples)
+        if packet.raw is not None and packet.accel_range == self.accel_range:
+            self.write(packet.raw)
+        else:
+            counts = (packet.samples - np.array(self.offset)) / np.array(self.gain)
+            self.write(np.clip(np.round(counts), -32768, 32767).astype(np.int16))
+        if n:
+            last_us = packet.t0_us + (n - 1) * sample_period_us(packet)
+            anchors = np.array([[first, packet.t0_us], [first + n - 1, round(last_us)]], dtype="<i8")
+            self._times.write(anchors.tobytes())
+
+    def write(self, raw):
+        """
+        Appends an (n, 3) int16 block.
+        """
+        end = self.count + len(raw)
+        if end > self.capacity:
+            self._grow(end)
+        self._data[self.count:end] = raw
+        self.count = end
+        struct.pack_into("<Q", self._mmap, COUNT_OFFSET, self.count)  # Publish after the data
+
+    def flush_if_due(self):
+        self.flush()
+
+    def flush(self):
+        self._mmap.flush()
+        self._times.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._data = None
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.close()
+        self._times.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RawRecording:
+    """
+    Zero-copy read access to a .raw file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, mode="rb") as file:
+            self.accel_range, self.fs, self.start_us, _, count, gain, offset = read_header(file)
+        self.gain = np.array(gain, dtype=np.float32)
+        self.offset = np.array(offset, dtype=np.float32)
+        # Samples written after opening are not visible; reopen to see them
+        self.raw = np.memmap(path, dtype="<i2", mode="r", offset=HEADER_SIZE, shape=(count, 3))
+        self.anchors = None  # (sample index, microseconds) pairs, see TIMES_SUFFIX
+        if os.path.exists(path + TIMES_SUFFIX):
+            anchors = np.fromfile(path + TIMES_SUFFIX, dtype="<i8").reshape(-1, 2)
+            anchors = anchors[anchors[:, 0] < count]
+            if len(anchors):
+                self.anchors = anchors
+
+    def __len__(self):
+        return len(self.raw)
+
+    @property
+    def duration(self):
+        if self.anchors is not None:
+            return (self.anchors[-1, 1] - self.start_us) / 1e6 + 1 / self.fs
+        return len(self.raw) / self.fs
+
+    def _index(self, seconds):
+        """
+        Index of the first sample taken at or after seconds from the start.
+        """
+        if self.anchors is None:
+            return min(len(self.raw), max(0, int(np.ceil(seconds * self.fs))))
+        t_us = self.start_us + seconds * 1e6
+        if t_us > self.anchors[-1, 1]:
+            return len(self.raw)
+        return int(np.ceil(np.interp(t_us, self.anchors[:, 1], self.anchors[:, 0])))
+
+    def times(self, first, last):
+        """
+        Times (s from the start of the recording) of samples first to last - 1.
+        """
+        index = np.arange(first, last)
+        if self.anchors is None:
+            return index / self.fs
+        return (np.interp(index, self.anchors[:, 0], self.anchors[:, 1].astype(np.float64)) - self.start_us) / 1e6
+
+    def window(self, start=None, end=None):
+        """
+        Returns the raw int16 counts between start and end seconds as a view of
+        the file; nothing is read until the values are used.
+        """
+        first = 0 if start is None else self._index(start)
+        last = len(self.raw) if end is None else max(first, self._index(end))
+        return self.raw[first:last]
+
+    def read(self, start=None, end=None, axes=AXES):
+        """
+        Loads a time window in g.
+        Returns:
+            A tuple (t, data): t as float64 seconds from the start of the recording
+            and data as an (n, len(axes)) float32 array in g.
+        """
+        columns = [AXES.index(axis) for axis in axes]
+        first = 0 if start is None else self._index(start)
+        raw = self.window(start, end)[:, columns]
+        t = self.times(first, first + len(raw))
+        return t, raw * self.gain[columns] + self.offset[columns]
+
+    def read_frame(self, start=None, end=None, axes=AXES):
+        """
+        Same as read, as a DataFrame with a "t" column followed by the axes.
+        """
+        t, data = self.read(start, end, axes)
+        frame = pd.DataFrame(data, columns=list(axes))
+        frame.insert(0, "t", t)
+        return frame
+
+
+def convert_csv(csv_path, path, fs=200, accel_range=1):
+    """
+    Converts a CSV file written by the server into a .raw file, quantised at accel_range.
+    """
+    values = pd.read_csv(csv_path)[list(AXES)].to_numpy()
+    lsb = (16384, 8192, 4096, 2048)[accel_range]
+    with RawWriter(path, fs, accel_range=accel_range, grow_samples=len(values)) as writer:
+        writer.write(np.clip(np.round(values * lsb), -32768, 32767).astype(np.int16))
+    return RawRecording(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw recording tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="convert a CSV file to a .raw file")
+    convert.add_argument("csv")
+    convert.add_argument("path")
+    convert.add_argument("--fs", type=float, default=200)
+    convert.add_argument("--range", type=int, default=1, dest="accel_range")
+    args = parser.parse_args()
+
+    recording = convert_csv(args.csv, args.path, args.fs, args.accel_range)
+    print(f"{len(recording)} samples written to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
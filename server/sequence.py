@@ -0,0 +1,175 @@
+"""
+Sequence order and loss accounting for the packets of one device.
+
+Every binary frame carries a 32-bit sequence number. UDP may lose, duplicate
+or reorder datagrams, and a packet written in arrival order would splice the
+time series wherever one is missing or late. ReorderBuffer holds the packets
+that arrive ahead of a missing one, for at most REORDER_WINDOW packets or
+REORDER_TIMEOUT seconds, and releases them in sequence order. A missing
+packet that has not arrived by then is counted as lost and left as a gap,
+which the timing of the next packet shows (see server/clock.py).
+
+While a packet is missing the server can ask the device to resend it ("NACK"
+followed by the sequence numbers); a Pico keeps its last packets for this in
+a small ring, see raspberry_pi_pico/lib/retransmit.py.
+"""
+
+from collections import deque
+
+REORDER_WINDOW = 16  # Packets held while waiting for a missing one
+REORDER_TIMEOUT = 0.5  # Seconds a missing packet is waited for
+SEQ_MODULUS = 1 << 32  # Sequence numbers wrap at 32 bits
+NACK_COMMAND = b"NACK"
+
+
+class ReorderBuffer:
+    """
+    Puts the packets of one device back in sequence order.
+    Args:
+        window: packets held at most; beyond it the oldest gap is given up.
+        timeout: seconds a gap is waited for, see expire().
+    Statistics, in packets:
+        received: packets with a sequence number.
+        lost: sequence numbers given up, never released.
+        duplicates: packets received twice (only the first is released).
+        reordered: packets that arrived after a later one but in time.
+        recovered: of those, the ones that had been NACKed.
+        late: packets that arrived after their gap was given up, discarded.
+        restarts: the sequence numbers restarted, i.e. the device did, or jumped
+            further ahead than a gap is waited for (4 windows).
+    """
+
+    def __init__(self, window=REORDER_WINDOW, timeout=REORDER_TIMEOUT):
+        self.window = window
+        self.timeout_us = int(timeout * 1e6)
+        self.received = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.recovered = 0
+        self.late = 0
+        self.restarts = 0
+        self._next = None  # Sequence number of the next packet to release
+        self._highest = None  # Highest sequence number received
+        self._pending = {}  # Held packets: sequence number -> (packet, arrival_us)
+        self._nacked = set()  # Missing sequence numbers already requested
+        self._history = deque(maxlen=4 * window)  # Sequence numbers and t0_us of the last released packets
+        self._released = {}
+
+    def _ahead(self, seq, base):
+        """
+        Distance from base to seq modulo 2^32, negative when seq is behind.
+        """
+        distance = (seq - base) % SEQ_MODULUS
+        return distance - SEQ_MODULUS if distance >= SEQ_MODULUS // 2 else distance
+
+    def push(self, packet, arrival_us):
+        """
+        Adds a decoded packet.
+        Returns:
+            The list of (packet, arrival_us) now ready, in sequence order. Packets
+            without a sequence number (legacy text) are passed through.
+        """
+        seq = packet.seq
+        if seq is None:
+            return [(packet, arrival_us)]
+        self.received += 1
+        ready = []
+        if self._next is None:
+            self._next = self._highest = seq
+        behind = -self._ahead(seq, self._next)
+        if behind > 0:
+            if self._released.get(seq, False) == packet.t0_us:
+                self.duplicates += 1
+                return ready
+            if behind <= self._history.maxlen and seq not in self._released:
+                self.late += 1
+                return ready
+            ready = self._restart(seq)  # The device restarted from a lower sequence number
+        elif behind < -self._history.maxlen:  # Too far ahead to be a gap worth waiting for
+            ready = self._restart(seq)
+        if seq in self._pending:
+            self.duplicates += 1
+            return ready
+        if self._ahead(seq, self._highest) > 0:
+            self._highest = seq
+        elif seq != self._highest:
+            self.reordered += 1
+            if seq in self._nacked:
+                self.recovered += 1
+        self._pending[seq] = (packet, arrival_us)
+        ready += self._release()
+        while len(self._pending) > self.window:
+            ready += self._skip()
+        return ready
+
+    def _restart(self, seq):
+        """
+        Releases the held packets and starts again from seq.
+        """
+        ready = self.flush()
+        self.restarts += 1
+        self._history.clear()
+        self._released.clear()
+        self._nacked.clear()
+        self._next = self._highest = seq
+        return ready
+
+    def expire(self, now_us):
+        """
+        Gives up the gaps that have been waited for longer than the timeout.
+        Returns:
+            The list of (packet, arrival_us) now ready, in sequence order.
+        """
+        ready = []
+        while self._pending and now_us - min(arrival for _, arrival in self._pending.values()) > self.timeout_us:
+            ready += self._skip()
+        return ready
+
+    def missing(self):
+        """
+        Sequence numbers missing before the newest held packet that have not been
+        requested yet, among the next window ones; they are marked as requested.
+        """
+        if not self._pending:
+            return []
+        seqs = []
+        for i in range(min(self._ahead(self._highest, self._next), self.window)):
+            seq = (self._next + i) % SEQ_MODULUS
+            if seq not in self._pending and seq not in self._nacked:
+                seqs.append(seq)
+        self._nacked.update(seqs)
+        return seqs
+
+    def flush(self):
+        """
+        Releases every held packet, giving up the gaps between them.
+        """
+        ready = []
+        while self._pending:
+            ready += self._skip()
+        return ready
+
+    def _skip(self):
+        """
+        Gives up the packets missing before the oldest held one.
+        """
+        oldest = min(self._pending, key=lambda seq: self._ahead(seq, self._next))
+        skipped = self._ahead(oldest, self._next)
+        self.lost += skipped
+        self._nacked = {seq for seq in self._nacked if self._ahead(seq, oldest) > 0}
+        self._next = oldest
+        return self._release()
+
+    def _release(self):
+        ready = []
+        while self._next in self._pending:
+            packet, arrival_us = self._pending.pop(self._next)
+            ready.append((packet, arrival_us))
+            if len(self._history) == self._history.maxlen:
+                del self._released[self._history[0]]
+            self._history.append(self._next)
+            self._released[self._next] = packet.t0_us
+            self._nacked.discard(self._next)
+            self._next = (self._next + 1) % SEQ_MODULUS
+        return ready
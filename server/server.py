@@ -1,42 +1,501 @@
+import asyncio
+import functools
+import math
+import os
 import socket
-import csv
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis.velocity import BANDS, ZONE_LIMITS, StreamingBandRMS, severity
+
+from .anomaly import AnomalyDetector
+from .clock import DeviceTiming
+from .live import LIVE_SOCKET, LiveRegistry
+from .protocol import SNAPSHOT_COMMAND, FeatureFrame, ProtocolError, decode, sample_count
+from .rawfile import RawWriter
+from .sequence import NACK_COMMAND, REORDER_TIMEOUT, REORDER_WINDOW, ReorderBuffer
+from .storage import ChunkWriter
+from .summary import SummaryWriter
+from .writer import FLUSH_INTERVAL, CsvWriter, FeatureCsvWriter
 
 UDP_IP = "0.0.0.0"  # Listen on all available interfaces
 UDP_PORT = 1994  # Port to listen on
-UDP_SERVER = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # Create UDP socket
-UDP_SERVER.bind((UDP_IP, UDP_PORT))  # Bind socket to address
-print(f"UDP server started on {UDP_IP} port {UDP_PORT}")
+RECEIVE_BUFFER = 4 * 1024 * 1024  # Kernel socket buffer, absorbs bursts while the loop is busy
 
-CSV_FILE = "acceleration_data.csv"  # CSV file to store data
-with open(CSV_FILE, mode="w", newline="") as file:  # Open CSV file in write mode
-    writer = csv.writer(file)  # Create CSV writer object
-    writer.writerow(["ax", "ay", "az"])  # Write header row
-print(f"CSV file created: {CSV_FILE}")
+DATA_DIR = os.path.dirname(__file__)  # One recording per device is written here
+# "chunks" for chunked recordings under DATA_DIR/recordings, "raw" for one memory-mapped
+# .raw file per device under DATA_DIR/recordings, "csv" for one CSV file per device
+STORAGE = "chunks"
+CHUNK_DTYPE = "float32"  # "float32" stores calibrated g, "int16" stores raw counts and calibration
+LEGACY_FS = 200  # Sample rate assumed for legacy text packets, which carry no header
+QUEUE_SIZE = 64  # Packets buffered per device before the drop policy applies
+DROP_POLICY = "oldest"  # On a full queue drop the "oldest" queued packet or the "newest" arrival
+WRITER_THREADS = 4  # Blocking file I/O runs here so the event loop keeps receiving
+STATS_INTERVAL = 10  # Seconds between statistics reports
+SUMMARY = True  # Also write the min/max/mean/RMS summary of each device to DATA_DIR/recordings/<device>.summary
+LIVE = True  # Keep recent data and spectra per device for the live dashboard, served on LIVE_SOCKET
+# Devices in feature mode send one feature frame per window, written to DATA_DIR/recordings/<device>.features.csv,
+# and raw packets only when asked: every SNAPSHOT_INTERVAL seconds (None: never) for SNAPSHOT_PACKETS packets
+SNAPSHOT_INTERVAL = 600
+SNAPSHOT_PACKETS = 5
+# Packets are released in sequence order, waiting up to REORDER_WINDOW packets or REORDER_TIMEOUT
+# seconds for a missing one, which is requested again from the device with NACK = True
+NACK = True
+# Learn a baseline of the band energies of each device's raw data and report the windows that depart from it,
+# checking the windows completed by all devices every ANOMALY_INTERVAL seconds
+ANOMALY = True
+ANOMALY_INTERVAL = 0.25
+# Measure the ISO 10816 velocity RMS of each device's raw data over windows of 1 s, and report its zone for
+# machines of VELOCITY_CLASS (see analysis/velocity.py) when it holds for VELOCITY_HOLD consecutive windows
+VELOCITY = True
+VELOCITY_CLASS = "II"
+VELOCITY_HOLD = 5
 
-while True:
-    try:
-        data, address = UDP_SERVER.recvfrom(65535)  # Receive data from UDP socket
-        message = data.decode().strip()  # Decode data and remove whitespace
-        print(f"Received packet from {address}")
+# Z-axis calibration, applied on the Pico before the binary frame format was introduced.
+# Legacy text packets arrive already calibrated.
+Z_GAIN = 1 - 0.02084873
+Z_OFFSET = -0.3439426
+
+
+def device_key(packet, address):
+    """
+    Identifies the sender of a packet: the device id of binary frames, or the
+    source IP address of legacy text packets, which carry no id.
+    """
+    if packet.device_id is not None:
+        return f"{packet.device_id:04x}"
+    return address[0]
+
+
+def _write_packets(writer, packets):
+    for packet in packets:
+        writer.write_packet(packet)
+
+
+class WriterGroup:
+    """
+    Hands every packet to several writers, e.g. a recording and its summary.
+    """
+
+    def __init__(self, writers):
+        self.writers = writers
+
+    def write_packet(self, packet):
+        for writer in self.writers:
+            writer.write_packet(packet)
+
+    def flush_if_due(self):
+        for writer in self.writers:
+            writer.flush_if_due()
 
-        # Split the message into readings, each with four measurements
-        readings = message.split("\n")
+    def close(self):
+        for writer in self.writers:
+            writer.close()
 
-        # Open the CSV file to append the readings
-        with open(CSV_FILE, mode="a", newline="") as file:
-            writer = csv.writer(file)
 
-            # For each reading, split the data and write to the CSV file
-            for i, reading in enumerate(readings):
+class DeviceChannel:
+    """
+    Bounded packet queue and persistence task for one device. Packets are
+    queued by the receiving side and written by a background task, so a slow
+    write only ever delays the device it belongs to. A writer that fails to
+    open is opened again with the next packets; the samples that could not be
+    saved are counted in failed and the last error is kept in error.
+    """
+
+    def __init__(self, key, open_writer, executor, queue_size=QUEUE_SIZE, drop_policy=DROP_POLICY):
+        if drop_policy not in ("oldest", "newest"):
+            raise ValueError("drop_policy must be 'oldest' or 'newest'")
+        self.key = key
+        self.drop_policy = drop_policy
+        self.received = 0  # Packets accepted from the socket
+        self.dropped = 0  # Packets discarded because the queue was full
+        self.saved = 0  # Samples handed to the writer
+        self.failed = 0  # Samples that could not be saved: the writer failed to open or to write them
+        self.error = None  # Last error of the writer, None once it saves again
+        self.timing = DeviceTiming(LEGACY_FS)  # Server-clock timestamps and gap statistics
+        self.sequence = ReorderBuffer(REORDER_WINDOW, REORDER_TIMEOUT)  # Sequence order and loss statistics
+        self._open_writer = open_writer
+        self._executor = executor
+        self._queue = asyncio.Queue(queue_size)
+        self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    def put(self, packet):
+        """
+        Queues a decoded packet without blocking.
+        """
+        self.received += 1
+        if self._queue.full():
+            self.dropped += 1
+            if self.drop_policy == "newest":
+                return
+            self._queue.get_nowait()
+            self._queue.task_done()
+        self._queue.put_nowait(packet)
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        writer = None  # Opened on the first packet, and again on the next ones if that failed
+        packets = [await self._queue.get()]
+        try:
+            while True:
+                while not self._queue.empty():  # Everything that queued up during the last write
+                    packets.append(self._queue.get_nowait())
+                n = sum(sample_count(packet) for packet in packets)
                 try:
-                    measurement = reading.split(",")
-                    ax = float(measurement[0])
-                    ay = float(measurement[1])
-                    az = float(measurement[2])
-                    writer.writerow([ax, ay, az])
-                except Exception as e:
-                    print(f"Error processing line '{reading}': {e}")
-            print(f"Packet with {i + 1} readings saved to {CSV_FILE}")
-
-    except Exception as error:
-        print(f"Error receiving or saving packet: {error}")
+                    if writer is None:
+                        writer = await loop.run_in_executor(self._executor, self._open_writer, packets[0])
+                    await loop.run_in_executor(self._executor, _write_packets, writer, packets)
+                    self.saved += n
+                    self.error = None
+                except Exception as error:  # The channel keeps running and counts what it could not save
+                    self.failed += n
+                    self._report_error(f"Error saving {n} readings from {self.key}", error)
+                finally:
+                    for _ in packets:
+                        self._queue.task_done()
+
+                while True:
+                    try:
+                        packets = [await asyncio.wait_for(self._queue.get(), FLUSH_INTERVAL)]
+                        break
+                    except TimeoutError:  # Idle device: write out whatever is still buffered
+                        if writer is None:
+                            continue
+                        try:
+                            await loop.run_in_executor(self._executor, writer.flush_if_due)
+                        except Exception as error:
+                            self._report_error(f"Error flushing {self.key}", error)
+        finally:
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception as error:
+                    self._report_error(f"Error closing {self.key}", error)
+
+    def _report_error(self, message, error):
+        """
+        Prints an error and keeps it in self.error; a repeated error is printed once.
+        """
+        error = f"{type(error).__name__}: {error}"
+        if error != self.error:
+            print(f"{message}: {error}")
+        self.error = error
+
+    async def close(self):
+        """
+        Waits for queued packets to be written, then stops the task and closes the file.
+        """
+        if not self._task.done():
+            await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class IngestionServer(asyncio.DatagramProtocol):
+    """
+    Receives datagrams from any number of Picos and routes them to one
+    DeviceChannel per device.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, storage=STORAGE, queue_size=QUEUE_SIZE, drop_policy=DROP_POLICY,
+                 live=LIVE, summary=SUMMARY, snapshot_interval=SNAPSHOT_INTERVAL, nack=NACK, anomaly=ANOMALY,
+                 velocity=VELOCITY):
+        if storage not in ("chunks", "raw", "csv"):
+            raise ValueError("storage must be 'chunks', 'raw' or 'csv'")
+        self.data_dir = data_dir
+        self.storage = storage
+        self.queue_size = queue_size
+        self.drop_policy = drop_policy
+        self.summary = summary
+        self.snapshot_interval = snapshot_interval
+        self.nack = nack
+        self.channels = {}
+        self.addresses = {}  # Last source address of each device, for snapshot requests
+        self.rejected = 0  # Datagrams that could not be decoded
+        self.live = LiveRegistry() if live else None
+        self.anomaly = AnomalyDetector() if anomaly else None
+        self.velocity = {} if velocity else None  # StreamingBandRMS of each device
+        self.zones = {}  # Last zone reported for each device
+        self._zone_runs = {}  # Zone of the last windows of each device and how many
+        self.transport = None
+        self._snapshots = {}  # Time of the last snapshot request per device
+        self._expiry = None  # Timer of the next reorder timeout check
+        self._detection = None  # Timer of the next anomaly check
+        self._executor = ThreadPoolExecutor(WRITER_THREADS, thread_name_prefix="writer")
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._expire()
+        if self.anomaly is not None:
+            self._detect()
+
+    def _expire(self):
+        """
+        Releases the packets held for missing ones that timed out, also for
+        devices that stopped sending. Reschedules itself.
+        """
+        now_us = time.time_ns() // 1000
+        for channel in self.channels.values():
+            for packet, arrival_us in channel.sequence.expire(now_us):
+                self.deliver(channel, packet, arrival_us)
+        self._expiry = asyncio.get_running_loop().call_later(REORDER_TIMEOUT / 2, self._expire)
+
+    def _detect(self):
+        """
+        Scores the windows completed since the last call, for all devices at
+        once, and reports alarms. Reschedules itself.
+        """
+        for alarm in self.anomaly.process():
+            self.alarm(alarm)
+        self._detection = asyncio.get_running_loop().call_later(ANOMALY_INTERVAL, self._detect)
+
+    def alarm(self, alarm):
+        """
+        Reports an anomaly alarm raised or cleared (see server/anomaly.py).
+        """
+        if not alarm.raised:
+            print(f"Anomaly on {alarm.key} cleared")
+            return
+        low, high = alarm.band
+        print(
+            f"Anomaly on {alarm.key}: score {alarm.score:.0f}, {'XYZ'[alarm.axis]} axis "
+            f"{low:g}-{high:g} Hz {alarm.deviation_db:+.1f} dB from its baseline"
+        )
+
+    def datagram_received(self, data, address):
+        try:
+            packet = decode(data)
+        except (ProtocolError, UnicodeDecodeError) as error:
+            self.rejected += 1
+            print(f"Rejected packet from {address}: {error}")
+            return
+
+        arrival_us = time.time_ns() // 1000
+        key = device_key(packet, address)
+        self.addresses[key] = address
+        if isinstance(packet, FeatureFrame):
+            if len(packet.values) != 3:  # The feature files have x, y, z columns
+                self.rejected += 1
+                print(f"Rejected packet from {address}: feature frame of {len(packet.values)} axes")
+                return
+            self.features_received(key, packet, arrival_us)
+            return
+        if packet.raw is not None:
+            packet.samples[:, 2] = packet.samples[:, 2] * Z_GAIN + Z_OFFSET
+        channel = self.channel(key)
+        for packet, arrival_us in channel.sequence.push(packet, arrival_us):
+            self.deliver(channel, packet, arrival_us)
+        if self.nack:
+            missing = channel.sequence.missing()
+            if missing:
+                self.send(key, NACK_COMMAND + b"".join(b" %d" % seq for seq in missing) + b"\n")
+
+    def deliver(self, channel, packet, arrival_us):
+        """
+        Timestamps a packet released in sequence order and queues it for writing.
+        """
+        packet = channel.timing.apply(packet, arrival_us)
+        channel.put(packet)
+        if isinstance(packet, FeatureFrame):
+            return
+        if self.live is not None:
+            self.live.update(channel.key, packet)
+        if self.anomaly is not None:
+            self.anomaly.update(channel.key, packet)
+        if self.velocity is not None:
+            self.measure_velocity(channel, packet)
+
+    def measure_velocity(self, channel, packet):
+        """
+        Updates the velocity RMS of a device and reports a change of its zone,
+        rated on the axis with the highest velocity.
+        """
+        meter = self.velocity.get(channel.key)
+        if meter is None or meter.fs != packet.fs:
+            meter = self.velocity[channel.key] = StreamingBandRMS(packet.fs)
+            self._zone_runs[channel.key] = (None, 0, channel.timing.gaps)
+        zone, run, gaps = self._zone_runs[channel.key]
+        if channel.timing.gaps != gaps:  # A window must not splice data across a gap
+            meter.reset()
+        for rms in meter.update(packet.samples)[:, 0, :]:
+            window_zone = str(severity(rms.max(), ZONE_LIMITS[VELOCITY_CLASS]))
+            zone, run = window_zone, (run + 1 if window_zone == zone else 1)
+            if run == VELOCITY_HOLD and zone != self.zones.get(channel.key):
+                self.zones[channel.key] = zone
+                print(f"{channel.key}: vibration velocity {rms.max():.2f} mm/s RMS, zone {zone}")
+        self._zone_runs[channel.key] = (zone, run, channel.timing.gaps)
+
+    def features_received(self, key, frame, arrival_us):
+        """
+        Queues a feature frame on the feature channel of its device, which has its
+        own timing as its frames and the raw snapshots overlap, and asks for a
+        snapshot when one is due.
+        """
+        channel = self.channel(f"{key}.features", functools.partial(self.open_feature_writer, key))
+        for frame, frame_arrival_us in channel.sequence.push(frame, arrival_us):
+            self.deliver(channel, frame, frame_arrival_us)
+        now = time.monotonic()
+        if self.snapshot_interval is not None and now - self._snapshots.get(key, now) >= self.snapshot_interval:
+            self.request_snapshot(key)
+        self._snapshots.setdefault(key, now)
+
+    def request_snapshot(self, key, packets=SNAPSHOT_PACKETS):
+        """
+        Asks a device in feature mode for its next raw packets, which are recorded
+        like those of a device sending raw data.
+        Returns:
+            False if the device has not been heard from yet.
+        """
+        if not self.send(key, SNAPSHOT_COMMAND + b" %d\n" % packets):
+            return False
+        self._snapshots[key] = time.monotonic()
+        return True
+
+    def send(self, key, command):
+        """
+        Sends a command datagram to a device at its last source address.
+        Returns:
+            False if the device has not been heard from yet.
+        """
+        address = self.addresses.get(key)
+        if address is None or self.transport is None:
+            return False
+        self.transport.sendto(command, address)
+        return True
+
+    def error_received(self, error):
+        print(f"Error receiving packet: {error}")
+
+    def channel(self, key, open_writer=None):
+        """
+        Returns the channel for a device, creating it on its first packet.
+        open_writer(packet) creates its writer, open_writer(key, packet) by default.
+        """
+        channel = self.channels.get(key)
+        if channel is None:
+            if open_writer is None:
+                open_writer = functools.partial(self.open_writer, key)
+            channel = DeviceChannel(key, open_writer, self._executor, self.queue_size, self.drop_policy)
+            self.channels[key] = channel
+            print(f"New device {key}")
+        return channel
+
+    def open_writer(self, key, packet):
+        """
+        Creates the writer for a device's recording, given its first packet.
+        """
+        recordings = os.path.join(self.data_dir, "recordings")
+        if self.storage == "chunks":
+            path = os.path.join(recordings, key)
+            writer = ChunkWriter(path, key, CHUNK_DTYPE, gain=(1, 1, Z_GAIN), offset=(0, 0, Z_OFFSET))
+        elif self.storage == "raw":
+            os.makedirs(recordings, exist_ok=True)
+            path = os.path.join(recordings, f"{key}.raw")
+            accel_range = 1 if packet.accel_range is None else packet.accel_range
+            writer = RawWriter(
+                path, packet.fs, packet.t0_us, accel_range, gain=(1, 1, Z_GAIN), offset=(0, 0, Z_OFFSET)
+            )
+        else:
+            os.makedirs(self.data_dir, exist_ok=True)
+            path = os.path.join(self.data_dir, f"acceleration_data_{key}.csv")
+            writer = CsvWriter(path, timestamps=True)
+        print(f"Saving {key} to {path}")
+        if self.summary:
+            summary = SummaryWriter(os.path.join(recordings, f"{key}.summary"))
+            writer = WriterGroup([writer, summary])
+        return writer
+
+    def open_feature_writer(self, key, frame):
+        """
+        Creates the writer for the feature frames of a device.
+        """
+        recordings = os.path.join(self.data_dir, "recordings")
+        os.makedirs(recordings, exist_ok=True)
+        path = os.path.join(recordings, f"{key}.features.csv")
+        print(f"Saving features of {key} to {path}")
+        return FeatureCsvWriter(path, gain=(1, 1, Z_GAIN))
+
+    def report(self):
+        for key, channel in self.channels.items():
+            print(
+                f"{key}: {channel.received} packets received, {channel.dropped} dropped, "
+                f"{channel.saved} readings saved, {channel.timing.gaps} gaps "
+                f"({channel.timing.gap_seconds:.3f} s), {channel.timing.device_dropped} samples dropped on the device, "
+                f"{channel.sequence.lost} lost, {channel.sequence.duplicates} duplicates, "
+                f"{channel.sequence.reordered} reordered ({channel.sequence.recovered} after a NACK), "
+                f"{channel.sequence.late} late"
+            )
+            if channel.failed:
+                print(f"{key}: {channel.failed} readings not saved, last error: {channel.error or 'none since'}")
+            meter = None if self.velocity is None else self.velocity.get(key)
+            if meter is not None and meter.latest is not None:
+                x, y, z = meter.latest[0]
+                print(
+                    f"{key}: velocity RMS {x:.2f}/{y:.2f}/{z:.2f} mm/s (X/Y/Z, {BANDS[0][0]:g}-{min(BANDS[0][1], meter.fs / 2):g} Hz), "
+                    f"zone {self.zones.get(key, '-')}"
+                )
+            status = None if self.anomaly is None else self.anomaly.status(key)
+            if status is not None:
+                score = "learning" if math.isnan(status["score"]) else f"score {status['score']:.1f}"
+                print(
+                    f"{key}: {status['windows']} windows checked for anomalies, {score}, "
+                    f"{status['alarms']} alarms{' (active)' if status['alarm'] else ''}"
+                )
+        if self.rejected:
+            print(f"{self.rejected} packets rejected")
+
+    async def close(self):
+        if self._expiry is not None:
+            self._expiry.cancel()
+        if self._detection is not None:
+            self._detection.cancel()
+        for channel in list(self.channels.values()):  # Packets still held for missing ones
+            for packet, arrival_us in channel.sequence.flush():
+                self.deliver(channel, packet, arrival_us)
+        if self.anomaly is not None:
+            for alarm in self.anomaly.process():
+                self.alarm(alarm)
+        await asyncio.gather(*(channel.close() for channel in self.channels.values()))
+        self._executor.shutdown()
+
+
+async def serve(host=UDP_IP, port=UDP_PORT, live_socket=LIVE_SOCKET, **kwargs):
+    """
+    Runs the ingestion server until cancelled.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # Create UDP socket
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+    sock.bind((host, port))  # Bind socket to address
+
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(
+        lambda: IngestionServer(**kwargs), sock=sock
+    )
+    print(f"UDP server started on {host} port {port}")
+
+    live_server = None
+    if server.live is not None:
+        if os.path.exists(live_socket):  # Left behind by a previous run
+            os.remove(live_socket)
+        live_server = await asyncio.start_unix_server(server.live.handle, live_socket)
+        print(f"Live data served on {live_socket}")
+    try:
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            server.report()
+    finally:
+        transport.close()
+        if live_server is not None:
+            live_server.close()
+        await server.close()
+        server.report()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
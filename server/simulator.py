@@ -0,0 +1,112 @@
+"""
+Sends synthetic binary frames from any number of fake Picos, for load testing
+the ingestion server without hardware.
+
+    python -m server.simulator --devices 50 --rate 200 --seconds 30
+
+With --retransmit N every device keeps its last N frames and resends those the
+server NACKs, like raspberry_pi_pico/lib/retransmit.py; with server/proxy.py in
+between, loss recovery can be tested on localhost.
+"""
+
+import argparse
+import asyncio
+import socket
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .protocol import encode
+from .sequence import NACK_COMMAND, REORDER_TIMEOUT
+
+SAMPLES_PER_PACKET = 200  # Same packet size as raspberry_pi_pico/main.py
+
+
+def synthetic_raw(n, fs, t0, rng, accel_range=1):
+    """
+    Returns (n, 3) int16 counts: a 1 g gravity component on z plus a 60 Hz
+    vibration and noise on every axis.
+    """
+    lsb = (16384, 8192, 4096, 2048)[accel_range]
+    t = t0 + np.arange(n) / fs
+    g = 0.05 * np.sin(2 * np.pi * 60 * t)[:, None] + 0.01 * rng.standard_normal((n, 3))
+    g[:, 2] += 1.0
+    return np.round(g * lsb).astype(np.int16)
+
+
+def resend(sock, address, ring):
+    """
+    Answers the NACKs received on a device's socket from its ring of sent frames.
+    Returns the number of frames resent.
+    """
+    resent = 0
+    while True:
+        try:
+            command = sock.recv(65536)
+        except BlockingIOError:
+            return resent
+        words = command.split()
+        if words and words[0] == NACK_COMMAND:
+            for seq in map(int, words[1:]):
+                if seq in ring:
+                    sock.sendto(ring[seq], address)
+                    resent += 1
+
+
+async def run(host, port, devices, fs, seconds, samples_per_packet=SAMPLES_PER_PACKET, drift_ppm=0.0,
+              retransmit=0):
+    """
+    Each fake device timestamps its frames with its own clock, which starts at a
+    random time and runs fast or slow by up to drift_ppm. With retransmit, each
+    device sends from its own socket and keeps that many frames for NACKs.
+    """
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(devices if retransmit else 1)]
+    for sock in sockets:
+        sock.setblocking(False)
+    rings = [OrderedDict() for _ in range(devices)]
+    resent = 0
+    rng = np.random.default_rng()
+    period = samples_per_packet / fs
+    packets = int(seconds / period)
+    boot_us = rng.integers(0, 3600 * 10**6, devices)  # Device clock at the start of the run
+    rate = 1 + drift_ppm * 1e-6 * rng.uniform(-1, 1, devices)
+    span_us = np.round((samples_per_packet - 1) / fs * 1e6 * rate).astype(int)
+    start = time.monotonic()
+    for seq in range(packets):
+        t0 = seq * period
+        for device_id in range(devices):
+            raw = synthetic_raw(samples_per_packet, fs, t0, rng)
+            t0_us = int(boot_us[device_id] + t0 * 1e6 * rate[device_id])
+            frame = encode(raw, device_id=device_id, seq=seq, fs=fs, t0_us=t0_us, span_us=int(span_us[device_id]))
+            sockets[device_id % len(sockets)].sendto(frame, (host, port))
+            if retransmit:
+                rings[device_id][seq] = frame
+                if len(rings[device_id]) > retransmit:
+                    rings[device_id].popitem(last=False)
+                resent += resend(sockets[device_id], (host, port), rings[device_id])
+        delay = start + (seq + 1) * period - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    if retransmit:  # NACKs of the last packets
+        await asyncio.sleep(REORDER_TIMEOUT / 2)
+        resent += sum(resend(sockets[i], (host, port), rings[i]) for i in range(devices))
+    print(f"Sent {packets * devices} packets from {devices} devices, {resent} resent")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1994)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--rate", type=int, default=200, help="samples per second per device")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--drift-ppm", type=float, default=0, help="largest device clock error")
+    parser.add_argument("--retransmit", type=int, default=0, help="frames kept per device for resending")
+    args = parser.parse_args()
+    asyncio.run(run(args.host, args.port, args.devices, args.rate, args.seconds, drift_ppm=args.drift_ppm,
+                    retransmit=args.retransmit))
+
+
+if __name__ == "__main__":
+    main()
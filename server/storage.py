@@ -0,0 +1,318 @@
+"""
+Chunked columnar storage for acceleration recordings.
+
+A recording is a directory holding one uncompressed .npz file per chunk, with
+one array per axis (ax, ay, az), and an index.jsonl file with one line of
+metadata per chunk:
+
+    {"file": ..., "device": ..., "start_us": ..., "end_us": ..., "n": ..., "fs": ...,
+     "accel_range": ..., "dtype": "float32" | "int16", "gain": [...], "offset": [...]}
+
+Values in g are data * gain + offset per axis; float32 chunks hold calibrated
+values (gain 1, offset 0), int16 chunks hold raw register counts. fs is the
+nominal sample rate. The measured sample times are stored as anchor_index and
+anchor_us arrays, the time of the first and last sample of every packet;
+times in between are interpolated, and end_us is the expected time of the
+sample after the chunk. Chunks cover at most CHUNK_SECONDS, and a gap in the
+timestamps longer than GAP_TOLERANCE starts a new chunk; shorter gaps stay
+visible in the sample times. Readers only parse the index and the chunks and
+axes that overlap the requested window.
+
+    python -m server.storage convert server/acceleration_data.csv recordings/demo --fs 200
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .protocol import sample_period_us
+
+AXES = ("ax", "ay", "az")
+CHUNK_SECONDS = 60  # Maximum duration of one chunk
+GAP_TOLERANCE = 1.0  # Seconds of timestamp mismatch tolerated before a new chunk is started
+IDLE_FLUSH = 5.0  # Seconds without data after which the open chunk is written
+INDEX_FILE = "index.jsonl"
+
+
+class ChunkWriter:
+    """
+    Appends samples from one device to a chunked recording directory.
+    Args:
+        path: recording directory, created if needed. Existing chunks are kept.
+        device: device identifier stored in the chunk metadata.
+        dtype: "float32" to store calibrated g, "int16" to store raw counts.
+            Packets without raw counts (legacy text) are always stored as float32.
+        gain, offset: per-axis calibration applied to raw counts after scaling to g.
+        chunk_seconds, gap_tolerance: see CHUNK_SECONDS and GAP_TOLERANCE.
+    """
+
+    def __init__(self, path, device, dtype="float32", gain=(1, 1, 1), offset=(0, 0, 0),
+                 chunk_seconds=CHUNK_SECONDS, gap_tolerance=GAP_TOLERANCE):
+        if dtype not in ("float32", "int16"):
+            raise ValueError("dtype must be 'float32' or 'int16'")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.device = device
+        self.dtype = dtype
+        self.gain = tuple(float(g) for g in gain)
+        self.offset = tuple(float(o) for o in offset)
+        self.chunk_seconds = chunk_seconds
+        self.gap_tolerance = gap_tolerance
+        self.chunks_written = 0
+        self._last_write = time.monotonic()
+        self._index = open(os.path.join(path, INDEX_FILE), mode="a")
+        self._reset()
+
+    def _reset(self):
+        self._blocks = []
+        self._n = 0
+        self._start_us = None
+        self._next_us = None  # Expected time of the next sample
+        self._anchors = []  # (sample index, time) of the first and last sample of each block
+        self._meta = None  # (fs, accel_range, dtype) of the open chunk
+
+    def write_packet(self, packet):
+        """
+        Buffers a decoded (and calibrated) Packet.
+        """
+        period_us = sample_period_us(packet)
+        if self.dtype == "int16" and packet.raw is not None:
+            self.write(packet.raw, packet.t0_us, packet.fs, packet.accel_range, period_us)
+        else:
+            self.write(packet.samples, packet.t0_us, packet.fs, period_us=period_us)
+
+    def write(self, block, t0_us, fs, accel_range=None, period_us=None):
+        """
+        Buffers an (n, 3) block whose first sample was taken at t0_us.
+        An int16 block must come with the accel_range it was sampled at.
+        period_us is the measured time between samples, 1e6 / fs by default.
+        """
+        self._last_write = time.monotonic()
+        if period_us is None:
+            period_us = 1e6 / fs
+        meta = (fs, accel_range, "int16" if block.dtype == np.int16 else "float32")
+        if self._n and (meta != self._meta or abs(t0_us - self._next_us) > self.gap_tolerance * 1e6):
+            self.flush()
+
+        capacity = int(self.chunk_seconds * fs)
+        while len(block):
+            if not self._n:
+                self._start_us = int(round(t0_us))
+                self._meta = meta
+            take = min(len(block), capacity - self._n)
+            self._blocks.append(block[:take])
+            self._anchors += [(self._n, t0_us), (self._n + take - 1, t0_us + (take - 1) * period_us)]
+            self._n += take
+            block = block[take:]
+            t0_us += take * period_us
+            self._next_us = t0_us
+            if self._n >= capacity:
+                self.flush()
+
+    def flush_if_due(self):
+        """
+        Writes the open chunk once the device has been idle for IDLE_FLUSH seconds.
+        """
+        if self._n and time.monotonic() - self._last_write >= IDLE_FLUSH:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the open chunk, if any, and records it in the index.
+        """
+        if not self._n:
+            return
+        fs, accel_range, dtype = self._meta
+        data = np.concatenate(self._blocks).astype(dtype, copy=False)
+        if dtype == "int16":
+            lsb = (16384, 8192, 4096, 2048)[accel_range]
+            gain = [g / lsb for g in self.gain]
+            offset = list(self.offset)
+        else:
+            gain, offset = [1.0] * 3, [0.0] * 3
+
+        name = f"{self._start_us:020d}.npz"
+        temporary = os.path.join(self.path, name + ".tmp")
+        with open(temporary, mode="wb") as file:  # Renamed into place so readers never see a partial chunk
+            index, t_us = np.array(self._anchors).T
+            np.savez(
+                file,
+                anchor_index=index.astype(np.int64),
+                anchor_us=np.round(t_us).astype(np.int64),
+                **{axis: np.ascontiguousarray(data[:, i]) for i, axis in enumerate(AXES)},
+            )
+        os.replace(temporary, os.path.join(self.path, name))
+
+        meta = {
+            "file": name,
+            "device": self.device,
+            "start_us": self._start_us,
+            "end_us": int(round(self._next_us)),
+            "n": self._n,
+            "fs": fs,
+            "accel_range": accel_range,
+            "dtype": dtype,
+            "gain": gain,
+            "offset": offset,
+        }
+        self._index.write(json.dumps(meta) + "\n")
+        self._index.flush()
+        self.chunks_written += 1
+        self._reset()
+
+    def close(self):
+        if self._index.closed:
+            return
+        self.flush()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _sample_times(chunk, npz):
+    """
+    Times of the samples of a chunk (microseconds, float64), interpolated
+    between its anchors, or at the nominal rate for chunks written without them.
+    """
+    index = np.arange(chunk["n"])
+    if "anchor_index" in npz.files:
+        return np.interp(index, npz["anchor_index"], npz["anchor_us"].astype(np.float64))
+    return chunk["start_us"] + index * 1e6 / chunk["fs"]
+
+
+class Recording:
+    """
+    Read access to a chunked recording directory. Opening only parses the index.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as file:
+            chunks = [json.loads(line) for line in file if line.strip()]
+        chunks.sort(key=lambda chunk: chunk["start_us"])
+        self.chunks = chunks
+        self._start_us = np.array([c["start_us"] for c in chunks], dtype=np.int64)
+        self._n = np.array([c["n"] for c in chunks], dtype=np.int64)
+        self._fs = np.array([c["fs"] for c in chunks], dtype=np.float64)
+        nominal_end_us = self._start_us + self._n * 1e6 / self._fs
+        self._end_us = np.array([c.get("end_us", end) for c, end in zip(chunks, nominal_end_us)], dtype=np.float64)
+
+    @property
+    def start_us(self):
+        return int(self._start_us[0]) if len(self.chunks) else 0
+
+    @property
+    def duration(self):
+        """
+        Seconds from the first sample to the end of the last chunk.
+        """
+        if not len(self.chunks):
+            return 0.0
+        return (self._end_us[-1] - self._start_us[0]) / 1e6
+
+    @property
+    def fs(self):
+        return float(self._fs[0]) if len(self.chunks) else None
+
+    def __len__(self):
+        return int(self._n.sum())
+
+    def read(self, start=None, end=None, axes=AXES):
+        """
+        Loads a time window.
+        Args:
+            start, end: seconds from the start of the recording; None for the full range.
+            axes: subset of ("ax", "ay", "az") to load.
+        Returns:
+            A tuple (t, data): t as float64 seconds from the start of the recording
+            and data as an (n, len(axes)) float32 array in g.
+        """
+        columns = [AXES.index(axis) for axis in axes]
+        origin = self.start_us
+        start_us = -np.inf if start is None else origin + start * 1e6
+        end_us = np.inf if end is None else origin + end * 1e6
+
+        times, blocks = [], []
+        for i in np.flatnonzero((self._end_us > start_us) & (self._start_us < end_us)):
+            chunk = self.chunks[i]
+            with np.load(os.path.join(self.path, chunk["file"])) as npz:
+                t_us = _sample_times(chunk, npz)
+                first, last = np.searchsorted(t_us, [start_us, end_us])
+                block = np.empty((last - first, len(columns)), dtype=np.float32)
+                for j, column in enumerate(columns):
+                    values = npz[AXES[column]][first:last]
+                    block[:, j] = values * chunk["gain"][column] + chunk["offset"][column]
+            times.append((t_us[first:last] - origin) / 1e6)
+            blocks.append(block)
+
+        if not blocks:
+            return np.empty(0), np.empty((0, len(columns)), dtype=np.float32)
+        return np.concatenate(times), np.concatenate(blocks)
+
+    def read_frame(self, start=None, end=None, axes=AXES):
+        """
+        Same as read, as a DataFrame with a "t" column followed by the axes.
+        """
+        t, data = self.read(start, end, axes)
+        frame = pd.DataFrame(data, columns=list(axes))
+        frame.insert(0, "t", t)
+        return frame
+
+    def gaps(self, min_periods=2):
+        """
+        Finds missing data, within chunks and between them.
+        Args:
+            min_periods: missing time above which a gap is reported, in nominal sample periods.
+        Returns:
+            An (m, 2) array of gap start and duration, in seconds from the start of the recording.
+        """
+        found = []
+        previous_end_us = None
+        for chunk in self.chunks:
+            period_us = 1e6 / chunk["fs"]
+            with np.load(os.path.join(self.path, chunk["file"])) as npz:
+                t_us = _sample_times(chunk, npz)
+            if previous_end_us is not None:
+                t_us = np.insert(t_us, 0, previous_end_us - period_us)
+            missing = np.diff(t_us) - period_us
+            i = np.flatnonzero(missing > min_periods * period_us)
+            found.append(np.column_stack([t_us[i] + period_us - self.start_us, missing[i]]) / 1e6)
+            previous_end_us = chunk.get("end_us", t_us[-1] + period_us)
+        return np.concatenate(found) if found else np.empty((0, 2))
+
+
+def convert_csv(csv_path, path, fs=200, device="csv", start_us=0):
+    """
+    Converts a CSV file written by the server into a chunked recording.
+    Samples are assumed to be contiguous at fs.
+    """
+    df = pd.read_csv(csv_path, dtype=np.float32)
+    with ChunkWriter(path, device) as writer:
+        writer.write(df[list(AXES)].to_numpy(), start_us, fs)
+    return Recording(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunked recording tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="convert a CSV file to a chunked recording")
+    convert.add_argument("csv")
+    convert.add_argument("path")
+    convert.add_argument("--fs", type=float, default=200)
+    convert.add_argument("--device", default="csv")
+    args = parser.parse_args()
+
+    recording = convert_csv(args.csv, args.path, args.fs, args.device)
+    print(f"{len(recording)} samples in {len(recording.chunks)} chunks written to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
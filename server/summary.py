@@ -0,0 +1,238 @@
+"""
+Multi-resolution summaries of acceleration recordings.
+
+While a device is recorded, SummaryWriter keeps the minimum, maximum, mean and
+RMS of each axis over aligned blocks of 1 s, 10 s, 1 min and 10 min. The 1 s
+level is computed from the samples and every coarser level from the rows of
+the level below, so the cost is a few vectorised reductions per packet. Each
+level is an append-only file of fixed-size RECORD rows in a summary
+directory:
+
+    <device>.summary/1s.bin, 10s.bin, 60s.bin, 600s.bin
+
+Blocks start at multiples of their length in absolute time (t0_us of the
+packets), so levels of different devices line up. A week at 1 min is about
+10000 rows, which an overview chart reads in milliseconds.
+
+    python -m server.summary build recordings/0001 recordings/0001.summary
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from .protocol import sample_period_us
+from .rawfile import RawRecording
+from .storage import Recording
+
+LEVELS = (1, 10, 60, 600)  # Block length of each level (s); each divides the next
+RECORD = np.dtype([
+    ("start_us", "<i8"),  # Start of the block
+    ("n", "<u4"),  # Samples in the block
+    ("min", "<f4", 3),
+    ("max", "<f4", 3),
+    ("mean", "<f4", 3),
+    ("rms", "<f4", 3),
+])
+
+
+def level_file(path, seconds):
+    return os.path.join(path, f"{seconds}s.bin")
+
+
+def _aggregate(start_us, n, lo, hi, s, ss, block_us):
+    """
+    Merges consecutive partial aggregates that fall in the same block.
+    Returns:
+        The same six arrays, one row per block, start_us aligned to block_us.
+    """
+    key = start_us // block_us * block_us
+    first = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    return (
+        key[first],
+        np.add.reduceat(n, first),
+        np.minimum.reduceat(lo, first, axis=0),
+        np.maximum.reduceat(hi, first, axis=0),
+        np.add.reduceat(s, first, axis=0),
+        np.add.reduceat(ss, first, axis=0),
+    )
+
+
+class _Level:
+    """
+    One level of the pyramid: the open block and the file of completed ones.
+    """
+
+    def __init__(self, path, seconds):
+        self.seconds = seconds
+        self.block_us = seconds * 1_000_000
+        self.rows = 0  # Rows written
+        self._file = open(path, mode="ab")
+        self._open = None  # Aggregates of the block being filled, each with one row
+
+    def add(self, parts, final=False):
+        """
+        Adds partial aggregates in time order; final also ends the open block.
+        Returns:
+            The aggregates of the blocks completed by them, or None.
+        """
+        if self._open is not None:
+            parts = self._open if parts is None else tuple(
+                np.concatenate([a, b]) for a, b in zip(self._open, parts)
+            )
+        if parts is None:
+            return None
+        blocks = _aggregate(*parts, self.block_us)
+        self._open = None if final else tuple(a[-1:] for a in blocks)
+        done = blocks if final else tuple(a[:-1] for a in blocks)
+        if not len(done[0]):
+            return None
+        self._write(done)
+        return done
+
+    def _write(self, blocks):
+        start_us, n, lo, hi, s, ss = blocks
+        rows = np.empty(len(n), RECORD)
+        rows["start_us"] = start_us
+        rows["n"] = n
+        rows["min"] = lo
+        rows["max"] = hi
+        rows["mean"] = s / n[:, None]
+        rows["rms"] = np.sqrt(ss / n[:, None])
+        self._file.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SummaryWriter:
+    """
+    Builds the summary pyramid of one device from its packets.
+    Args:
+        path: summary directory, created if needed. Existing rows are kept.
+        levels: block lengths (s), see LEVELS.
+    """
+
+    def __init__(self, path, levels=LEVELS):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.levels = [_Level(level_file(path, seconds), seconds) for seconds in levels]
+        self.closed = False
+
+    def write_packet(self, packet):
+        self.write(packet.samples, packet.t0_us, 1e6 / sample_period_us(packet))
+
+    def write(self, block, t0_us, fs, t_us=None):
+        """
+        Adds an (n, 3) block of calibrated samples, the first one taken at t0_us
+        and the next ones every 1 / fs seconds, or at the times t_us if given.
+        """
+        if not len(block):
+            return
+        x = np.asarray(block, dtype=np.float64)
+        if t_us is None:
+            t_us = t0_us + np.round(np.arange(len(x)) * (1e6 / fs))
+        t_us = np.asarray(t_us).astype(np.int64)
+        parts = (t_us, np.ones(len(x), np.int64), x, x, x, x * x)
+        for level in self.levels:
+            parts = level.add(parts)
+            if parts is None:
+                break
+
+    def flush_if_due(self):
+        self.flush()
+
+    def flush(self):
+        for level in self.levels:
+            level.flush()
+
+    def close(self):
+        """
+        Writes the open blocks, which may be incomplete, and closes the files.
+        """
+        if self.closed:
+            return
+        parts = None
+        for level in self.levels:
+            parts = level.add(parts, final=True)
+            level.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_summary(path, seconds=LEVELS[0], start_us=None, end_us=None):
+    """
+    Loads the rows of one level whose blocks start in [start_us, end_us).
+    Blocks split by a server restart are merged back into one row.
+    Returns:
+        A RECORD array sorted by start_us.
+    """
+    rows = np.fromfile(level_file(path, seconds), dtype=RECORD)
+    if start_us is not None:
+        rows = rows[rows["start_us"] >= start_us]
+    if end_us is not None:
+        rows = rows[rows["start_us"] < end_us]
+    rows = rows[np.argsort(rows["start_us"], kind="stable")]
+    if len(rows) < 2 or np.all(np.diff(rows["start_us"]) > 0):
+        return rows
+
+    n = rows["n"].astype(np.int64)[:, None]
+    start_us, n, lo, hi, s, ss = _aggregate(
+        rows["start_us"], n[:, 0], rows["min"], rows["max"],
+        rows["mean"] * n, rows["rms"].astype(np.float64) ** 2 * n, seconds * 1_000_000,
+    )
+    merged = np.empty(len(n), RECORD)
+    merged["start_us"], merged["n"], merged["min"], merged["max"] = start_us, n, lo, hi
+    merged["mean"] = s / n[:, None]
+    merged["rms"] = np.sqrt(ss / n[:, None])
+    return merged
+
+
+def build(recording, path, levels=LEVELS):
+    """
+    Builds the summary of an existing chunked or .raw recording, one chunk at a time.
+    """
+    if os.path.isdir(recording):
+        source = Recording(recording)
+        with SummaryWriter(path, levels) as writer:
+            for chunk in source.chunks:  # At most CHUNK_SECONDS each, in time order
+                start = (chunk["start_us"] - source.start_us) / 1e6
+                end = (chunk.get("end_us", chunk["start_us"] + chunk["n"] * 1e6 / chunk["fs"]) - source.start_us) / 1e6
+                t, data = source.read(start, end)
+                writer.write(data, None, None, t_us=np.round(source.start_us + t * 1e6))
+    else:
+        source = RawRecording(recording)
+        step = int(600 * source.fs)
+        with SummaryWriter(path, levels) as writer:
+            for i in range(0, len(source), step):
+                raw = source.raw[i:i + step]
+                t_us = np.round(source.start_us + source.times(i, i + len(raw)) * 1e6)
+                writer.write(raw * source.gain + source.offset, None, None, t_us=t_us)
+    return writer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recording summary tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("build", help="build the summary of a chunked or .raw recording")
+    command.add_argument("recording")
+    command.add_argument("path")
+    args = parser.parse_args()
+
+    writer = build(args.recording, args.path)
+    for level in writer.levels:
+        print(f"{level.seconds} s: {level.rows} rows")
+
+
+if __name__ == "__main__":
+    main()
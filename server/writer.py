@@ -0,0 +1,151 @@
+"""
+Buffered CSV persistence for acceleration samples.
+
+The file handle stays open for the lifetime of the writer. Incoming (n, 3)
+blocks are buffered and written in one formatted write once a row or time
+threshold is reached, instead of one open/close and one writerow call per
+sample.
+
+FeatureCsvWriter writes the feature frames of a device in feature mode, one
+row per window.
+"""
+
+import os
+import time
+
+import numpy as np
+
+from analysis.features import to_physical
+
+from .protocol import ACCEL_SCALE, sample_period_us
+
+FLUSH_ROWS = 2000  # Rows buffered before a write (10 s at 200 Hz)
+FLUSH_INTERVAL = 5.0  # Seconds before buffered rows are written regardless of size
+FSYNC_INTERVAL = None  # None: leave durability to the OS, 0: fsync every flush, >0: at most every N seconds
+FEATURE_NAMES = ("rms_g", "p2p_g", "crest", "kurtosis", "peak_hz", "peak_g")  # Keys of to_physical
+FEATURE_COLUMNS = tuple(f"{axis}_{name}" for axis in "xyz" for name in FEATURE_NAMES)
+
+
+class CsvWriter:
+    """
+    Appends (n, 3) blocks of acceleration to a CSV file.
+    Args:
+        path: CSV file, created with an "ax,ay,az" header if it does not exist.
+        flush_rows: write once this many rows are buffered.
+        flush_interval: write buffered rows that are older than this many seconds.
+        fsync_interval: durability policy, see FSYNC_INTERVAL.
+        fmt: printf-style format of a single value.
+        timestamps: for a new file, write a first "t" column with the sample
+            times in seconds since the epoch. An existing file keeps its columns.
+        columns: names of the columns of a block, for the header of a new file.
+    """
+
+    def __init__(self, path, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 fsync_interval=FSYNC_INTERVAL, fmt="%.4f", timestamps=False, columns=("ax", "ay", "az")):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.rows_written = 0
+        self._blocks = []
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._last_fsync = self._last_flush
+
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new_file:
+            with open(path) as file:
+                timestamps = file.readline().startswith("t,")
+        self.timestamps = timestamps
+        self._row_fmt = ("%.6f," if timestamps else "") + ",".join([fmt] * len(columns)) + "\n"
+        self._file = open(path, mode="a", newline="")
+        if new_file:
+            self._file.write(",".join(("t",) * timestamps + tuple(columns)) + "\n")  # Header row
+
+    def write_packet(self, packet):
+        """
+        Buffers the calibrated samples of a decoded Packet.
+        """
+        t = None
+        if self.timestamps:
+            t = (packet.t0_us + np.arange(len(packet.samples)) * sample_period_us(packet)) / 1e6
+        self.write(packet.samples, t)
+
+    def write(self, block, t=None):
+        """
+        Buffers an (n, len(columns)) block and flushes if a threshold is reached.
+        t holds the sample times (s since the epoch), required with timestamps.
+        """
+        if self.timestamps:
+            block = np.column_stack([t, block])
+        self._blocks.append(block)
+        self._pending += len(block)
+        if self._pending >= self.flush_rows:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """
+        Flushes if buffered rows have waited longer than flush_interval.
+        """
+        if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered rows in a single call and applies the fsync policy.
+        """
+        now = time.monotonic()
+        self._last_flush = now
+        if not self._pending:
+            return
+        rows = np.concatenate(self._blocks) if len(self._blocks) > 1 else self._blocks[0]
+        # One format operation for the whole block rather than one per row
+        self._file.write((self._row_fmt * len(rows)) % tuple(rows.ravel().tolist()))
+        self._file.flush()
+        self.rows_written += len(rows)
+        self._blocks = []
+        self._pending = 0
+
+        if self.fsync_interval is not None and now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        if self.fsync_interval is not None:
+            os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FeatureCsvWriter(CsvWriter):
+    """
+    Appends feature frames to a CSV file, one row of FEATURE_COLUMNS per
+    window, timestamped with its first sample.
+    Args:
+        path: CSV file.
+        gain: per-axis calibration gain, applied to the features in g.
+    """
+
+    def __init__(self, path, gain=(1, 1, 1), **kwargs):
+        super().__init__(path, fmt="%.6g", timestamps=True, columns=FEATURE_COLUMNS, **kwargs)
+        self.gain = np.asarray(gain, dtype=np.float64)
+
+    def write_packet(self, frame):
+        """
+        Buffers the features of a decoded FeatureFrame of x, y, z.
+        """
+        features = to_physical(frame.values, frame.fs, ACCEL_SCALE[frame.accel_range], frame.fft_size)
+        for name in ("rms_g", "p2p_g", "peak_g"):
+            features[name] = features[name] * self.gain
+        row = np.column_stack([features[name] for name in FEATURE_NAMES]).reshape(1, -1)
+        self.write(row, np.array([frame.t0_us / 1e6]))
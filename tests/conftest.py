@@ -0,0 +1,60 @@
+import math
+
+import numpy as np
+import pytest
+
+from emulator import FakeI2C, FakeMPU6050, FakeSSD1306, VirtualClock  # Before the Pico modules: puts lib/ on the path
+from server.protocol import Packet
+
+import imu
+import ssd1306
+
+
+@pytest.fixture
+def packet():
+    """
+    Makes decoded packets of n zero samples at 200 Hz, seq * 50 ms apart.
+    """
+
+    def make(seq, n=10):
+        return Packet(3, 1, seq, 200, 1, seq * 50_000, 45_000, 0, None, np.zeros((n, 3), np.float32))
+
+    return make
+
+
+def steady(t):
+    """
+    Constant x and y, so every frame of a packet can be checked, and 60 Hz on z.
+    """
+    return 0.25, -0.5, 1.0 + 0.05 * math.sin(2 * math.pi * 60 * t)
+
+
+@pytest.fixture
+def clock():
+    return VirtualClock()
+
+
+@pytest.fixture
+def chip(clock):
+    return FakeMPU6050(clock.time, signal=steady)
+
+
+@pytest.fixture
+def i2c(chip):
+    return FakeI2C({0x68: chip})
+
+
+@pytest.fixture
+def mpu(i2c, clock, monkeypatch):
+    monkeypatch.setattr(imu, "sleep_ms", clock.sleep_ms)  # Settling time on the virtual clock
+    return imu.MPU6050(i2c)
+
+
+@pytest.fixture
+def panel():
+    return FakeSSD1306()
+
+
+@pytest.fixture
+def oled(panel):
+    return ssd1306.SSD1306_I2C(128, 64, FakeI2C({0x3C: panel}))
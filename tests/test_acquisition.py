@@ -0,0 +1,121 @@
+from acquisition import FRAME, FifoSampler, TimerSampler
+from emulator import Timer
+
+
+def frames(payload):
+    """
+    (x, y, z) counts of each big-endian frame.
+    """
+    return [
+        tuple(int.from_bytes(payload[i + 2 * k:i + 2 * k + 2], "big", signed=True) for k in range(3))
+        for i in range(0, len(payload), FRAME)
+    ]
+
+
+def fifo_sampler(mpu, clock, rate=1000, samples=50, header=4):
+    mpu.set_rate(rate)
+    return FifoSampler(mpu, rate, samples, header, clock=clock)
+
+
+def test_fifo_packets_hold_whole_frames(mpu, clock):
+    sampler = fifo_sampler(mpu, clock)
+    for _ in range(5):
+        packet, t0_us, span_us = sampler.acquire()
+        assert len(packet) == 4 + FRAME * 50
+        rows = frames(packet[4:])
+        assert len(rows) == 50
+        assert all(x == 2048 and y == -4096 for x, y, _ in rows)  # 0.25 g and -0.5 g at 8192 LSB/g
+        assert all(7700 < z < 8700 for _, _, z in rows)
+        sampler.release(packet)
+    assert sampler.restarts == 0 and sampler.dropped == 0
+
+
+def test_fifo_sample_count_follows_the_virtual_time(mpu, clock, chip):
+    sampler = fifo_sampler(mpu, clock)
+    start_us = clock.us
+    times = []
+    for _ in range(40):  # 2 s at 1 kHz
+        packet, t0_us, span_us = sampler.acquire()
+        times.append((t0_us, span_us))
+        sampler.release(packet)
+    elapsed = (clock.us - start_us) / 1e6
+    assert sampler.received == 2000 + mpu.fifo_left
+    assert abs(chip.samples - 1000 * elapsed) <= 2
+    assert abs(sampler.received - 1000 * elapsed) <= 170  # What is still waiting in the FIFO
+    # Once a second of baseline is known, packets follow each other by 50 periods of 1 ms
+    for (t0, span), (next_t0, _) in zip(times[25:], times[26:]):
+        assert abs(next_t0 - t0 - 50_000) <= 2
+        assert abs(span - 49_000) <= 2
+
+
+def test_fifo_overflow_resets_the_fifo_and_counts_the_drop(mpu, clock, chip):
+    sampler = fifo_sampler(mpu, clock)
+    packet, _, _ = sampler.acquire()
+    sampler.release(packet)
+    clock.advance(0.5)  # The 1024-byte FIFO holds 170 ms at 1 kHz
+    assert chip.read(0x72, 2) == bytes([4, 0])  # FIFO_COUNT stuck at 1024
+    assert chip.regs[0x3A] & 0x10  # FIFO_OFLOW_INT
+    packet, _, _ = sampler.acquire()
+    assert mpu.fifo_overflows == 1
+    assert sampler.restarts == 1
+    assert 490 <= sampler.dropped <= 510  # The samples of the 0.5 s since the last drain
+    assert all(x == 2048 and y == -4096 for x, y, _ in frames(packet[4:]))  # Realigned after the reset
+
+
+def ramp(t):
+    """
+    x grows by 1 g per second, so each sample tells the time it was taken.
+    """
+    return t % 2, 0.0, 1.0
+
+
+def timer_sampler(mpu, clock, chip, samples=50, header=4):
+    chip.signal = ramp  # Sampled at 8 kHz, read by the timer at 1 kHz
+    sampler = TimerSampler(mpu, 1000, samples, header, clock=clock)
+    sampler.start(Timer(clock))
+    return sampler, clock.us // 1000
+
+
+def x_ms(packet, start_ms):
+    """
+    Time (ms) of each sample of a ramp packet since start_ms, from x at 8192 LSB/g.
+    """
+    return [round(x / 8.192) - start_ms for x, _, _ in frames(packet[4:])]
+
+
+def test_timer_packets_are_handed_over_in_order(mpu, clock, chip):
+    sampler, start_ms = timer_sampler(mpu, clock, chip)
+    times = []
+    for i in range(10):
+        packet, t0_us, span_us = sampler.acquire()
+        assert packet is sampler.packets[i % 2]
+        assert span_us == 49_000
+        times.append(t0_us)
+        assert x_ms(packet, start_ms) == list(range(50 * i + 1, 50 * i + 51))  # One sample per 1 ms tick
+        sampler.release(packet)
+    assert [b - a for a, b in zip(times, times[1:])] == [50_000] * 9
+    assert sampler.dropped == 0
+    sampler.stop()
+
+
+def test_timer_slow_consumer_drops_whole_ticks_and_keeps_both_packets(mpu, clock, chip):
+    sampler, start_ms = timer_sampler(mpu, clock, chip)
+    held, t0_held, _ = sampler.acquire()
+    before = bytes(held)
+    clock.advance(0.2)  # Sending takes 200 ms: the other packet fills, then both wait
+    assert bytes(held) == before  # The packet being sent is not written to
+    assert sampler.dropped == 150
+    sampler.release(held)
+
+    packet, t0_us, _ = sampler.acquire()
+    assert packet is sampler.packets[1]
+    assert x_ms(packet, start_ms) == list(range(51, 101))  # Filled before the drops, then left alone
+    assert t0_us - t0_held == 50_000
+    sampler.release(packet)
+
+    packet, t0_resumed, _ = sampler.acquire()
+    assert packet is sampler.packets[0]
+    assert x_ms(packet, start_ms) == list(range(251, 301))  # Resumes at the first tick after the release
+    assert t0_resumed - t0_us == 200_000
+    assert sampler.dropped == 150
+    sampler.stop()
@@ -0,0 +1,107 @@
+import math
+
+import numpy as np
+
+from server.anomaly import CLEAR, WARMUP, WINDOW, AnomalyDetector
+from server.protocol import Packet
+
+FS = 200
+
+
+def signal(windows, seed, tone=None):
+    """
+    windows * WINDOW samples of a running machine: noise, 1 g on z and a
+    25 Hz line on every axis. tone: (axis, Hz, amplitude in g) added on top.
+    """
+    t = np.arange(windows * WINDOW) / FS
+    x = np.random.default_rng(seed).normal(0, 0.02, (len(t), 3)) + [0, 0, 1]
+    x += 0.05 * np.sin(2 * np.pi * 25 * t)[:, None]
+    if tone is not None:
+        axis, f, amplitude = tone
+        x[:, axis] += amplitude * np.sin(2 * np.pi * f * t)
+    return x
+
+
+def feed(detector, key, x, t0_us=0, n=200):
+    """
+    Passes x to the detector as packets of n samples starting at t0_us.
+    Returns:
+        The time of the sample after the last one.
+    """
+    for i in range(0, len(x), n):
+        samples = x[i:i + n].astype(np.float32)
+        t = t0_us + i * 1_000_000 // FS
+        detector.update(key, Packet(3, 1, i // n, FS, 1, t, (len(samples) - 1) * 1_000_000 // FS, 0, None, samples))
+    return t0_us + len(x) * 1_000_000 // FS
+
+
+def warm(detector, key, seed=0):
+    t_us = feed(detector, key, signal(WARMUP, seed))
+    assert detector.process() == []
+    return t_us
+
+
+def test_no_alarm_during_warmup():
+    detector = AnomalyDetector()
+    x = signal(20, 0)
+    x[10 * WINDOW:11 * WINDOW, 1] += 0.5 * np.sin(2 * np.pi * 73 * np.arange(WINDOW) / FS)  # A strong tone
+    feed(detector, "a", x)
+    assert detector.process() == []
+    status = detector.status("a")
+    assert status["windows"] == status["learned"] == 20
+    assert status["alarms"] == 0
+    assert math.isnan(status["score"])
+
+
+def test_no_alarm_on_stationary_noise():
+    detector = AnomalyDetector()
+    t_us = warm(detector, "a")
+    feed(detector, "a", signal(300, 1), t_us)
+    assert detector.process() == []
+    status = detector.status("a")
+    assert status["windows"] == WARMUP + 300
+    assert status["alarms"] == 0 and not status["alarm"]
+    assert status["score"] < detector.threshold
+
+
+def test_tone_raises_an_alarm_on_its_first_window_and_clears():
+    detector = AnomalyDetector()
+    t_us = warm(detector, "a")
+    tone_us = feed(detector, "a", signal(20, 1), t_us)
+    end_us = feed(detector, "a", signal(3, 2, tone=(1, 73, 0.05)), tone_us)
+    feed(detector, "a", signal(CLEAR, 3), end_us)
+
+    raised, cleared = detector.process()
+    assert raised.raised and raised.key == "a"
+    assert raised.t_us == tone_us
+    assert raised.score > detector.threshold
+    assert raised.axis == 1 and raised.band == (60.0, 80.0)
+    assert raised.deviation_db > 0
+    assert not cleared.raised
+    assert cleared.t_us == end_us + (CLEAR - 1) * WINDOW * 1_000_000 // FS  # On the CLEAR-th normal window
+    assert detector.status("a")["alarms"] == 1
+
+
+def test_gap_discards_the_window_in_progress():
+    detector = AnomalyDetector()
+    x = signal(2, 0)
+    t_us = feed(detector, "a", x[:WINDOW // 2])
+    feed(detector, "a", x[WINDOW // 2:], t_us + 1_000_000)  # 1 s later
+    detector.process()
+    assert detector.status("a")["windows"] == 1  # The half window before the gap is not completed
+
+
+def test_devices_are_scored_together():
+    detector = AnomalyDetector()
+    starts = {}
+    for i, key in enumerate("abc"):
+        starts[key] = feed(detector, key, signal(WARMUP + 20, i))
+    assert detector.process() == []  # Every device learns its own baseline in one call
+    for i, key in enumerate("abc"):
+        feed(detector, key, signal(2, 10 + i, tone=(2, 45, 0.05) if key == "b" else None), starts[key])
+
+    (alarm,) = detector.process()
+    assert alarm.key == "b" and alarm.raised
+    assert alarm.t_us == starts["b"]
+    assert alarm.axis == 2 and alarm.band == (40.0, 60.0)
+    assert [detector.status(key)["windows"] for key in "abc"] == [WARMUP + 22] * 3
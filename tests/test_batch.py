@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import batch
+
+
+def write_recording(directory, name, n=1024):
+    t = np.arange(n) / batch.FS
+    x = 0.1 * np.sin(2 * np.pi * 20 * t)
+    path = directory / name
+    pd.DataFrame({"ax": x, "ay": 0 * x, "az": 1 + x}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_summary_ignores_results_left_half_written(tmp_path, monkeypatch):
+    recordings, out = tmp_path / "recordings", tmp_path / "out"
+    recordings.mkdir()
+    out.mkdir()
+    path = write_recording(recordings, "pump.csv")
+    result = batch._result_path(str(out), "pump.csv")
+    params = {"fs": batch.FS, "bin_width": batch.BIN_WIDTH, "nperseg": batch.NPERSEG}
+
+    def killed(src, dst):
+        raise KeyboardInterrupt  # The worker dies between writing and renaming
+
+    monkeypatch.setattr(batch.os, "replace", killed)
+    with pytest.raises(KeyboardInterrupt):
+        batch._run((path, "pump.csv", "csv", result, params, batch.fingerprint(path, "csv"), None))
+    monkeypatch.undo()
+    (left,) = os.listdir(out)
+    assert not left.endswith(".npz")
+    with open(out / left, "r+b") as file:
+        file.truncate(100)  # Cut short, as by a crash during the write
+
+    summary = batch.run(str(recordings), str(out), workers=1, cache_dir=None)
+    assert summary["recording"].tolist() == ["pump.csv"]
+    assert os.path.exists(result)
+
+
+def test_resume_from_another_directory_finds_the_saved_results(tmp_path, monkeypatch, capsys):
+    (tmp_path / "rec").mkdir()
+    (tmp_path / "elsewhere").mkdir()
+    write_recording(tmp_path / "rec", "pump.csv")
+    out = str(tmp_path / "out")
+    monkeypatch.chdir(tmp_path)
+    first = batch.run("rec", out, workers=1, cache_dir=None)
+    monkeypatch.chdir(tmp_path / "elsewhere")
+    capsys.readouterr()
+    summary = batch.run("../rec", out, workers=1, resume=True, cache_dir=None)
+    output = capsys.readouterr().out
+    assert "0 recordings analysed" in output and "1 unchanged" in output
+    assert summary["recording"].tolist() == ["pump.csv"]
+    pd.testing.assert_frame_equal(summary, first)
@@ -0,0 +1,33 @@
+import os
+import threading
+
+import numpy as np
+
+from analysis.cache import SpectrumCache
+
+
+def test_threads_writing_the_same_entry_do_not_collide(tmp_path):
+    cache = SpectrumCache(str(tmp_path), max_bytes=None)
+    x = np.arange(4096, dtype=np.float64)
+    key = cache.key("spectrum", x)
+    start = threading.Barrier(8)
+    errors = []
+
+    def write():
+        start.wait()
+        for _ in range(20):
+            try:
+                cache.put(key, (x, 2 * x))
+            except Exception as error:
+                errors.append(error)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    a, b = cache.get(key)
+    np.testing.assert_array_equal(b, 2 * x)
+    (directory,) = os.listdir(tmp_path)
+    assert os.listdir(tmp_path / directory) == [f"{key}.npz"]  # No temporary file left behind
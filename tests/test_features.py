@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from analysis.features import FEATURES, window_features
+from features import FeatureWindow
+from server.protocol import HEADER_SIZE, decode, encode, encode_features
+
+
+def pico_features(raw, window):
+    """
+    Features of raw as main.py computes them: big-endian frames of 200 samples
+    fed through a FeatureWindow.
+    """
+    features = FeatureWindow(window)
+    out = []
+    for start in range(0, len(raw), 200):
+        frame = encode(raw[start:start + 200], big_endian=True)
+        offset, count = HEADER_SIZE, (len(frame) - HEADER_SIZE) // 6
+        while count:
+            added = features.add(frame, offset, count)
+            offset, count = offset + 6 * added, count - added
+            if features.full:
+                out.append(features.result())
+                features.reset()
+    return np.array(out, dtype=np.int64).reshape(-1, 3, len(FEATURES))
+
+
+def tone(n):
+    t = np.arange(n) / 1000
+    rng = np.random.default_rng(0)
+    return np.column_stack([
+        800 * np.sin(2 * np.pi * 120 * t) + rng.normal(0, 50, n),
+        -300 + 2000 * np.sin(2 * np.pi * 37 * t),
+        8192 + rng.normal(0, 200, n),
+    ]).round().astype(np.int16)
+
+
+@pytest.mark.parametrize(
+    "raw, window",
+    [
+        (tone(3000), 1024),  # Several FFT blocks per window
+        (tone(1000), 300),  # Shorter than two blocks
+        (tone(1000), 200),  # No FFT block at all
+        (np.full((1000, 3), -1234, np.int16), 500),  # Constant
+        (np.tile([[32767, -32768, 0], [-32768, 32767, 0]], (500, 1)).astype(np.int16), 512),  # Full-scale alternating
+    ],
+)
+def test_pico_and_numpy_features_are_identical(raw, window):
+    expected = window_features(raw, window)
+    assert len(expected) == len(raw) // window
+    np.testing.assert_array_equal(pico_features(raw, window), expected)
+
+
+def test_feature_frames_round_trip():
+    values = window_features(tone(1024), 1024)[0]
+    frame = decode(encode_features(values, device_id=7, seq=3, fs=1000, t0_us=123, n=1024, dropped=2))
+    np.testing.assert_array_equal(frame.values, values)
+    assert (frame.device_id, frame.seq, frame.fs, frame.t0_us, frame.n, frame.dropped, frame.fft_size) == (
+        7, 3, 1000, 123, 1024, 2, 256
+    )
@@ -0,0 +1,122 @@
+import tracemalloc
+from array import array
+
+import pytest
+
+import imu
+from imu import bytes_toint, swap_into
+from vector3d import Vector3d
+
+
+def big_endian(values):
+    return b"".join(v.to_bytes(2, "big", signed=True) for v in values)
+
+
+def record_reads(chip, monkeypatch):
+    """
+    Bytes returned by the emulated chip, by register.
+    """
+    reads = []
+    read = chip.read
+
+    def recorder(memaddr, nbytes):
+        data = read(memaddr, nbytes)
+        reads.append((memaddr, data))
+        return data
+
+    monkeypatch.setattr(chip, "read", recorder)
+    return reads
+
+
+def test_bytes_toint_decodes_every_value():
+    assert all(bytes_toint(*v.to_bytes(2, "big", signed=True)) == v for v in range(-32768, 32768))
+
+
+def test_swap_into_converts_the_first_n_values_from_big_endian():
+    values = [0, 1, -1, 256, -256, 32767, -32768, 2048]
+    samples = array("h")
+    samples.frombytes(big_endian(values))  # As read from the chip into the array's memory
+    swap_into(samples, 6)
+    assert list(samples[:6]) == values[:6]
+    assert samples[6:].tobytes() == big_endian(values[6:])  # Left untouched
+
+
+def test_accel_into_decodes_one_frame_in_place(mpu, chip, clock, monkeypatch):
+    clock.advance(0.001)  # A sample at the range set by the constructor
+    reads = record_reads(chip, monkeypatch)
+    samples = array("h", [0] * 9)
+    address = samples.buffer_info()
+    mpu.accel_into(samples, index=1)
+    assert reads == [(0x3B, reads[0][1])] and len(reads[0][1]) == 6
+    assert samples[3:6].tobytes() == array("h", [int.from_bytes(reads[0][1][i:i + 2], "big", signed=True)
+                                                 for i in (0, 2, 4)]).tobytes()
+    assert samples[3:5].tolist() == [2048, -4096]
+    assert samples[:3].tolist() == [0, 0, 0] and samples[6:].tolist() == [0, 0, 0]
+    assert samples.buffer_info() == address
+
+
+def test_read_accel_into_reads_the_fifo_into_the_buffer(mpu, chip, clock, monkeypatch):
+    mpu.set_rate(1000)
+    mpu.fifo_enable()
+    clock.advance(0.02)
+    reads = record_reads(chip, monkeypatch)
+    samples = array("h", [0] * 3 * 50)
+    address = samples.buffer_info()
+    n = mpu.read_accel_into(samples)
+    raw = b"".join(data for memaddr, data in reads if memaddr == 0x74)
+    assert len(raw) == 6 * n and 20 <= n <= 21
+    assert samples[:3 * n].tolist() == [int.from_bytes(raw[i:i + 2], "big", signed=True)
+                                        for i in range(0, len(raw), 2)]
+    assert samples[:3 * n:3].tolist() == [2048] * n and samples[1:3 * n:3].tolist() == [-4096] * n
+    assert samples[3 * n:].tolist() == [0] * (len(samples) - 3 * n)
+    assert samples.buffer_info() == address
+    assert mpu.read_accel_into(samples, n=5) == 0  # Drained
+
+
+@pytest.fixture
+def turned(i2c, clock, monkeypatch):
+    """
+    An MPU6050 mounted with x and y swapped and scaled.
+    """
+    monkeypatch.setattr(imu, "sleep_ms", clock.sleep_ms)
+    return imu.MPU6050(i2c, transposition=(1, 0, 2), scaling=(1, -1, 0.5))
+
+
+def test_calibrate_into_matches_xyz(turned, clock):
+    calls = []
+    turned.accel.calibrate(lambda: calls.append(None) or len(calls) > 30, lambda: clock.sleep_ms(1))
+    assert turned.accel.cal[2] != 0  # z swings with the 60 Hz signal
+    expected = turned.accel.xyz
+    out = array("f", [0] * 3)
+    turned.accel.calibrate_into(turned.accel.ixyz, out, 1, turned.accel_lsb)
+    assert out.tolist() == pytest.approx(expected, abs=1e-6)
+
+
+def test_calibrate_into_corrects_a_batch_without_allocating(turned, clock):
+    accel = turned.accel
+    accel.cal = (0.01, -0.02, 1.0)
+    turned.set_rate(1000)
+    turned.fifo_enable()
+    clock.advance(0.1)
+    samples = array("h", [0] * 3 * 100)
+    n = turned.read_accel_into(samples)
+    assert n == 100
+
+    triplet = [0.0, 0.0, 0.0]
+    reference = Vector3d(accel.transpose, accel.scale, lambda: None)  # The xyz path of each triplet
+    reference.cal = accel.cal
+    reference._vector = triplet
+    expected = []
+    for i in range(0, 3 * n, 3):
+        triplet[:] = [v / turned.accel_lsb for v in samples[i:i + 3]]
+        expected += reference.xyz
+
+    out = array("f", [0] * 3 * n)
+    address = out.buffer_info()
+    tracemalloc.start()
+    accel.calibrate_into(samples, out, n, turned.accel_lsb)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert out.tolist() == pytest.approx(expected, abs=1e-6)
+    assert out.buffer_info() == address
+    assert peak < 1024  # No per-sample objects kept: 100 triplets as lists would take ~10 kB
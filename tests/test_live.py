@@ -0,0 +1,49 @@
+import io
+
+import numpy as np
+
+from server.live import LiveRegistry, LiveSpectrum
+from server.protocol import Packet
+
+
+def tone(n, fs, start=0):
+    t = (start + np.arange(n)) / fs
+    return np.repeat(np.sin(2 * np.pi * 20 * t)[:, None], 3, axis=1).astype(np.float32)
+
+
+def test_snapshot_before_the_first_packet_loads_without_pickle():
+    live = LiveSpectrum(200, seconds=2, nperseg=64)
+    with np.load(io.BytesIO(live.snapshot()), allow_pickle=False) as npz:
+        assert np.isnan(npz["updated"])
+        assert npz["samples"].shape == (0, 3)
+
+
+def test_segments_do_not_span_a_gap():
+    fs, nperseg = 200, 64
+    split = LiveSpectrum(fs, seconds=2, nperseg=nperseg)
+    smeared = LiveSpectrum(fs, seconds=2, nperseg=nperseg)
+    for live, contiguous in ((split, False), (smeared, True)):
+        live.update(tone(100, fs))
+        live.update(-tone(100, fs, start=100), contiguous=contiguous)  # Phase jump at a gap
+    assert len(split._segments) == 4  # 2 on each side, none across
+    assert len(smeared._segments) == 5
+    far = np.abs(split.frequencies - 20) > 15
+    assert split.psd[far].sum() < 0.5 * smeared.psd[far].sum()  # No leakage from the jump
+
+
+def test_registry_restarts_segments_after_a_gap():
+    fs, n = 200, 100
+    registry = LiveRegistry(seconds=2, nperseg=64)
+    calls = []
+
+    def packet(i):
+        t0_us = int(i * n * 1e6 / fs)
+        return Packet(3, 1, i, fs, 1, t0_us, int((n - 1) * 1e6 / fs), 0, None, tone(n, fs, i * n))
+
+    registry.update("0001", packet(0))
+    live = registry.devices["0001"]
+    update = live.update
+    live.update = lambda samples, contiguous=True: calls.append(contiguous) or update(samples, contiguous)
+    registry.update("0001", packet(1))
+    registry.update("0001", packet(3))  # Packet 2 is missing
+    assert calls[0] and calls[-1] is False
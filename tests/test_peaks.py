@@ -0,0 +1,56 @@
+import numpy as np
+
+from analysis.peaks import find_peaks, harmonic_families, track
+from analysis.spectral import welch
+
+FS = 200
+
+
+def machine(seconds=60, seed=0):
+    """
+    Axis x: a 29.37 Hz fundamental with its 2x and 3x orders and 60 Hz hum;
+    y: the hum alone; z: white noise.
+    """
+    t = np.arange(seconds * FS) / FS
+    noise = np.random.default_rng(seed).normal(0, 0.02, (len(t), 3))
+    hum = 0.1 * np.sin(2 * np.pi * 60 * t)
+    rotation = sum(a * np.sin(2 * np.pi * n * 29.37 * t + n) for n, a in ((1, 0.3), (2, 0.2), (3, 0.1)))
+    return noise + np.column_stack([rotation + hum, hum, 0 * t])
+
+
+def test_fundamental_and_orders_are_found_and_hum_is_kept_separate():
+    f, psd = welch(machine(), FS, nperseg=1024)
+    peaks = find_peaks(f, psd)
+    families = harmonic_families(peaks)
+
+    x = peaks["frequency"][:, 0]
+    for expected in (29.37, 2 * 29.37, 3 * 29.37, 60):
+        assert np.nanmin(np.abs(x - expected)) < 0.02
+    assert abs(families["fundamental"][0] - 29.37) < 0.02
+    assert families["orders"][0] == 3
+    np.testing.assert_allclose(families["frequency"][:, 0], [29.37, 58.74, 88.11], atol=0.03)
+
+    assert abs(families["fundamental"][1] - 60) < 0.02
+    assert families["orders"][1] == 1
+
+
+def test_white_noise_has_no_peaks():
+    noise = np.random.default_rng(1).normal(0, 0.02, (60 * FS, 3))
+    f, psd = welch(noise, FS, nperseg=1024)
+    peaks = find_peaks(f, psd)
+    assert np.isnan(peaks["frequency"]).all()
+    assert np.isnan(harmonic_families(peaks)["fundamental"]).all()
+
+
+def test_track_follows_a_speed_ramp():
+    seconds, window = 1000, 10.0
+    t = np.arange(seconds * FS) / FS
+    speed = 20 + 10 * t / seconds  # Hz
+    phase = 2 * np.pi * np.cumsum(speed) / FS
+    x = np.sin(phase) + 0.5 * np.sin(2 * phase) + np.random.default_rng(2).normal(0, 0.05, len(t))
+
+    start, peaks, families = track(x[:, None], FS, window=window)
+    assert len(start) == seconds / window
+    expected = 20 + 10 * (start + window / 2) / seconds  # Speed in the middle of each window
+    assert np.abs(families["fundamental"][:, 0] - expected).max() < 0.05
+    assert (families["orders"][:, 0] == 2).all()
@@ -0,0 +1,47 @@
+from server.sequence import SEQ_MODULUS, ReorderBuffer
+
+
+def seqs(ready):
+    return [p.seq for p, _ in ready]
+
+
+def test_huge_forward_jump_restarts_without_walking_the_gap(packet):
+    buffer = ReorderBuffer(window=16)
+    assert seqs(buffer.push(packet(0), 0)) == [0]
+    assert seqs(buffer.push(packet(2), 1)) == []
+    assert buffer.missing() == [1]
+    assert seqs(buffer.push(packet(1 << 30), 2)) == [2, 1 << 30]
+    assert buffer.missing() == []
+    assert seqs(buffer.push(packet((1 << 30) + 1), 3)) == [(1 << 30) + 1]
+    assert seqs(buffer.push(packet((1 << 30) + 3), 4)) == []
+    assert buffer.missing() == [(1 << 30) + 2]  # The window starts again at the jump
+    assert seqs(buffer.flush()) == [(1 << 30) + 3]
+    assert buffer.restarts == 1
+    assert buffer.lost == 2
+
+
+def test_gap_within_four_windows_is_waited_for_and_nacked_a_window_at_a_time(packet):
+    buffer = ReorderBuffer(window=16, timeout=0.5)
+    buffer.push(packet(0), 0)
+    assert seqs(buffer.push(packet(40), 1)) == []
+    assert buffer.missing() == list(range(1, 17))
+    assert buffer.missing() == []  # Already requested
+    assert seqs(buffer.push(packet(1), 2)) == [1]
+    assert buffer.recovered == 1
+    assert buffer.missing() == [17]  # The window moved on by one
+    assert seqs(buffer.expire(600_000)) == [40]
+    assert buffer.lost == 38
+    assert buffer.restarts == 0
+    assert seqs(buffer.push(packet(43), 3)) == []
+    assert buffer.missing() == [41, 42]  # Only the new gap is requested
+    assert buffer.missing() == []
+
+
+def test_wrap_around_is_not_a_restart(packet):
+    buffer = ReorderBuffer(window=16)
+    first = SEQ_MODULUS - 2
+    released = []
+    for i in range(4):
+        released += seqs(buffer.push(packet((first + i) % SEQ_MODULUS), i))
+    assert released == [SEQ_MODULUS - 2, SEQ_MODULUS - 1, 0, 1]
+    assert buffer.restarts == 0 and buffer.lost == 0
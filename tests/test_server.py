@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from server.protocol import encode_features
+from server.server import DeviceChannel, IngestionServer
+
+
+class ListWriter:
+    def __init__(self):
+        self.packets = []
+        self.closed = False
+
+    def write_packet(self, packet):
+        self.packets.append(packet)
+
+    def flush_if_due(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def run_channel(open_writer, packets):
+    async def main():
+        with ThreadPoolExecutor(1) as executor:
+            channel = DeviceChannel("0001", open_writer, executor)
+            for p in packets:
+                channel.put(p)
+                await channel._queue.join()  # Written, or failed
+            await channel.close()
+            return channel
+
+    return asyncio.run(main())
+
+
+def test_channel_retries_a_writer_that_failed_to_open(packet, capsys):
+    writer = ListWriter()
+    attempts = []
+
+    def open_writer(first):
+        attempts.append(first.seq)
+        if len(attempts) == 1:
+            raise FileNotFoundError("no such directory")
+        return writer
+
+    channel = run_channel(open_writer, [packet(0), packet(1), packet(2)])
+    assert attempts == [0, 1]
+    assert channel.failed == 10
+    assert channel.saved == 20
+    assert channel.error is None
+    assert [p.seq for p in writer.packets] == [1, 2]
+    assert writer.closed
+    assert "Error saving 10 readings from 0001: FileNotFoundError" in capsys.readouterr().out
+
+
+def test_channel_counts_write_errors_and_keeps_running(packet, capsys):
+    class BrokenWriter(ListWriter):
+        def write_packet(self, packet):
+            raise ValueError("bad packet")
+
+    channel = run_channel(lambda first: BrokenWriter(), [packet(0), packet(1), packet(2)])
+    assert channel.failed == 30
+    assert channel.saved == 0
+    assert channel.error == "ValueError: bad packet"
+    assert capsys.readouterr().out.count("ValueError: bad packet") == 1  # Repeated errors are printed once
+
+
+def test_csv_storage_creates_the_data_directory(tmp_path, packet):
+    data_dir = tmp_path / "new" / "data"
+
+    async def main():
+        ingestion = IngestionServer(data_dir=str(data_dir), storage="csv")
+        channel = ingestion.channel("0001")
+        channel.put(packet(0))
+        await ingestion.close()
+        return channel
+
+    channel = asyncio.run(main())
+    assert channel.saved == 10 and channel.failed == 0
+    assert (data_dir / "acceleration_data_0001.csv").read_text().count("\n") == 11  # Header and 10 rows
+
+
+def test_feature_frames_without_three_axes_are_rejected(tmp_path):
+    ingestion = IngestionServer(data_dir=str(tmp_path), storage="csv")
+    ingestion.datagram_received(encode_features(np.zeros((2, 6)), device_id=1), ("10.0.0.2", 5005))
+    assert ingestion.rejected == 1
+    assert not ingestion.channels
@@ -0,0 +1,33 @@
+import numpy as np
+
+from analysis.spectral import bin_edges, bin_mean, binned_amplitude
+
+
+def test_bin_mean_averages_each_bin():
+    f = np.arange(0, 101, 1.0)
+    values = np.column_stack([np.ones_like(f), f])
+    result = bin_mean(f, values, np.array([0, 10, 20]))
+    np.testing.assert_allclose(result, [[1, 5], [1, 15]])  # [1, 10) without DC, then [10, 20]
+
+
+def test_bin_mean_ignores_frequencies_above_the_last_edge():
+    f = np.fft.rfftfreq(1000, 1 / 200)
+    result = bin_mean(f, np.ones_like(f), np.array([0, 10, 20]))
+    np.testing.assert_allclose(result, [1, 1])
+
+
+def test_bin_mean_with_edges_outside_the_spectrum():
+    f = np.arange(0, 11, 1.0)
+    assert np.isnan(bin_mean(f, np.ones_like(f), np.array([20, 30, 40]))).all()
+    np.testing.assert_allclose(bin_mean(f, np.ones_like(f), np.array([5, 10, 20])), [1, 1])
+
+
+def test_binned_amplitude_of_a_tone():
+    fs = 200
+    t = np.arange(2000) / fs
+    x = np.column_stack([np.sin(2 * np.pi * 30.25 * t), np.zeros_like(t)])
+    edges, binned = binned_amplitude(x, fs, bin_width=1.0)
+    np.testing.assert_array_equal(edges, bin_edges(fs, 1.0))
+    assert binned.shape == (len(edges) - 1, 2)
+    assert np.argmax(binned[:, 0]) == 30
+    assert not binned[:, 1].any()
@@ -0,0 +1,46 @@
+def sent(oled, panel, action):
+    """
+    Bytes written on the bus and display data received by the panel during action().
+    """
+    written, data = oled.i2c.bytes_written, panel.data_bytes
+    result = action()
+    return result, oled.i2c.bytes_written - written, panel.data_bytes - data
+
+
+def test_init_sends_the_whole_blank_frame(oled, panel):
+    assert panel.data_bytes == 128 * 8
+    assert panel.ram == oled.buffer == bytearray(128 * 8)
+
+
+def test_show_sends_nothing_when_nothing_changed(oled, panel):
+    oled.text("Acceleration:", 0, 0)
+    oled.show()
+    assert sent(oled, panel, oled.show) == (0, 0, 0)
+    oled.fill(0)
+    oled.text("Acceleration:", 0, 0)  # Redrawn the same
+    assert sent(oled, panel, oled.show) == (0, 0, 0)
+
+
+def test_show_sends_only_the_changed_pages(oled, panel):
+    oled.text("ax: 0.01 G", 0, 20)  # Rows 20 to 27: pages 2 and 3
+    pages, written, data = sent(oled, panel, oled.show)
+    assert pages == 2
+    assert data == 2 * 128
+    assert written == data + 1 + 6 * 2  # Control byte, then 6 address commands of 2 bytes
+    assert panel.ram == oled.buffer
+
+    oled.fill_rect(0, 20, 128, 8, 0)
+    oled.text("ax: 0.02 G", 0, 20)
+    oled.pixel(5, 63, 1)  # Page 7, away from the text: a second run
+    pages, written, data = sent(oled, panel, oled.show)
+    assert pages == 3
+    assert data == 3 * 128
+    assert written == data + 2 * (1 + 6 * 2)
+    assert panel.ram == oled.buffer
+
+
+def test_full_show_resends_every_page(oled, panel):
+    oled.text("x", 0, 0)
+    oled.show()
+    assert sent(oled, panel, lambda: oled.show(full=True))[::2] == (8, 8 * 128)
+    assert panel.ram == oled.buffer
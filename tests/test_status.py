@@ -0,0 +1,45 @@
+import pytest
+
+from status import StatusView
+
+
+@pytest.fixture
+def view(oled, clock):
+    return StatusView(oled, interval_ms=500, clock=clock)
+
+
+def test_status_redraws_at_most_every_interval(view, oled, panel, clock):
+    assert view.update(0.01, 0.02, 1.0)
+    assert view.redraws == 1
+    data = panel.data_bytes
+    written = oled.i2c.bytes_written
+    for _ in range(49):  # 10 ms per packet
+        clock.advance(0.01)
+        assert not view.update(0.5, 0.5, 0.5)
+    assert oled.i2c.bytes_written == written and panel.data_bytes == data
+    clock.advance(0.01)  # 500 ms since the first redraw
+    assert view.update(0.5, 0.5, 0.5)
+    assert view.redraws == 2
+    assert panel.ram == oled.buffer
+
+
+def test_status_sends_only_the_pages_whose_text_changed(view, oled, panel, clock):
+    view.update(0.01, 0.02, 1.0)
+    assert view.pages_sent == 5  # Blank pages 1, 6 and 7 were already shown by init
+    assert panel.ram == oled.buffer
+
+    clock.advance(0.5)
+    data = panel.data_bytes
+    assert view.update(0.01, 0.02, 1.0)  # Same values: redrawn, nothing sent
+    assert view.pages_sent == 5 and panel.data_bytes == data
+
+    clock.advance(0.5)
+    view.update(0.03, 0.02, 1.0)  # ax on rows 20 to 27
+    assert view.pages_sent == 7
+    assert panel.data_bytes - data == 2 * 128
+    assert panel.ram == oled.buffer
+
+    clock.advance(0.5)
+    view.update(0.03, 0.02, 1.0, dropped=7)  # "lost" on rows 54 to 61
+    assert view.pages_sent == 9  # Pages 6 and 7
+    assert panel.ram == oled.buffer
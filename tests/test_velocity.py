@@ -0,0 +1,39 @@
+import numpy as np
+
+from analysis.velocity import G, ZONE_LIMITS, StreamingBandRMS, band_rms, frames, severity
+
+
+def tone(velocity_rms, f, fs, seconds):
+    """
+    Acceleration (g) on x of a sine of the given velocity RMS (mm/s), 1 g on z.
+    """
+    t = np.arange(int(seconds * fs)) / fs
+    a = velocity_rms * np.sqrt(2) * 2 * np.pi * f / 1e3 / G * np.sin(2 * np.pi * f * t)
+    return np.column_stack([a, 0 * t, 1 + 0 * t])
+
+
+def test_a_5_mm_s_tone_reads_5_mm_s():
+    fs = 200.0
+    x = tone(5.0, 30.5, fs, 60)
+    rms = band_rms(x, fs)
+    assert rms.shape == (1, 3)
+    assert round(rms[0, 0], 3) == 5.0
+    np.testing.assert_allclose(rms[0, 1:], 0, atol=1e-9)  # Gravity is removed with the mean
+    per_second = band_rms(frames(x, fs), fs)
+    assert per_second.shape == (60, 1, 3)
+    np.testing.assert_allclose(per_second[:, 0, 0], 5.0, atol=5e-3)  # Leakage across the 1/f weighting
+
+
+def test_severity_zone_boundaries_belong_to_the_lower_zone():
+    rms = [0.0, 1.12, 1.13, 2.8, 2.81, 7.1, 7.11, 45.0, np.nan]
+    assert severity(rms, ZONE_LIMITS["II"]).tolist() == ["A", "A", "B", "B", "C", "C", "D", "D", ""]
+    assert severity(rms, ZONE_LIMITS["I"]).tolist() == ["A", "B", "B", "C", "C", "D", "D", "D", ""]
+
+
+def test_streaming_matches_overlapping_frames():
+    fs, n = 200, 200
+    x = tone(3.0, 37, fs, 10) + np.random.default_rng(0).normal(0, 0.01, (10 * fs, 3))
+    meter = StreamingBandRMS(fs)
+    chunks = [meter.update(x[i:i + 37]) for i in range(0, len(x), 37)]  # Packets that do not divide a window
+    np.testing.assert_allclose(np.concatenate(chunks), band_rms(frames(x, n, n // 2), fs), rtol=1e-12)
+    np.testing.assert_array_equal(meter.latest, np.concatenate(chunks)[-1])